@@ -0,0 +1,107 @@
+
+"""
+Measures contention in the asynchronous (shared memory) replay buffer: one
+writer process appends continuously (as the memory copier does) while
+several optimizer-like processes sample batches, with the readers-writer
+lock and with lock_free_sampling.  Reports batches sampled per second (all
+readers) and appends per second.  The writer is throttled to append_rate
+(as by a sampler; 0 for unthrottled, where lock-free readers mostly fall
+back to the lock because appends outrun the write guard).
+
+"""
+
+import time
+import multiprocessing as mp
+import numpy as np
+
+from rlpyt.replays.non_sequence.frame import AsyncUniformReplayFrameBuffer
+from rlpyt.utils.collections import namedarraytuple
+
+SamplesToBuffer = namedarraytuple("SamplesToBuffer",
+    ["observation", "action", "reward", "done"])
+
+
+def make_samples(T, B, n_frames=4, H=84, W=84):
+    return SamplesToBuffer(
+        observation=np.random.randint(0, 255, size=(T, B, n_frames, H, W),
+            dtype=np.uint8),
+        action=np.random.randint(0, 6, size=(T, B)),
+        reward=np.random.rand(T, B).astype(np.float32),
+        done=np.random.rand(T, B) < 0.01,
+    )
+
+
+def writer(replay, samples, stop, count, append_rate):
+    t0 = time.time()
+    while not stop.is_set():
+        replay.append_samples(samples)
+        count.value += 1
+        if append_rate > 0:
+            time.sleep(max(0., t0 + count.value / append_rate - time.time()))
+
+
+def reader(replay, batch_size, stop, count, seed):
+    np.random.seed(seed)
+    while not stop.is_set():
+        replay.sample_batch(batch_size)
+        count.value += 1
+
+
+def benchmark(size, B, T, batch_size, n_readers_list, duration, append_rate,
+        write_guard_T):
+    samples = make_samples(T, B)
+    print(f"{'lock_free':>9} {'readers':>7} {'batches/s':>10} {'appends/s':>10}")
+    for lock_free in (False, True):
+        for n_readers in n_readers_list:
+            replay = AsyncUniformReplayFrameBuffer(example=samples[0, 0],
+                size=size, B=B, shared_memory=True,
+                lock_free_sampling=lock_free,
+                write_guard_T=write_guard_T)
+            while not replay._buffer_full:  # Fill (off the clock).
+                replay.append_samples(samples)
+            stop = mp.Event()
+            append_count = mp.RawValue("l")
+            sample_counts = [mp.RawValue("l") for _ in range(n_readers)]
+            procs = [mp.Process(target=writer,
+                args=(replay, samples, stop, append_count, append_rate))]
+            procs += [mp.Process(target=reader,
+                args=(replay, batch_size, stop, c, i))
+                for i, c in enumerate(sample_counts)]
+            for p in procs:
+                p.start()
+            time.sleep(duration)
+            stop.set()
+            for p in procs:
+                p.join()
+            n_sampled = sum(c.value for c in sample_counts)
+            print(f"{lock_free!s:>9} {n_readers:>7} "
+                f"{n_sampled / duration:>10.1f} "
+                f"{append_count.value / duration:>10.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--size', help='replay size', type=int, default=int(1e5))
+    parser.add_argument('--B', help='parallel environments', type=int, default=8)
+    parser.add_argument('--T', help='time steps per append', type=int, default=16)
+    parser.add_argument('--batch_size', help='samples per batch', type=int, default=256)
+    parser.add_argument('--n_readers', help='sampling processes', type=int,
+        nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--append_rate', help='writer appends per second',
+        type=float, default=100.)
+    parser.add_argument('--write_guard_T', help='rows excluded ahead of cursor '
+        '(lock-free)', type=int, default=256)
+    parser.add_argument('--duration', help='seconds per setting', type=float,
+        default=5.)
+    args = parser.parse_args()
+    benchmark(
+        size=args.size,
+        B=args.B,
+        T=args.T,
+        batch_size=args.batch_size,
+        n_readers_list=args.n_readers,
+        duration=args.duration,
+        append_rate=args.append_rate,
+        write_guard_T=args.write_guard_T,
+    )
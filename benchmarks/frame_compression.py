@@ -0,0 +1,82 @@
+
+"""
+Measures memory and CPU cost of compressed frame storage in the frame
+replay buffer: fills a UniformReplayFrameBuffer with synthetic Atari-like
+frames (static background, a few moving sprites), with and without
+compress_frames, and reports bytes stored, append time, and sample time.
+
+"""
+
+import time
+import numpy as np
+
+from rlpyt.replays.non_sequence.frame import UniformReplayFrameBuffer
+from rlpyt.utils.collections import namedarraytuple
+
+SamplesToBuffer = namedarraytuple("SamplesToBuffer",
+    ["observation", "action", "reward", "done"])
+
+
+def synthetic_frames(T, B, H=84, W=84, n_sprites=4, seed=0):
+    rng = np.random.RandomState(seed)
+    background = rng.randint(0, 40, size=(H, W), dtype=np.uint8)
+    background[H // 2:] = 0
+    frames = np.broadcast_to(background, (T, B, H, W)).copy()
+    pos = rng.randint(0, min(H, W) - 8, size=(B, n_sprites, 2))
+    vel = rng.randint(-2, 3, size=(B, n_sprites, 2))
+    for t in range(T):
+        pos = np.clip(pos + vel, 0, min(H, W) - 8)
+        for b in range(B):
+            for y, x in pos[b]:
+                frames[t, b, y:y + 8, x:x + 8] = 200
+    return frames
+
+
+def frames_nbytes(replay):
+    if replay.compress_frames:
+        return sum(len(z) for z in replay.samples_frames.reshape(-1))
+    return replay.samples_frames.nbytes
+
+
+def benchmark(size, B, batch_size, n_frames=4, append_T=4, n_sample=100):
+    frames = synthetic_frames(size // B + n_frames, B)
+    T = len(frames) - n_frames + 1
+    st = frames.strides
+    observation = np.lib.stride_tricks.as_strided(frames,
+        shape=(T, B, n_frames) + frames.shape[2:],
+        strides=st[:2] + st[:1] + st[2:], writeable=False)  # [T,B,C,H,W] view.
+    samples = SamplesToBuffer(
+        observation=observation,
+        action=np.zeros((T, B), dtype=np.int64),
+        reward=np.zeros((T, B), dtype=np.float32),
+        done=np.zeros((T, B), dtype=bool),
+    )
+    for compress in (False, True):
+        replay = UniformReplayFrameBuffer(example=samples[0, 0], size=size,
+            B=B, compress_frames=compress)
+        t0 = time.time()
+        for t in range(0, replay.T - append_T, append_T):
+            replay.append_samples(samples[t:t + append_T])
+        append_time = (time.time() - t0) / (replay.T // append_T)
+        t0 = time.time()
+        for _ in range(n_sample):
+            replay.sample_batch(batch_size)
+        sample_time = (time.time() - t0) / n_sample
+        print(f"compress_frames={compress!s:>5}: "
+            f"frames {frames_nbytes(replay) / 1e6:8.1f} MB, "
+            f"append {1e3 * append_time:7.3f} ms, "
+            f"sample {1e3 * sample_time:7.3f} ms (batch {batch_size})")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--size', help='replay size', type=int, default=int(1e5))
+    parser.add_argument('--B', help='parallel environments', type=int, default=8)
+    parser.add_argument('--batch_size', help='samples per batch', type=int, default=256)
+    args = parser.parse_args()
+    benchmark(
+        size=args.size,
+        B=args.B,
+        batch_size=args.batch_size,
+    )
@@ -0,0 +1,92 @@
+"""
+Measures synchronization overhead in the parallel samplers' lock-step
+pattern, with the objects from build_par_objs(): per batch, all processes
+pass barrier_in and barrier_out (as CpuParallelSampler); per time step, the
+master acquires every worker's step_blocker and releases every act_waiter
+(as GpuParallelSampler).  Workers busy-wait env_time seconds per step, in
+place of stepping environments.  Reports time steps per second (master),
+with mp.Barrier / mp.Semaphore and with spin_wait=True.  Spinning yields
+the CPU between polls, so it stays near the semaphores when processes share
+cores; it gains in wake-up latency when each process has its own core
+(n_workers + 1 <= CPUs).
+
+"""
+
+import os
+import time
+import multiprocessing as mp
+
+from rlpyt.samplers.utils import build_par_objs
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def worker(ctrl, step_blocker, act_waiter, batch_T, env_time):
+    ctrl.barrier_out.wait()
+    while True:
+        ctrl.barrier_in.wait()
+        if ctrl.quit.value:
+            break
+        step_blocker.release()
+        for t in range(batch_T):
+            act_waiter.acquire()
+            busy(env_time)
+            step_blocker.release()
+        ctrl.barrier_out.wait()
+
+
+def benchmark(n_workers_list, batch_T, env_time, duration):
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'spin_wait':>9} {'workers':>7} {'steps/s':>10}")
+    for spin_wait in (False, True):
+        for n_workers in n_workers_list:
+            ctrl, _, sync = build_par_objs(n_workers, spin_wait=spin_wait)
+            procs = [mp.Process(target=worker, args=(ctrl,
+                sync.step_blockers[i], sync.act_waiters[i], batch_T,
+                env_time)) for i in range(n_workers)]
+            for p in procs:
+                p.start()
+            ctrl.barrier_out.wait()
+            n_steps = 0
+            t0 = time.time()
+            while time.time() - t0 < duration:
+                ctrl.barrier_in.wait()
+                for t in range(batch_T):
+                    for b in sync.step_blockers:
+                        b.acquire()
+                    for w in sync.act_waiters:
+                        w.release()
+                for b in sync.step_blockers:
+                    b.acquire()
+                ctrl.barrier_out.wait()
+                n_steps += batch_T
+            elapsed = time.time() - t0
+            ctrl.quit.value = True
+            ctrl.barrier_in.wait()
+            for p in procs:
+                p.join()
+            print(f"{spin_wait!s:>9} {n_workers:>7} {n_steps / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--n_workers', help='sampler worker processes', type=int,
+        nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--batch_T', help='time steps per batch', type=int,
+        default=5)
+    parser.add_argument('--env_time', help='seconds per worker step', type=float,
+        default=0.)
+    parser.add_argument('--duration', help='seconds per setting', type=float,
+        default=3.)
+    args = parser.parse_args()
+    benchmark(
+        n_workers_list=args.n_workers,
+        batch_T=args.batch_T,
+        env_time=args.env_time,
+        duration=args.duration,
+    )
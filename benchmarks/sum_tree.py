@@ -0,0 +1,70 @@
+
+"""
+Times SumTree against VectorizedSumTree on the operations used by
+prioritized replay: advance() (sampler append), sample() and
+update_batch_priorities() (one per optimizer update).  Both trees are driven
+with the same random stream, and their contents are checked to agree.
+
+"""
+
+import time
+import numpy as np
+
+from rlpyt.replays.sum_tree import SumTree, VectorizedSumTree
+
+
+def time_tree(TreeCls, T, B, batch_size, n_itr, append_T, seed=0):
+    tree = TreeCls(T=T, B=B, off_backward=3, off_forward=3)
+    while tree.t + append_T < T:  # Fill (off the clock).
+        tree.advance(append_T)
+    tree.advance(append_T)
+    rng = np.random.RandomState(seed)
+    np.random.seed(seed)
+    times = dict(advance=0., sample=0., update=0.)
+    for _ in range(n_itr):
+        t0 = time.time()
+        tree.advance(append_T)
+        t1 = time.time()
+        tree.sample(batch_size)
+        t2 = time.time()
+        tree.update_batch_priorities(rng.rand(batch_size))
+        t3 = time.time()
+        times["advance"] += t1 - t0
+        times["sample"] += t2 - t1
+        times["update"] += t3 - t2
+    return {k: 1e3 * v / n_itr for k, v in times.items()}, tree
+
+
+def benchmark(tree_sizes, batch_sizes, B=16, append_T=4, n_itr=100):
+    print(f"{'size':>10} {'batch':>6} {'class':>18} {'advance':>9} "
+        f"{'sample':>9} {'update':>9}  (ms per call)")
+    for size in tree_sizes:
+        T = size // B
+        for batch_size in batch_sizes:
+            results = list()
+            for TreeCls in (SumTree, VectorizedSumTree):
+                times, tree = time_tree(TreeCls, T, B, batch_size, n_itr,
+                    append_T)
+                results.append(tree)
+                print(f"{T * B:>10} {batch_size:>6} {TreeCls.__name__:>18} "
+                    f"{times['advance']:>9.3f} {times['sample']:>9.3f} "
+                    f"{times['update']:>9.3f}")
+            assert np.allclose(results[0].tree, results[1].tree)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--tree_sizes', help='number of leaves', type=int,
+        nargs='+', default=[int(1e4), int(1e5), int(1e6)])
+    parser.add_argument('--batch_sizes', help='samples per update', type=int,
+        nargs='+', default=[32, 256, 1024])
+    parser.add_argument('--B', help='parallel environments', type=int, default=16)
+    parser.add_argument('--n_itr', help='timed iterations', type=int, default=100)
+    args = parser.parse_args()
+    benchmark(
+        tree_sizes=args.tree_sizes,
+        batch_sizes=args.batch_sizes,
+        B=args.B,
+        n_itr=args.n_itr,
+    )
@@ -128,3 +128,51 @@ class RecurrentAgentMixin(object):
             self._sample_rnn_state = self._prev_rnn_state
         self._prev_rnn_state = None
         super().eval_mode(itr)
+
+
+class AlternatingRecurrentAgentMixin(RecurrentAgentMixin):
+    """For alternating samplers, which step the agent on two groups of envs
+    in turn: holds a recurrent state for each group, switching to the other
+    after each step (so reset_one() indexes within the current group).
+    toggle_alt() switches without stepping (e.g. around value())."""
+
+    alternating = True
+    _alt = 0
+    _rnn_state_pair = None
+    _sample_alt_state = (None, 0)  # Store during eval.
+
+    def reset(self):
+        super().reset()
+        self._rnn_state_pair = [None, None]
+        self._alt = 0
+
+    def advance_rnn_state(self, new_rnn_state):
+        if self._rnn_state_pair is None:
+            self._rnn_state_pair = [None, None]
+        self._rnn_state_pair[self._alt] = new_rnn_state
+        self.toggle_alt()
+
+    def toggle_alt(self):
+        self._alt ^= 1
+        pair = self._rnn_state_pair
+        self._prev_rnn_state = None if pair is None else pair[self._alt]
+
+    def train_mode(self, itr):
+        if self._mode == "sample":
+            self._sample_alt_state = (self._rnn_state_pair, self._alt)
+        super().train_mode(itr)
+
+    def sample_mode(self, itr):
+        restore = self._mode != "sample"
+        super().sample_mode(itr)
+        if restore:
+            self._rnn_state_pair, self._alt = self._sample_alt_state
+            self._alt ^= 1
+            self.toggle_alt()  # (Sets prev_rnn_state.)
+
+    def eval_mode(self, itr):
+        if self._mode == "sample":
+            self._sample_alt_state = (self._rnn_state_pair, self._alt)
+        super().eval_mode(itr)
+        self._rnn_state_pair = [None, None]
+        self._alt = 0
@@ -18,7 +18,7 @@ class DqnAgent(EpsilonGreedyAgentMixin, BaseAgent):
     def __call__(self, observation, prev_action, prev_reward):
         prev_action = self.distribution.to_onehot(prev_action)
         model_inputs = buffer_to((observation, prev_action, prev_reward),
-            device=self.device)
+            device=self.device, non_blocking=True)
         q = self.model(*model_inputs)
         return q.cpu()
 
@@ -78,7 +78,7 @@ class DqnAgent(EpsilonGreedyAgentMixin, BaseAgent):
     def target(self, observation, prev_action, prev_reward):
         prev_action = self.distribution.to_onehot(prev_action)
         model_inputs = buffer_to((observation, prev_action, prev_reward),
-            device=self.device)
+            device=self.device, non_blocking=True)
         target_q = self.target_model(*model_inputs)
         return target_q.cpu()
 
@@ -100,20 +100,20 @@ class DdpgAgent(BaseAgent):
 
     def q(self, observation, prev_action, prev_reward, action):
         model_inputs = buffer_to((observation, prev_action, prev_reward,
-            action), device=self.device)
+            action), device=self.device, non_blocking=True)
         q = self.q_model(*model_inputs)
         return q.cpu()
 
     def q_at_mu(self, observation, prev_action, prev_reward):
         model_inputs = buffer_to((observation, prev_action, prev_reward),
-            device=self.device)
+            device=self.device, non_blocking=True)
         mu = self.mu_model(*model_inputs)
         q = self.q_model(*model_inputs, mu)
         return q.cpu()
 
     def target_q_at_mu(self, observation, prev_action, prev_reward):
         model_inputs = buffer_to((observation, prev_action, prev_reward),
-            device=self.device)
+            device=self.device, non_blocking=True)
         target_mu = self.target_mu_model(*model_inputs)
         target_q_at_mu = self.target_q_model(*model_inputs, target_mu)
         return target_q_at_mu.cpu()
@@ -48,14 +48,14 @@ class Td3Agent(DdpgAgent):
 
     def q(self, observation, prev_action, prev_reward, action):
         model_inputs = buffer_to((observation, prev_action, prev_reward,
-            action), device=self.device)
+            action), device=self.device, non_blocking=True)
         q1 = self.q_model(*model_inputs)
         q2 = self.q2_model(*model_inputs)
         return q1.cpu(), q2.cpu()
 
     def target_q_at_mu(self, observation, prev_action, prev_reward):
         model_inputs = buffer_to((observation, prev_action, prev_reward),
-            device=self.device)
+            device=self.device, non_blocking=True)
         target_mu = self.target_mu_model(*model_inputs)
         target_action = self.target_distribution.sample(DistInfo(mean=target_mu))
         target_q1_at_mu = self.target_q_model(*model_inputs, target_action)
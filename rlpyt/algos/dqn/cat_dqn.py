@@ -2,8 +2,7 @@
 import torch
 
 from rlpyt.algos.dqn.dqn import DQN
-from rlpyt.utils.tensor import select_at_indexes, valid_mean
-from rlpyt.algos.utils import valid_from_done
+from rlpyt.utils.tensor import select_at_indexes
 
 
 EPS = 1e-6  # (NaN-guard)
@@ -67,11 +66,6 @@ class CategoricalDQN(DQN):
             (torch.log(target_p) - torch.log(p.detach())), dim=1)
         KL_div = torch.clamp(KL_div, EPS, 1 / EPS)  # Avoid <0 from NaN-guard.
 
-        if not self.mid_batch_reset:
-            valid = valid_from_done(samples.done)
-            loss = valid_mean(losses, valid)
-            KL_div *= valid
-        else:
-            loss = torch.mean(losses)
+        loss = torch.mean(losses)  # (Replay samples only valid entries.)
 
         return loss, KL_div
@@ -1,5 +1,6 @@
 
 import torch
+import os.path as osp
 from collections import namedtuple
 
 from rlpyt.algos.base import RlAlgorithm
@@ -8,9 +9,12 @@ from rlpyt.utils.logging import logger
 from rlpyt.replays.non_sequence.frame import (UniformReplayFrameBuffer,
     PrioritizedReplayFrameBuffer, AsyncUniformReplayFrameBuffer,
     AsyncPrioritizedReplayFrameBuffer)
+from rlpyt.replays.prefetch import PrefetchReplayBuffer
+from rlpyt.replays.sharded import ShardedReplayBuffer
+from rlpyt.replays.server import ReplayClient
+from rlpyt.replays.rate_limiter import RateLimiter
 from rlpyt.utils.collections import namedarraytuple
-from rlpyt.utils.tensor import select_at_indexes, valid_mean
-from rlpyt.algos.utils import valid_from_done
+from rlpyt.utils.tensor import select_at_indexes
 
 OptInfo = namedtuple("OptInfo", ["loss", "gradNorm", "tdAbsErr"])
 SamplesToBuffer = namedarraytuple("SamplesToBuffer",
@@ -49,8 +53,19 @@ class DQN(RlAlgorithm):
             pri_beta_init=0.4,
             pri_beta_final=1.,
             pri_beta_steps=int(50e6),
+            pri_update_interval=1,  # Defer tree writes over this many updates.
+            pri_stratified=False,  # One draw per equal segment of priority.
             default_priority=None,
             ReplayBufferCls=None,  # Leave None to select by above options.
+            replay_prefetch=0,  # Batches sampled ahead (background thread).
+            stage_replay_batches=False,  # Gather into preallocated, pinned.
+            compress_replay_frames=False,  # zlib per frame (not async).
+            replay_memmap=False,  # Disk-backed replay, in log dir (or next arg).
+            replay_memmap_dir=None,  # Directory for replay_memmap files.
+            replay_lock_free=False,  # Async: sample without lock (uniform).
+            replay_server=None,  # Address of a running ReplayServer to use.
+            lazy_n_step_returns=False,  # Compute at sample time, not stored.
+            replay_rate_limit=False,  # Async: block to hold training_ratio.
             ):
         if optim_kwargs is None:
             optim_kwargs = dict(eps=0.01 / batch_size)
@@ -59,7 +74,7 @@ class DQN(RlAlgorithm):
         save__init__args(locals())
 
     def initialize_replay_buffer(self, batch_spec, examples, mid_batch_reset,
-            async_=False):
+            async_=False, n_shards=1):
         example_to_buffer = SamplesToBuffer(
             observation=examples["observation"],
             action=examples["action"],
@@ -73,22 +88,63 @@ class DQN(RlAlgorithm):
             discount=self.discount,
             n_step_return=self.n_step_return,
             shared_memory=async_,
+            n_staging=self.replay_prefetch + 2 if self.stage_replay_batches
+                else 0,
+            pin_memory=True,  # (If staging and CUDA available.)
+            compress_frames=self.compress_replay_frames,
+            memmap_dir=self.replay_memmap_path(),
+            lazy_returns=self.lazy_n_step_returns,
+            store_valid=not mid_batch_reset,  # Never sample blanks.
         )
         if self.prioritized_replay:
             replay_kwargs.update(dict(
                 alpha=self.pri_alpha,
                 beta=self.pri_beta_init,
                 default_priority=self.default_priority,
+                update_interval=self.pri_update_interval,
+                stratified=self.pri_stratified,
             ))
             ReplayCls = (AsyncPrioritizedReplayFrameBuffer if async_ else
                 PrioritizedReplayFrameBuffer)
         else:
             ReplayCls = (AsyncUniformReplayFrameBuffer if async_ else
                 UniformReplayFrameBuffer)
-        self.replay_buffer = ReplayCls(**replay_kwargs)
+            if async_ and self.replay_lock_free:
+                replay_kwargs.update(dict(
+                    lock_free_sampling=True,
+                    write_guard_T=max(2 * batch_spec.T,  # Or 1% of buffer.
+                        self.replay_size // (100 * batch_spec.B)),
+                ))
+        self.rate_limiter = None
+        if async_ and self.replay_rate_limit and self.replay_server is None:
+            self.rate_limiter = replay_kwargs["rate_limiter"] = RateLimiter(
+                samples_per_insert=self.training_ratio,
+                min_size_to_sample=self.min_steps_learn,
+                error_buffer=(self.training_ratio * batch_spec.size +
+                    self.batch_size),  # Window fits an append and a batch.
+            )
+        if self.replay_server is not None:  # Buffer held by server process.
+            # (Async: each memcpy and optimizer process connects separately.)
+            self.replay_buffer = ReplayClient(self.replay_server)
+            self.replay_buffer.initialize(ReplayCls, **replay_kwargs)
+        elif n_shards > 1:  # Async: one shard per optimizer rank.
+            self.replay_buffer = ShardedReplayBuffer(ReplayCls,
+                n_shards=n_shards, **replay_kwargs)
+        else:
+            self.replay_buffer = ReplayCls(**replay_kwargs)
         self.mid_batch_reset = mid_batch_reset
         return self.replay_buffer
 
+    def replay_memmap_path(self):
+        if not self.replay_memmap:
+            return None
+        if self.replay_memmap_dir is not None:
+            return self.replay_memmap_dir
+        if logger.get_snapshot_dir() is None:
+            raise ValueError("replay_memmap=True needs replay_memmap_dir, or "
+                "a logger_context (files go in its log dir).")
+        return osp.join(logger.get_snapshot_dir(), "replay")
+
     def initialize_async(self, agent, updates_per_sync):
         if agent.recurrent:
             raise TypeError("For recurrent agents use r2d1 algo.")
@@ -148,7 +204,17 @@ class DQN(RlAlgorithm):
         if self.prioritized_replay:
             self.pri_beta_itr = max(1, self.pri_beta_steps // sample_bs)
 
+        if (self.replay_prefetch > 0 and self.prioritized_replay and
+                self.replay_server is not None):
+            raise ValueError("replay_prefetch with prioritized_replay needs "
+                "a local buffer: a replay server updates priorities of each "
+                "client's latest sample, which prefetching runs ahead of.")
         self.initialize_replay_buffer(batch_spec, examples, mid_batch_reset)
+        if self.replay_prefetch > 0:  # Sample batches in background thread.
+            self.replay_buffer = PrefetchReplayBuffer(self.replay_buffer,
+                n_prefetch=self.replay_prefetch,
+                pin_memory=(self.agent.device.type == "cuda" and
+                    not self.stage_replay_batches))  # (Staging pins.)
 
     def optimize_agent(self, itr, samples=None):
         if samples is not None:
@@ -203,12 +269,7 @@ class DQN(RlAlgorithm):
         if self.prioritized_replay:
             losses *= samples.is_weights
         td_abs_errors = torch.clamp(abs_delta.detach(), 0, self.delta_clip)
-        if not self.mid_batch_reset:
-            valid = valid_from_done(samples.done)
-            loss = valid_mean(losses, valid)
-            td_abs_errors *= valid
-        else:
-            loss = torch.mean(losses)
+        loss = torch.mean(losses)  # (Replay samples only valid entries.)
 
         return loss, td_abs_errors
 
@@ -1,5 +1,6 @@
 
 import torch
+import os.path as osp
 from collections import namedtuple
 
 from rlpyt.algos.base import RlAlgorithm
@@ -9,6 +10,7 @@ from rlpyt.utils.logging import logger
 from rlpyt.utils.collections import namedarraytuple
 from rlpyt.replays.sequence.frame import UniformSequenceReplayFrameBuffer
 from rlpyt.replays.sequence.frame import PrioritizedSequenceReplayFrameBuffer
+from rlpyt.replays.prefetch import PrefetchReplayBuffer
 from rlpyt.utils.tensor import select_at_indexes, valid_mean
 from rlpyt.algos.utils import valid_from_done
 from rlpyt.utils.buffer import buffer_to, buffer_method
@@ -55,9 +57,16 @@ class R2D1(RlAlgorithm):
             pri_beta_init=0.9,
             pri_beta_final=0.9,
             pri_beta_steps=int(50e6),
+            pri_update_interval=1,  # Defer tree writes over this many updates.
+            pri_stratified=False,  # One draw per equal segment of priority.
             pri_eta=0.9,
             default_priority=None,
             value_scale_eps=1e-2,
+            replay_prefetch=0,  # Batches sampled ahead (background thread).
+            compress_replay_frames=False,  # zlib per frame.
+            replay_memmap=False,  # Disk-backed replay, in log dir (or next arg).
+            replay_memmap_dir=None,  # Directory for replay_memmap files.
+            lazy_n_step_returns=False,  # Compute at sample time, not stored.
             ):
         if optim_kwargs is None:
             optim_kwargs = dict(eps=1e-3)  # Assumes Adam.
@@ -120,17 +129,37 @@ class R2D1(RlAlgorithm):
             n_step_return=self.n_step_return,
             rnn_state_interval=self.store_rnn_state_interval,
             batch_T=self.batch_T + self.warmup_T,  # Fixed for prioritized replay.
+            compress_frames=self.compress_replay_frames,
+            memmap_dir=self.replay_memmap_path(),
+            lazy_returns=self.lazy_n_step_returns,
+            store_valid=not mid_batch_reset,  # Start sequences at valid.
         )
         if self.prioritized_replay:
             replay_kwargs.update(dict(
                 alpha=self.pri_alpha,
                 beta=self.pri_beta_init,
                 default_priority=self.default_priority,
+                update_interval=self.pri_update_interval,
+                stratified=self.pri_stratified,
             ))
             ReplayCls = PrioritizedSequenceReplayFrameBuffer
         else:
             ReplayCls = UniformSequenceReplayFrameBuffer
         self.replay_buffer = ReplayCls(**replay_kwargs)
+        if self.replay_prefetch > 0:  # Sample batches in background thread.
+            self.replay_buffer = PrefetchReplayBuffer(self.replay_buffer,
+                n_prefetch=self.replay_prefetch,
+                pin_memory=self.agent.device.type == "cuda")
+
+    def replay_memmap_path(self):
+        if not self.replay_memmap:
+            return None
+        if self.replay_memmap_dir is not None:
+            return self.replay_memmap_dir
+        if logger.get_snapshot_dir() is None:
+            raise ValueError("replay_memmap=True needs replay_memmap_dir, or "
+                "a logger_context (files go in its log dir).")
+        return osp.join(logger.get_snapshot_dir(), "replay")
 
     def optimize_agent(self, itr, samples=None):
         if samples is not None:
@@ -6,6 +6,8 @@ from rlpyt.algos.base import RlAlgorithm
 from rlpyt.utils.quick_args import save__init__args
 from rlpyt.utils.logging import logger
 from rlpyt.replays.non_sequence.uniform import UniformReplayBuffer
+from rlpyt.replays.non_sequence.hindsight import UniformHindsightReplayBuffer
+from rlpyt.replays.prefetch import PrefetchReplayBuffer
 from rlpyt.utils.collections import namedarraytuple
 from rlpyt.utils.tensor import valid_mean
 from rlpyt.algos.utils import valid_from_done
@@ -14,6 +16,8 @@ OptInfo = namedtuple("OptInfo",
     ["muLoss", "qLoss", "muGradNorm", "qGradNorm"])
 SamplesToBuffer = namedarraytuple("SamplesToBuffer",
     ["observation", "action", "reward", "done"])
+SamplesToBufferGoal = namedarraytuple("SamplesToBufferGoal",
+    SamplesToBuffer._fields + ("achieved_goal",))
 
 
 class DDPG(RlAlgorithm):
@@ -38,6 +42,9 @@ class DDPG(RlAlgorithm):
             clip_grad_norm=1e6,
             q_target_clip=1e6,
             n_step_return=1,
+            replay_prefetch=0,  # Batches sampled ahead (background thread).
+            stage_replay_batches=False,  # Gather into preallocated, pinned.
+            hindsight_kwargs=None,  # Goal relabeling, e.g. compute_reward.
             ):
         if optim_kwargs is None:
             optim_kwargs = dict()
@@ -76,13 +83,28 @@ class DDPG(RlAlgorithm):
             reward=examples["reward"],
             done=examples["done"],
         )
+        if self.hindsight_kwargs is not None:  # (Goal env, GymWrapper.)
+            example_to_buffer = SamplesToBufferGoal(*example_to_buffer,
+                achieved_goal=examples["env_info"].achieved_goal)
         replay_kwargs = dict(
             example=example_to_buffer,
             size=self.replay_size,
             B=batch_spec.B,
-            n_step_return=self.n_step_return
+            n_step_return=self.n_step_return,
+            n_staging=self.replay_prefetch + 2 if self.stage_replay_batches
+                else 0,
+            pin_memory=True,  # (If staging and CUDA available.)
+            store_valid=not mid_batch_reset,  # Never sample blanks.
         )
-        self.replay_buffer = UniformReplayBuffer(**replay_kwargs)
+        if self.hindsight_kwargs is not None:
+            self.replay_buffer = UniformHindsightReplayBuffer(**replay_kwargs,
+                **self.hindsight_kwargs)
+        else:
+            self.replay_buffer = UniformReplayBuffer(**replay_kwargs)
+        if self.replay_prefetch > 0:  # Sample batches in background thread.
+            self.replay_buffer = PrefetchReplayBuffer(self.replay_buffer,
+                n_prefetch=self.replay_prefetch,
+                pin_memory=self.agent.device.type == "cuda")
 
     def optimize_agent(self, itr, samples=None):
         if samples is not None:
@@ -92,6 +114,9 @@ class DDPG(RlAlgorithm):
                 reward=samples.env.reward,
                 done=samples.env.done,
             )
+            if self.hindsight_kwargs is not None:
+                samples_to_buffer = SamplesToBufferGoal(*samples_to_buffer,
+                    achieved_goal=samples.env.env_info.achieved_goal)
             self.replay_buffer.append_samples(samples_to_buffer)
         opt_info = OptInfo(*([] for _ in range(len(OptInfo._fields))))
         if itr < self.min_itr_learn:
@@ -99,7 +124,7 @@ class DDPG(RlAlgorithm):
         for _ in range(self.updates_per_optimize):
             self.update_counter += 1
             samples_from_replay = self.replay_buffer.sample_batch(self.batch_size)
-            if self.mid_batch_reset and not self.agent.recurrent:
+            if not self.agent.recurrent:  # Replay samples only valid entries.
                 valid = None  # OR: torch.ones_like(samples.done, dtype=torch.float)
             else:
                 valid = valid_from_done(samples_from_replay.done)
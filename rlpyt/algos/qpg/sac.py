@@ -7,6 +7,8 @@ from rlpyt.algos.base import RlAlgorithm
 from rlpyt.utils.quick_args import save__init__args
 from rlpyt.utils.logging import logger
 from rlpyt.replays.non_sequence.uniform import UniformReplayBuffer
+from rlpyt.replays.non_sequence.hindsight import UniformHindsightReplayBuffer
+from rlpyt.replays.prefetch import PrefetchReplayBuffer
 from rlpyt.utils.collections import namedarraytuple
 from rlpyt.utils.buffer import buffer_to
 from rlpyt.distributions.gaussian import Gaussian
@@ -21,6 +23,8 @@ OptInfo = namedtuple("OptInfo",
     "q1", "q2", "v", "piMu", "piLogStd", "qMeanDiff"])
 SamplesToBuffer = namedarraytuple("SamplesToRepay",
     ["observation", "action", "reward", "done"])
+SamplesToBufferGoal = namedarraytuple("SamplesToBufferGoal",
+    SamplesToBuffer._fields + ("achieved_goal",))
 
 
 class SAC(RlAlgorithm):
@@ -46,6 +50,9 @@ class SAC(RlAlgorithm):
             clip_grad_norm=1e6,
             policy_output_regularization=0.001,
             n_step_return=1,
+            replay_prefetch=0,  # Batches sampled ahead (background thread).
+            stage_replay_batches=False,  # Gather into preallocated, pinned.
+            hindsight_kwargs=None,  # Goal relabeling, e.g. compute_reward.
             ):
         if optim_kwargs is None:
             optim_kwargs = dict()
@@ -82,13 +89,28 @@ class SAC(RlAlgorithm):
             reward=examples["reward"],
             done=examples["done"],
         )
+        if self.hindsight_kwargs is not None:  # (Goal env, GymWrapper.)
+            example_to_buffer = SamplesToBufferGoal(*example_to_buffer,
+                achieved_goal=examples["env_info"].achieved_goal)
         replay_kwargs = dict(
             example=example_to_buffer,
             size=self.replay_size,
             B=batch_spec.B,
             n_step_return=self.n_step_return,
+            n_staging=self.replay_prefetch + 2 if self.stage_replay_batches
+                else 0,
+            pin_memory=True,  # (If staging and CUDA available.)
+            store_valid=not mid_batch_reset,  # Never sample blanks.
         )
-        self.replay_buffer = UniformReplayBuffer(**replay_kwargs)
+        if self.hindsight_kwargs is not None:
+            self.replay_buffer = UniformHindsightReplayBuffer(**replay_kwargs,
+                **self.hindsight_kwargs)
+        else:
+            self.replay_buffer = UniformReplayBuffer(**replay_kwargs)
+        if self.replay_prefetch > 0:  # Sample batches in background thread.
+            self.replay_buffer = PrefetchReplayBuffer(self.replay_buffer,
+                n_prefetch=self.replay_prefetch,
+                pin_memory=self.agent.device.type == "cuda")
 
         if self.action_prior == "gaussian":
             self.action_prior_distribution = Gaussian(
@@ -102,6 +124,9 @@ class SAC(RlAlgorithm):
                 reward=samples.env.reward,
                 done=samples.env.done,
             )
+            if self.hindsight_kwargs is not None:
+                samples_to_buffer = SamplesToBufferGoal(*samples_to_buffer,
+                    achieved_goal=samples.env.env_info.achieved_goal)
             self.replay_buffer.append_samples(samples_to_buffer)
         opt_info = OptInfo(*([] for _ in range(len(OptInfo._fields))))
         if itr < self.min_itr_learn:
@@ -125,14 +150,14 @@ class SAC(RlAlgorithm):
         """Samples have leading batch dimension [B,..] (but not time)."""
         agent_inputs, target_inputs, action = buffer_to(
             (samples.agent_inputs, samples.target_inputs, samples.action),
-            device=self.agent.device)  # Move to device once, re-use.
+            device=self.agent.device, non_blocking=True)  # Move once, re-use.
         q1, q2 = self.agent.q(*agent_inputs, action)
         with torch.no_grad():
             target_v = self.agent.target_v(*target_inputs)
         disc = self.discount ** self.n_step_return
         y = (self.reward_scale * samples.return_ +
             (1 - samples.done_n.float()) * disc * target_v)
-        if self.mid_batch_reset and not self.agent.recurrent:
+        if not self.agent.recurrent:  # Replay samples only valid entries.
             valid = None  # OR: torch.ones_like(samples.done, dtype=torch.float)
         else:
             valid = valid_from_done(samples.done)
@@ -14,13 +14,23 @@ EnvInfo = None
 class GymWrapper(Wrapper):
     """Converts env_info from dict to namedtuple, and ensures actual
     observation dtype matches that of observation space (e.g. gym mujoco
-    environments have float32 obs space but actually output float64."""
+    environments have float32 obs space but actually output float64.
+
+    Goal envs (dict observations with "observation", "achieved_goal", and
+    "desired_goal", e.g. gym robotics) are flattened: the observation is
+    [observation, desired_goal] concatenated, and the achieved goal after
+    each step is added to env_info as "achieved_goal" (for hindsight
+    relabeling replay, with env.compute_reward)."""
 
     def __init__(self, env):
         super().__init__(env)
         o = self.env.reset()
-        assert isinstance(o, np.ndarray)
+        self.goal_env = isinstance(o, dict)
+        assert self.goal_env or isinstance(o, np.ndarray)
         o, r, d, info = self.env.step(self.action_space.sample())
+        if self.goal_env:
+            info = dict(info, achieved_goal=o["achieved_goal"])
+            o = self.flatten_observation(o)
         global EnvInfo  # In case pickling, define at module level.
         # (Might break down if wrapping multiple, different envs, if
         # so, make different files.)
@@ -29,18 +39,36 @@ class GymWrapper(Wrapper):
         # Wrap spaces to allow multiple samples at once.
         self.action_space = SpaceWrapper(self.env.action_space)
         dtype = np.float32 if o.dtype == np.float64 else None
-        self.observation_space = SpaceWrapper(self.env.observation_space,
-            dtype=dtype)
+        observation_space = self.env.observation_space
+        if self.goal_env:
+            spaces = [observation_space.spaces[k]
+                for k in ("observation", "desired_goal")]
+            observation_space = gym.spaces.Box(
+                low=np.concatenate([s.low.reshape(-1) for s in spaces]),
+                high=np.concatenate([s.high.reshape(-1) for s in spaces]),
+                dtype=o.dtype)
+        self.observation_space = SpaceWrapper(observation_space, dtype=dtype)
 
     def step(self, action):
         o, r, d, info = self.env.step(action)
+        if self.goal_env:
+            info = dict(info, achieved_goal=o["achieved_goal"])
+            o = self.flatten_observation(o)
         o = np.asarray(o, dtype=self.observation_space.dtype)
         # Fields appearing in info must be the same at every step.
         info = EnvInfo(**{k: v for k, v in info.items() if k in EnvInfo._fields})
         return EnvStep(o, r, d, info)
 
     def reset(self):
-        return np.asarray(self.env.reset(), dtype=self.observation_space.dtype)
+        o = self.env.reset()
+        if self.goal_env:
+            o = self.flatten_observation(o)
+        return np.asarray(o, dtype=self.observation_space.dtype)
+
+    def flatten_observation(self, o):
+        """Goal env dict observation to [observation, desired_goal]."""
+        return np.concatenate([np.asarray(o["observation"]).reshape(-1),
+            np.asarray(o["desired_goal"]).reshape(-1)])
 
     @property
     def spaces(self):
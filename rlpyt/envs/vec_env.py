@@ -0,0 +1,86 @@
+
+import numpy as np
+
+from rlpyt.envs.base import Env, EnvStep
+from rlpyt.utils.buffer import buffer_from_example
+
+
+class VecEnv(Env):
+    """
+    Batch of n_envs environments stepped together, with array inputs and
+    outputs: step(action) takes actions with leading dim [n_envs] and
+    returns EnvStep(observation[n_envs], reward[n_envs], done[n_envs],
+    env_info), with env_info a namedarraytuple of [n_envs] arrays (may be
+    empty, e.g. EnvInfo()).  Environments do not reset themselves: call
+    reset_envs(idxs) for those done (or traj_done, if in env_info), which
+    returns their new observations.  Spaces are those of one environment.
+
+    Samplers build one per worker, with n_envs keyword (see make_envs()),
+    for the batched (Vec-) collectors; a natively batched implementation
+    (e.g. simulating all envs in numpy) skips the per-env Python loop.
+    """
+
+    vectorized = True  # (Marks a class or factory for make_envs().)
+    n_envs = 1
+
+    def step(self, action):
+        raise NotImplementedError
+
+    def reset(self):
+        """Resets all environments, returning observations [n_envs]."""
+        return self.reset_envs(np.arange(self.n_envs))
+
+    def reset_envs(self, idxs):
+        """Resets environments at idxs, returning their observations."""
+        raise NotImplementedError
+
+
+class SerialVecEnv(VecEnv):
+    """Steps a list of ordinary environments in a loop, writing outputs into
+    preallocated arrays; for using the batched collectors with any env."""
+
+    def __init__(self, envs):
+        self.envs = envs
+        self.n_envs = len(envs)
+        o = envs[0].reset()
+        self.observation = buffer_from_example(o, self.n_envs)
+        self.reward = np.zeros(self.n_envs, dtype="float32")
+        self.done = np.zeros(self.n_envs, dtype=bool)
+        self.env_info = None  # Built at first step.
+        self._action_space = envs[0].action_space
+        self._observation_space = envs[0].observation_space
+
+    def step(self, action):
+        for b, env in enumerate(self.envs):
+            o, r, d, env_info = env.step(action[b])
+            if self.env_info is None:
+                self.env_info = buffer_from_example(env_info, self.n_envs)
+            self.observation[b] = o
+            self.reward[b] = r
+            self.done[b] = d
+            if env_info:
+                self.env_info[b] = env_info
+        return EnvStep(self.observation, self.reward, self.done, self.env_info)
+
+    def reset_envs(self, idxs):
+        for b in idxs:
+            self.observation[b] = self.envs[b].reset()
+        return self.observation[idxs]
+
+    @property
+    def horizon(self):
+        return self.envs[0].horizon
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def as_vec_env(envs):
+    """One VecEnv from a list of envs (a list holding one VecEnv, as built
+    by make_envs(), or ordinary envs)."""
+    if len(envs) == 1 and getattr(envs[0], "vectorized", False):
+        return envs[0]
+    if any(getattr(env, "vectorized", False) for env in envs):
+        raise TypeError("Expected one VecEnv or a list of ordinary envs.")
+    return SerialVecEnv(envs)
@@ -0,0 +1,141 @@
+
+"""
+CPU checks of replay buffer behavior across processes and snapshots, on
+small buffers of counting samples.  Run with pytest, or directly (runs
+every test_ function).
+"""
+
+import sys
+import tempfile
+import multiprocessing as mp
+import numpy as np
+
+from rlpyt.replays.non_sequence.prioritized import AsyncPrioritizedReplayBuffer
+from rlpyt.replays.non_sequence.uniform import UniformReplayBuffer
+from rlpyt.replays.sequence.uniform import UniformSequenceReplayBuffer
+from rlpyt.replays.non_sequence.frame import UniformReplayFrameBuffer
+from rlpyt.replays.non_sequence.hindsight import UniformHindsightReplayBuffer
+from rlpyt.utils.collections import namedarraytuple
+
+SamplesToBuffer = namedarraytuple("SamplesToBuffer",
+    ["observation", "action", "reward", "done"])
+EXAMPLE = SamplesToBuffer(observation=np.zeros(3, dtype=np.float32),
+    action=np.int64(0), reward=np.float32(0), done=False)
+
+
+def make_samples(T, B, start=0, done=None):
+    steps = np.arange(start, start + T, dtype=np.float32)[:, None]
+    return SamplesToBuffer(
+        observation=np.repeat(steps[..., None], 3, axis=-1) * np.ones((T, B, 3),
+            dtype=np.float32),
+        action=np.zeros((T, B), dtype=np.int64),
+        reward=steps * np.ones((T, B), dtype=np.float32),
+        done=np.zeros((T, B), dtype=bool) if done is None else done,
+    )
+
+
+def append_in_child(replay, samples_list):
+    """Appends from another process, as an async memory copier does (this
+    process's priority tree does not advance)."""
+    def append():
+        for samples in samples_list:
+            replay.append_samples(samples)
+    p = mp.Process(target=append)
+    p.start()
+    p.join()
+    assert p.exitcode == 0
+
+
+def test_async_snapshot_includes_appends_since_last_sample():
+    T, B, size = 4, 2, 64
+    kwargs = dict(example=EXAMPLE, size=size, B=B, n_step_return=2,
+        shared_memory=True)
+    replay = AsyncPrioritizedReplayBuffer(**kwargs)
+    append_in_child(replay, [make_samples(T, B, 4 * i) for i in range(3)])
+    replay.sample_batch(4)  # Syncs this process's tree.
+    append_in_child(replay, [make_samples(T, B, 4 * i) for i in range(3, 6)])
+    path = tempfile.mkdtemp()
+    replay.save_snapshot(path, chunk_T=8)
+    restored = AsyncPrioritizedReplayBuffer(**kwargs)
+    restored.load_snapshot(path)
+    replay.sync_priority_tree()  # As the next sample_batch() would.
+    assert np.array_equal(restored.priority_tree.tree,
+        replay.priority_tree.tree)
+
+
+def test_uniform_all_invalid_raises():
+    T, B = 8, 2
+    for ReplayCls, kwargs in [(UniformReplayBuffer, dict()),
+            (UniformSequenceReplayBuffer,
+            dict(rnn_state_interval=1, batch_T=2))]:
+        replay = ReplayCls(example=EXAMPLE, size=32, B=B, store_valid=True,
+            **kwargs)
+        replay.append_samples(make_samples(T, B))
+        replay.sample_idxs(4)  # All valid so far.
+        replay.samples_valid[:] = False
+        try:
+            replay.sample_idxs(4)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError(f"{ReplayCls.__name__} sampled no valid.")
+
+
+def test_frame_blanks_index_matches_scan():
+    T, B, n_frames, size = 5, 3, 4, 40
+    example = EXAMPLE._replace(observation=np.zeros((n_frames, 2, 2),
+        dtype=np.uint8))
+    replays = [UniformReplayFrameBuffer(example=example, size=size, B=B,
+        track_episodes=track) for track in (False, True)]
+    rng = np.random.RandomState(0)
+    for i in range(12):  # Wraps.
+        samples = make_samples(T, B, T * i, done=rng.rand(T, B) < 0.2)
+        samples = samples._replace(observation=np.zeros((T, B, n_frames, 2, 2),
+            dtype=np.uint8))
+        for replay in replays:
+            replay.append_samples(samples)
+        # Entries whose earlier frames' dones are stored or never written.
+        appended_T = replays[0]._appended_T
+        n_stored = (appended_T if appended_T <= replays[0].T else
+            replays[0].T - n_frames + 1)
+        t_idxs = (replays[0].t - 1 - np.arange(n_stored)) % replays[0].T
+        t_idxs, b_idxs = np.repeat(t_idxs, B), np.tile(np.arange(B), n_stored)
+        scan, index = (r.blank_frames(t_idxs, b_idxs) for r in replays)
+        assert np.array_equal(scan, index), f"Blanks differ, append {i}."
+
+
+def test_hindsight_relabels_prev_reward():
+    T, B, goal_dim = 6, 2, 2
+    GoalSamples = namedarraytuple("GoalSamples",
+        SamplesToBuffer._fields + ("achieved_goal",))
+
+    def compute_reward(achieved_goal, desired_goal, info):
+        return -np.abs(achieved_goal - desired_goal).sum(axis=-1)
+
+    replay = UniformHindsightReplayBuffer(compute_reward=compute_reward,
+        relabel_prob=1, example=GoalSamples(*EXAMPLE,
+        achieved_goal=np.zeros(goal_dim, dtype=np.float32)), size=32, B=B)
+    rng = np.random.RandomState(0)
+    for i in range(3):
+        samples = make_samples(T, B, T * i, done=rng.rand(T, B) < 0.3)
+        replay.append_samples(GoalSamples(*samples,
+            achieved_goal=rng.randn(T, B, goal_dim).astype(np.float32)))
+    T_idxs, B_idxs = replay.sample_idxs(64)
+    batch = replay.extract_batch(T_idxs, B_idxs)
+    goals = batch.agent_inputs.observation[:, -goal_dim:].numpy()
+    achieved = replay.samples.achieved_goal
+    prev_reward = compute_reward(achieved[T_idxs - 1, B_idxs], goals, None)
+    prev_reward[replay.samples.done[T_idxs - 1, B_idxs]] = 0
+    assert np.allclose(batch.agent_inputs.prev_reward.numpy(), prev_reward)
+    assert np.allclose(batch.target_inputs.prev_reward.numpy(),
+        batch.return_.numpy())
+
+
+if __name__ == "__main__":
+    tests = [(k, v) for k, v in sorted(globals().items())
+        if k.startswith("test_") and callable(v)]
+    for name, test in tests:
+        if len(sys.argv) > 1 and name not in sys.argv[1:]:
+            continue
+        test()
+        print(f"PASSED: {name}")
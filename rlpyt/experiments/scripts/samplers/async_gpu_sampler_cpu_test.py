@@ -0,0 +1,217 @@
+
+"""
+Runs AsyncGpuSampler end to end with a CPU-only agent: two action servers
+of two workers each, under the runner's run_async_sampler and
+memory_copier processes (as in AsyncRl), with evaluation.  Envs count
+steps in their observations and the agent acts on them deterministically,
+so the batches copied out can be checked for trajectory continuity across
+batches, for actions and agent_info matching the observations they were
+served for, and for bootstrap_value.
+
+Usage: python async_gpu_sampler_cpu_test.py [reset|wait] [mp|spin]
+(no arguments: all four combinations).
+"""
+
+import sys
+import os
+import importlib
+import multiprocessing as mp
+from collections import namedtuple
+import numpy as np
+import torch
+
+from rlpyt.envs.base import Env, EnvStep
+from rlpyt.spaces.int_box import IntBox
+from rlpyt.spaces.float_box import FloatBox
+from rlpyt.agents.base import BaseAgent, AgentStep
+from rlpyt.runners.async_rl import AsyncRl, run_async_sampler
+from rlpyt.utils.collections import namedarraytuple, AttrDict
+
+# (Package name "async" is a keyword since Python 3.7.)
+AsyncGpuSampler = importlib.import_module(
+    "rlpyt.samplers.async.async_gpu_sampler").AsyncGpuSampler
+_collectors = importlib.import_module("rlpyt.samplers.async.collectors")
+DbResetCollector = _collectors.DbResetCollector
+DbWaitResetCollector = _collectors.DbWaitResetCollector
+
+EnvInfo = namedtuple("EnvInfo", ["traj_done"])
+AgentInfo = namedarraytuple("AgentInfo", ["value"])
+N_ACTIONS = 3
+TIMEOUT = 120  # Seconds, for any one batch.
+
+
+class CounterEnv(Env):
+    """Observation is [steps in episode, steps since creation, env id];
+    reward is the action taken.  Episodes last 5 to 11 steps."""
+
+    _n_made = 0
+
+    def __init__(self):
+        CounterEnv._n_made += 1
+        self._id = os.getpid() * 1000 + CounterEnv._n_made
+        self._horizon = 5 + self._id % 7
+        self._count = self._total = 0
+        self._action_space = IntBox(low=0, high=N_ACTIONS)
+        self._observation_space = FloatBox(low=0, high=np.inf, shape=(3,),
+            dtype="float64")
+
+    def reset(self):
+        self._count = 0
+        return self._obs()
+
+    def step(self, action):
+        self._count += 1
+        self._total += 1
+        done = self._count >= self._horizon
+        return EnvStep(self._obs(), float(action), done, EnvInfo(done))
+
+    def _obs(self):
+        return np.array([self._count, self._total, self._id], dtype="float64")
+
+
+class CounterAgent(BaseAgent):
+    """Acts count % N_ACTIONS; value is total + 0.5 (of its observation)."""
+
+    def __init__(self):
+        super().__init__(ModelCls=torch.nn.Linear,
+            model_kwargs=dict(in_features=3, out_features=1))
+
+    def initialize(self, env_spaces, share_memory=False):
+        self.model = self.ModelCls(**self.model_kwargs)
+        if share_memory:
+            self.model.share_memory()
+            self.shared_model = self.model
+
+    def initialize_cuda(self, cuda_idx=None):
+        assert cuda_idx is None  # CPU only.
+
+    @torch.no_grad()
+    def step(self, observation, prev_action, prev_reward):
+        action = observation[..., 0].long() % N_ACTIONS
+        return AgentStep(action=action, agent_info=AgentInfo(
+            value=self.value(observation, prev_action, prev_reward)))
+
+    @torch.no_grad()
+    def value(self, observation, prev_action, prev_reward):
+        return (observation[..., 1] + 0.5).float()
+
+
+class BatchRecorder(object):
+    """Stands in for the replay buffer in memory copiers: sends a copy of
+    each batch back to the main process."""
+
+    def __init__(self):
+        self.queue = mp.Queue()
+
+    def append_samples(self, samples):
+        self.queue.put((np.array(samples.env.observation),
+            np.array(samples.env.done), np.array(samples.env.reward),
+            np.array(samples.agent.action),
+            np.array(samples.agent.agent_info.value),
+            np.array(samples.agent.bootstrap_value)))
+
+
+def build_affinity(n_server=2, n_worker=2):
+    cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else [0]
+    cpu = min(cpus)
+    return [dict(master_cpus=[cpu], master_torch_threads=1,
+        workers_cpus=[[cpu]] * n_worker, worker_torch_threads=1,
+        cuda_idx=None) for _ in range(n_server)]
+
+
+def run(CollectorCls, spin_wait, eval_max_trajectories, n_itr=12,
+        batch_T=7, batch_B=8, eval_itrs=5):
+    affinity = build_affinity()
+    sampler = AsyncGpuSampler(
+        EnvCls=CounterEnv,
+        env_kwargs=dict(),
+        batch_T=batch_T,
+        batch_B=batch_B,
+        max_decorrelation_steps=4,
+        CollectorCls=CollectorCls,
+        eval_n_envs=4,
+        eval_env_kwargs=dict(),
+        eval_max_steps=120,
+        eval_max_trajectories=eval_max_trajectories,
+        spin_wait=spin_wait,
+    )
+    agent = CounterAgent()
+    double_buffer, _ = sampler.master_runner_initialize(agent,
+        bootstrap_value=True)
+    runner = AsyncRl(algo=None, agent=agent, sampler=sampler,
+        n_steps=n_itr * batch_T * batch_B,
+        affinity=AttrDict(sampler=affinity, optimizer=[dict()]))
+    runner.ctrl = runner.build_ctrl(1)
+    recorder = BatchRecorder()
+    runner.launch_memcpy(double_buffer, recorder)
+    traj_infos_queue = mp.Queue()
+    sample_proc = mp.Process(target=run_async_sampler, kwargs=dict(
+        sampler=sampler, affinity=affinity, ctrl=runner.ctrl, seed=0,
+        traj_infos_queue=traj_infos_queue, n_itr=n_itr, eval_itrs=eval_itrs))
+    sample_proc.start()
+    # Copiers which wake after the sampler quits skip their batch, so the
+    # last two may be missing (earlier ones are always copied: the sampler
+    # waits for that before refilling the buffer).
+    batches = [recorder.queue.get(timeout=TIMEOUT)
+        for _ in range(n_itr - 2)]
+    sample_proc.join(timeout=TIMEOUT)
+    assert sample_proc.exitcode == 0, "Sampler did not finish."
+    for p in runner.memcpy_procs:
+        p.join(timeout=TIMEOUT)
+        assert p.exitcode == 0, "Memory copier did not finish."
+    while recorder.queue.qsize():
+        batches.append(recorder.queue.get())
+    traj_infos = list()
+    while traj_infos_queue.qsize():
+        traj_infos.append(traj_infos_queue.get())
+    # Double buffer: copiers may deliver out of order; order by steps.
+    batches = sorted(batches, key=lambda b: b[0][0, 0, 1])
+    if len(batches) < n_itr:  # Batch n_itr - 2 may be missing, not n_itr - 1.
+        batches = batches[:-1]
+    check_batches(batches, wait_reset=not CollectorCls.mid_batch_reset)
+    n_eval = len(range(0, n_itr, eval_itrs))
+    # (Each of 4 eval envs ends an episode within eval_max_T.)
+    min_traj = min(eval_max_trajectories or 4, 4)
+    assert len(traj_infos) >= n_eval * min_traj, (
+        f"Only {len(traj_infos)} evaluation trajectories.")
+    return len(traj_infos)
+
+
+def check_batches(batches, wait_reset):
+    """Batches in time order."""
+    observation, done, reward, action, value, bootstrap = (np.stack(x)
+        for x in zip(*batches))  # [batch, T, B, ...]
+    n_batch, T, B = done.shape
+    # Valid: not after a done within a batch (wait-reset records blanks).
+    valid = np.ones_like(done)
+    if wait_reset:
+        valid[:, 1:] = np.cumsum(done[:, :-1], axis=1) == 0
+    count, total, env_id = np.moveaxis(observation, -1, 0)
+    ids = [np.unique(env_id[:, :, b][valid[:, :, b]]) for b in range(B)]
+    assert all(len(i) == 1 for i in ids), "Env changed column."
+    assert len(np.unique(np.concatenate(ids))) == B, "Envs share a column."
+    for b in range(B):
+        steps = total[:, :, b][valid[:, :, b]]  # Time order.
+        assert np.all(np.diff(steps) == 1), f"Trajectory break, env {b}."
+    assert np.all((action == count % N_ACTIONS)[valid]), "Action mismatch."
+    assert np.all((reward == action)[valid]), "Reward mismatch."
+    assert np.all((value == total + 0.5)[valid]), "agent_info mismatch."
+    check_bv = ~np.any(done, axis=1) if wait_reset else np.ones((n_batch, B),
+        dtype=bool)  # (Wait-reset: bootstrap on blank after done.)
+    expected = total[:, -1] + 1.5
+    assert np.all((bootstrap[:, 0] == expected)[check_bv]), (
+        "bootstrap_value mismatch.")
+
+
+if __name__ == "__main__":
+    collectors = dict(reset=DbResetCollector, wait=DbWaitResetCollector)
+    syncs = dict(mp=False, spin=True)
+    c_keys = sys.argv[1:2] or list(collectors)
+    s_keys = sys.argv[2:3] or list(syncs)
+    for c_key in c_keys:
+        for s_key in syncs if not sys.argv[2:3] else s_keys:
+            for eval_max_trajectories in (3, 10000, None):
+                n = run(collectors[c_key], syncs[s_key], eval_max_trajectories)
+                print(f"PASSED: {c_key} collector, {s_key} sync, "
+                    f"eval_max_trajectories={eval_max_trajectories} "
+                    f"({n} eval trajectories).")
@@ -1,24 +1,125 @@
 
 import multiprocessing as mp
 
+from rlpyt.utils.buffer import get_leading_dims
 from rlpyt.utils.synchronize import RWLock
 
 
 class AsyncReplayBufferMixin(object):
+    """
+    Replay buffer in shared memory, appended to by one or more memory copier
+    processes and sampled by optimizer processes.  By default, every append
+    and sample goes through a readers-writer lock.
 
-    def __init__(self, *args, **kwargs):
+    With lock_free_sampling=True, samplers take no lock (a seqlock-style
+    scheme; writers still serialize among themselves).  A writer publishes
+    the end of its write (reserved) before copying, and advances the
+    committed cursor after.  Samplers read the committed cursor and exclude
+    write_guard_T rows ahead of it (the region the next appends will
+    overwrite), then check after gathering that writers have not reserved
+    past that region meanwhile; otherwise the batch is discarded and drawn
+    again (falling back to the lock after max_sample_retries).
+    write_guard_T must exceed the T of any one append (e.g. 2 * sampler
+    batch_T).  Uniform sampling only (priority tree is not shared).
+
+    Each process holds its own priority tree (if prioritized); a sampling
+    process advances its tree over steps appended by other processes, at
+    default priority, before sampling.
+
+    With a rate_limiter (RateLimiter), appends and samples first wait for
+    it to admit them (outside the lock), holding the ratio of entries
+    sampled to steps appended within its bounds.
+    """
+
+    def __init__(self, *args, lock_free_sampling=False, write_guard_T=None,
+            max_sample_retries=10, rate_limiter=None, **kwargs):
         kwargs.pop("shared_memory")
+        # Episode back-fills are written by appending processes but read by
+        # the snapshot-saving process (set from base __init__, so first).
+        self.async_episode_backfill_T = mp.RawValue("q")
         super().__init__(*args, shared_memory=True, **kwargs)
         self.async_t = mp.RawValue("l")  # Type c_long.
+        self.async_appended_T = mp.RawValue("q")  # Committed.
+        self.async_reserved_T = mp.RawValue("q")  # Being written, up to.
         self.rw_lock = RWLock()
+        self._tree_appended_T = 0  # Steps this process's tree has advanced.
+        self.lock_free_sampling = lock_free_sampling
+        self.rate_limiter = rate_limiter
+        self.max_sample_retries = max_sample_retries
+        if lock_free_sampling:
+            if hasattr(self, "priority_tree"):
+                raise ValueError("Lock-free sampling only for "
+                    "uniform replay.")
+            if write_guard_T is None:
+                raise ValueError("Lock-free sampling requires write_guard_T.")
+            self.write_guard_T = write_guard_T
+            self.off_forward += write_guard_T  # Samplers exclude guard rows.
 
-    def append_samples(self, *args, **kwargs):
+    @property
+    def _episode_backfill_T(self):
+        return self.async_episode_backfill_T.value
+
+    @_episode_backfill_T.setter
+    def _episode_backfill_T(self, value):
+        self.async_episode_backfill_T.value = value
+
+    def append_samples(self, samples):
+        T = get_leading_dims(samples, n_dim=1)[0]
+        if self.rate_limiter is not None:
+            self.rate_limiter.insert(T * self.B)
         with self.rw_lock.write_lock:
-            ret = super().append_samples(*args, **kwargs)
+            self.sync_cursor(self.async_appended_T.value)  # Other writers.
+            self.async_reserved_T.value = self._appended_T + T
+            ret = super().append_samples(samples)
             self.async_t.value = self.t
+            self.async_appended_T.value = self._appended_T  # Commit.
+            self._tree_appended_T = self._appended_T  # (Advanced in append.)
             return ret
 
-    def sample_batch(self, *args, **kwargs):
+    def sample_batch(self, batch_B, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.sample(batch_B)
+        if self.lock_free_sampling:
+            for _ in range(self.max_sample_retries):
+                appended_T = self.async_appended_T.value
+                self.sync_cursor(appended_T)
+                batch = super().sample_batch(batch_B, *args, **kwargs)
+                if (self.async_reserved_T.value - appended_T <=
+                        self.write_guard_T):
+                    return batch  # No writes reached sampled rows.
         with self.rw_lock:
-            self.t = self.async_t.value
-            return super().sample_batch(*args, **kwargs)
+            self.sync_cursor(self.async_appended_T.value)
+            self.sync_priority_tree()
+            return super().sample_batch(batch_B, *args, **kwargs)
+
+    def sync_cursor(self, appended_T):
+        """Set local cursor state from shared count of steps appended."""
+        self._appended_T = appended_T
+        self.t = appended_T % self.T
+        self._buffer_full = appended_T >= self.T
+
+    def sync_priority_tree(self):
+        """Advance this process's priority tree to the local cursor."""
+        tree = getattr(self, "priority_tree", None)
+        if tree is None:
+            return
+        n_new = self._appended_T - self._tree_appended_T
+        while n_new > 0:  # (Chunks, so range arithmetic cannot lap.)
+            T = min(n_new, self.T // 2)
+            self.advance_priority_tree(T)
+            n_new -= T
+        self._tree_appended_T = self._appended_T
+
+    def save_snapshot(self, *args, **kwargs):
+        with self.rw_lock:  # Sync cursor state written by appending process.
+            self.sync_cursor(self.async_appended_T.value)
+            self.sync_priority_tree()  # (Else appends since last sample lost.)
+            return super().save_snapshot(*args, **kwargs)
+
+    def load_snapshot(self, *args, **kwargs):
+        with self.rw_lock.write_lock:
+            super().load_snapshot(*args, **kwargs)
+            self.async_t.value = self.t
+            self.async_appended_T.value = self._appended_T
+            self.async_reserved_T.value = self._appended_T
+            self._tree_appended_T = self._appended_T
@@ -1,7 +1,8 @@
 
 import numpy as np
+import zlib
 
-from rlpyt.utils.buffer import buffer_from_example, get_leading_dims
+from rlpyt.utils.buffer import buffer_from_example, get_leading_dims, buffer_take
 from rlpyt.utils.collections import namedarraytuple
 from rlpyt.utils.logging import logger
 
@@ -20,9 +21,16 @@ class FrameBufferMixin(object):
     yet written.  Cursor invalid as "now" because previous action and
     reward overwritten.  NEW: Next n_frames-1 invalid as "now" because
     observation frames overwritten.
+
+    Optionally (compress_frames=True) stores each frame as a separate zlib
+    block, in an object array of bytes with the same [T+n_frames-1,B]
+    layout; frames are decompressed when gathered for a batch (each distinct
+    frame once).  Trades CPU for memory (Atari frames compress roughly
+    10x-20x); not available in shared memory or memmap.
     """
 
-    def __init__(self, example, shared_memory=False, **kwargs):
+    def __init__(self, example, shared_memory=False, compress_frames=False,
+            compress_level=1, **kwargs):
         field_names = [f for f in example._fields if f != "observation"]
         global BufferSamples
         BufferSamples = namedarraytuple("BufferSamples", field_names)
@@ -35,13 +43,27 @@ class FrameBufferMixin(object):
             n_dim=1)[0]
         logger.log(f"Frame-based buffer using {n_frames}-frame sequences.")
         # frames: oldest stored at t; duplicate n_frames - 1 beginning & end.
-        self.samples_frames = buffer_from_example(example.observation[0],
-            (self.T + n_frames - 1, self.B),
-            shared_memory=shared_memory)  # [T+n_frames-1,B,H,W]
+        self.compress_frames = compress_frames
+        self.compress_level = compress_level
+        if compress_frames:
+            if shared_memory or self.memmap_dir is not None:
+                raise ValueError("Compressed frames cannot be stored "
+                    "in shared memory or memmap.")
+            frame_example = np.asarray(example.observation[0])
+            self.frame_shape = frame_example.shape
+            self.frame_dtype = frame_example.dtype
+            self.samples_frames = np.empty((self.T + n_frames - 1, self.B),
+                dtype=object)  # [T+n_frames-1,B] of bytes.
+            self.samples_frames.fill(zlib.compress(
+                np.zeros_like(frame_example), compress_level))
+        else:
+            self.samples_frames = buffer_from_example(example.observation[0],
+                (self.T + n_frames - 1, self.B), shared_memory=shared_memory,
+                memmap_path=self.memmap_path("samples_frames")
+                )  # [T+n_frames-1,B,H,W]
         # new_frames: shifted so newest stored at t; no duplication.
         self.samples_new_frames = self.samples_frames[n_frames - 1:]  # [T,B,H,W]
-        self.samples_n_blanks = buffer_from_example(np.zeros(1, dtype="uint8"),
-            (self.T, self.B), shared_memory=shared_memory)
+        self._frame_offsets = np.arange(n_frames)  # For vectorized gathers.
         self.off_forward = max(self.off_forward, n_frames - 1)
 
     def append_samples(self, samples):
@@ -49,10 +71,74 @@ class FrameBufferMixin(object):
         buffer_samples = BufferSamples(*(v for k, v in samples.items()
             if k != "observation"))
         T, idxs = super().append_samples(buffer_samples)
-        self.samples_new_frames[idxs] = samples.observation[:, :, -1]
+        self.samples_new_frames[idxs] = self.frames_to_store(
+            samples.observation[:, :, -1])
         if t == 0:  # Starting: write early frames
             for f in range(fm1):
-                self.samples_frames[f] = samples.observation[0, :, f]
+                self.samples_frames[f] = self.frames_to_store(
+                    samples.observation[0, :, f])
         elif self.t < t:  # Wrapped: copy duplicate frames.
             self.samples_frames[:fm1] = self.samples_frames[-fm1:]
         return T, idxs
+
+    def snapshot_arrays(self):
+        return super().snapshot_arrays() + [("samples_frames",
+            self.samples_frames)]
+
+    def gather_frames(self, T_idxs, B_idxs, out=None):
+        """Returns samples_frames[T_idxs, B_idxs] (broadcastable index
+        arrays), decompressed if stored compressed; written into out if
+        given."""
+        if not self.compress_frames:
+            return buffer_take(self.samples_frames, T_idxs, B_idxs, out)
+        return self.decompress(buffer_take(self.samples_frames, T_idxs,
+            B_idxs), out)
+
+    def blank_frames(self, t_idxs, b_idxs):
+        """Mask [..,C-1] of the older frames (OLDEST to NEWEST, less the
+        newest) to zero at entries [t_idxs, b_idxs] (wrapped time idxs):
+        those from before the start of the entry's episode.  The first
+        episode appended has no done before it, so is not blanked."""
+        fm1 = self.n_frames - 1
+        if self.samples_episode_t is not None:  # Index: O(1) per entry.
+            episode_t = self.samples_episode_t[t_idxs, b_idxs]
+            age = (self.t - 1 - t_idxs) % self.T + 1  # Appends since entry.
+            first_episode = episode_t + age >= self._appended_T
+            n_blanks = np.where(first_episode, 0, fm1 - episode_t)
+            return self._frame_offsets[:-1] < n_blanks[..., None]
+        # Else scan: column f-1 for done f steps prior.
+        done_prior = self.samples.done[(t_idxs[..., None] -
+            self._frame_offsets[1:]) % self.T, b_idxs[..., None]]
+        blank_through = np.logical_or.accumulate(done_prior, axis=-1)
+        return blank_through[..., ::-1]
+
+    def frames_to_store(self, frames):
+        return self.compress(frames) if self.compress_frames else frames
+
+    def compress(self, frames):
+        """Frames [..,H,W] to object array [..] of zlib bytes."""
+        frames = np.asarray(frames)
+        leading_shape = frames.shape[:frames.ndim - len(self.frame_shape)]
+        compressed = np.empty(int(np.prod(leading_shape)), dtype=object)
+        for i, frame in enumerate(frames.reshape((-1,) + self.frame_shape)):
+            compressed[i] = zlib.compress(np.ascontiguousarray(frame),
+                self.compress_level)
+        return compressed.reshape(leading_shape)
+
+    def decompress(self, compressed, out=None):
+        """Object array [..] of zlib bytes to frames [..,H,W].  Stacked
+        observations share frames (the same bytes objects), so each distinct
+        frame is decompressed only once."""
+        if out is None:
+            out = np.empty(compressed.shape + self.frame_shape,
+                dtype=self.frame_dtype)
+        out_flat = out.reshape((-1,) + self.frame_shape)  # View.
+        decompressed = dict()
+        for i, z in enumerate(compressed.reshape(-1)):
+            frame = decompressed.get(id(z))
+            if frame is None:
+                frame = decompressed[id(z)] = np.frombuffer(
+                    zlib.decompress(z), dtype=self.frame_dtype
+                    ).reshape(self.frame_shape)
+            out_flat[i] = frame
+        return out
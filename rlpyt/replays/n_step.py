@@ -1,11 +1,16 @@
 
 import math
 import numpy as np
+import os
+import os.path as osp
 
 
 from rlpyt.replays.base import BaseReplayBuffer
-from rlpyt.utils.buffer import buffer_from_example, get_leading_dims
-from rlpyt.algos.utils import discount_return_n_step
+from rlpyt.replays.snapshot import (named_arrays, array_rows, save_chunks,
+    load_chunks, n_chunks, next_generation, save_state, load_state,
+    remove_stale)
+from rlpyt.utils.buffer import (buffer_from_example, get_leading_dims,
+    buffer_take)
 
 
 class BaseNStepReturnBuffer(BaseReplayBuffer):
@@ -13,39 +18,94 @@ class BaseNStepReturnBuffer(BaseReplayBuffer):
     all vectorized, as data is stored with leading dimensions [T,B].  Cursor
     is next idx to be written.
 
-    For now, Assume all incoming samples are "valid" (i.e. must have
-    mid_batch_reset=True in sampler).  Can relax this later by tracking valid
-    for each data sample.
+    By default, assume all incoming samples are "valid" (i.e. must have
+    mid_batch_reset=True in sampler).  With store_valid (for samplers
+    without mid_batch_reset, e.g. WaitResetCollector), each append must be
+    one whole sampler batch; steps after the first done in each environment
+    are blanks, marked invalid in samples_valid and never sampled (the
+    done step itself is valid).
 
     Subclass this with specific batch sampling scheme.
 
     Latest n_step times up to cursor invalid as "now" because "next" not yet
     written (off_backward).  Cursor invalid as "now" because previous action
     and reward overwritten (off_forward).
+
+    With memmap_dir, all sample arrays are disk-backed np.memmap files (.npy)
+    in that directory, e.g. for larger-than-RAM buffers.
+
+    With lazy_returns (and n_step_return > 1), n-step returns are not stored
+    but computed from rewards and dones for sampled entries only, in
+    extract_returns(): saves two buffer-sized arrays and the append-time
+    work, at some cost per sample.
+
+    With track_episodes, an index of episode boundaries in each B column is
+    kept up to date on append: samples_episode_t holds each entry's step
+    within its episode (0 at the first step after a done), and
+    samples_episode_T its episode's length once that episode has ended (0
+    while ongoing).  episode_bounds() then finds any entry's episode in
+    O(1), and frame buffers use it to blank frames from before the episode
+    without scanning done.
+
+    save_snapshot() / load_snapshot() checkpoint the buffer contents and
+    cursor to a directory of .npy chunks (chunk_T rows each); repeated saves
+    to the same directory rewrite only the chunks touched since the last
+    save.
     """
 
     def __init__(self, example, size, B, discount=1, n_step_return=1,
-            shared_memory=False):
+            shared_memory=False, memmap_dir=None, lazy_returns=False,
+            store_valid=False, track_episodes=False):
         self.T = T = math.ceil(size / B)
         self.B = B
         self.size = T * B
         self.discount = discount
         self.n_step_return = n_step_return
+        self.memmap_dir = memmap_dir
+        self.lazy_returns = lazy_returns = lazy_returns and n_step_return > 1
         self.t = 0  # Cursor (in T dimension).
         self.samples = buffer_from_example(example, (T, B),
-            shared_memory=shared_memory)
-        if n_step_return > 1:
+            shared_memory=shared_memory, memmap_path=self.memmap_path("samples"))
+        if lazy_returns:
+            self.samples_return_ = self.samples_done_n = None
+            self._return_offsets = np.arange(n_step_return)
+            self._return_discounts = (discount ** np.arange(n_step_return)
+                ).astype(self.samples.reward.dtype)
+        elif n_step_return > 1:
             self.samples_return_ = buffer_from_example(example.reward, (T, B),
-                shared_memory=shared_memory)
+                shared_memory=shared_memory,
+                memmap_path=self.memmap_path("samples_return_"))
             self.samples_done_n = buffer_from_example(example.done, (T, B),
-                shared_memory=shared_memory)
+                shared_memory=shared_memory,
+                memmap_path=self.memmap_path("samples_done_n"))
         else:
             self.samples_return_ = self.samples.reward
             self.samples_done_n = self.samples.done
+        self.samples_valid = None if not store_valid else buffer_from_example(
+            np.zeros((), dtype=bool), (T, B), shared_memory=shared_memory,
+            memmap_path=self.memmap_path("samples_valid"))
+        if track_episodes:
+            self.samples_episode_t, self.samples_episode_T = (
+                buffer_from_example(np.zeros((), dtype=np.int32), (T, B),
+                shared_memory=shared_memory, memmap_path=self.memmap_path(name))
+                for name in ("samples_episode_t", "samples_episode_T"))
+        else:
+            self.samples_episode_t = self.samples_episode_T = None
+        self._episode_backfill_T = 0  # Rows before cursor written since snapshot.
         self._buffer_full = False
+        self._return_scratch = None  # For compute_returns().
+        self._appended_T = 0  # Cumulative, for incremental snapshots.
+        self._snapshot_key = None  # (path, chunk_T) of last snapshot.
+        self._snapshot_chunk_gens = None  # name -> generation of each chunk.
+        self._snapshot_appended_T = 0
         self.off_backward = n_step_return  # Current invalid samples.
         self.off_forward = 1  # i.e. current cursor, prev_action overwritten.
 
+    def memmap_path(self, name):
+        """File path (less .npy) for named array, or None if not memmap."""
+        return None if self.memmap_dir is None else osp.join(self.memmap_dir,
+            name)
+
     def append_samples(self, samples):
         T, B = get_leading_dims(samples, n_dim=2)  # samples.env.reward.shape[:2]
         assert B == self.B
@@ -55,33 +115,208 @@ class BaseNStepReturnBuffer(BaseReplayBuffer):
         else:
             idxs = slice(t, t + T)
         self.samples[idxs] = samples
+        if self.samples_valid is not None:
+            self.samples_valid[idxs] = valid_from_done(samples.done)
+        if self.samples_episode_t is not None:
+            self.index_episodes(T, idxs)
         self.compute_returns(T)
         if not self._buffer_full and t + T >= self.T:
             self._buffer_full = True  # Only changes on first around.
         self.t = (t + T) % self.T
+        self._appended_T += T
         return T, idxs  # Pass these on to subclass.
 
+    def save_snapshot(self, path, chunk_T=1024):
+        """Write buffer contents to directory path.  If the previous snapshot
+        went to the same path, only chunks overlapping the cursor range
+        written since then (plus off_backward / off_forward margins, for
+        returns and frames written around the cursor) are rewritten.  Chunks
+        go to new files (next generation), so until the new state is written
+        the previous snapshot stays complete; then superseded files are
+        removed."""
+        os.makedirs(path, exist_ok=True)
+        n_new = self._appended_T - self._snapshot_appended_T
+        off_backward = max(self.off_backward, self._episode_backfill_T)
+        if ((path, chunk_T) != self._snapshot_key or
+                n_new + off_backward + self.off_forward >= self.T):
+            t_rows = None  # Write everything.
+        else:
+            t_start = self.t - n_new  # (May be negative; rows wrap.)
+            t_rows = np.arange(t_start - off_backward,
+                self.t + self.off_forward)
+        gen = next_generation(path)
+        chunk_gens = dict()
+        n_written = 0
+        for name, array in self.snapshot_arrays():
+            if t_rows is None:
+                gens = chunk_gens[name] = np.zeros(n_chunks(array, chunk_T),
+                    dtype=np.int64)
+                rows = None
+            else:
+                gens = chunk_gens[name] = self._snapshot_chunk_gens[name].copy()
+                rows = array_rows(t_rows, self.T, len(array))
+            n_written += save_chunks(path, name, array, chunk_T, gens, gen,
+                rows)
+        save_state(path, dict(self.snapshot_state(), T=self.T, B=self.B,
+            chunk_T=chunk_T, chunk_gens=chunk_gens))
+        remove_stale(path, chunk_gens)
+        self._snapshot_key = (path, chunk_T)
+        self._snapshot_chunk_gens = chunk_gens
+        self._snapshot_appended_T = self._appended_T
+        self._episode_backfill_T = 0
+        return n_written
+
+    def load_snapshot(self, path):
+        """Restore buffer contents and cursor from a snapshot directory
+        (written by a buffer of the same type and size); later snapshots to
+        the same path continue incrementally."""
+        state = load_state(path)
+        if (state["T"], state["B"]) != (self.T, self.B):
+            raise ValueError(f"Replay snapshot shape (T={state['T']}, "
+                f"B={state['B']}) does not match buffer (T={self.T}, "
+                f"B={self.B}).")
+        for name, array in self.snapshot_arrays():
+            load_chunks(path, name, array, state["chunk_T"],
+                state["chunk_gens"][name])
+        self.load_snapshot_state(state)
+        self._snapshot_key = (path, state["chunk_T"])
+        self._snapshot_chunk_gens = state["chunk_gens"]
+        self._snapshot_appended_T = self._appended_T
+
+    def snapshot_arrays(self):
+        """List of (name, array) saved in snapshots; subclasses extend."""
+        arrays = list(named_arrays("samples", self.samples))
+        if self.n_step_return > 1 and not self.lazy_returns:
+            arrays += [("samples_return_", self.samples_return_),
+                ("samples_done_n", self.samples_done_n)]
+        if self.samples_valid is not None:
+            arrays.append(("samples_valid", self.samples_valid))
+        if self.samples_episode_t is not None:
+            arrays += [("samples_episode_t", self.samples_episode_t),
+                ("samples_episode_T", self.samples_episode_T)]
+        return arrays
+
+    def snapshot_state(self):
+        """Non-array state saved in snapshots; subclasses extend."""
+        return dict(t=self.t, buffer_full=self._buffer_full,
+            appended_T=self._appended_T)
+
+    def load_snapshot_state(self, state):
+        self.t = state["t"]
+        self._buffer_full = state["buffer_full"]
+        self._appended_T = state["appended_T"]
+
+    def index_episodes(self, T, idxs):
+        """Write samples_episode_t for new entries at idxs (from the cursor),
+        continuing the episode of the entry before the cursor, and write
+        samples_episode_T over every episode which the new entries end."""
+        t, episode_t = self.t, self.samples_episode_t
+        done = self.samples.done[idxs].astype(bool, copy=False)  # [T,B]
+        prev_t = (np.zeros(self.B, dtype=episode_t.dtype) if self._appended_T == 0
+            else np.where(self.samples.done[t - 1], 0, episode_t[t - 1] + 1))
+        rows = np.arange(T)[:, None]
+        last_done = np.maximum.accumulate(np.where(done, rows, -1), axis=0)
+        new_t = prev_t + rows  # If no done yet in this append.
+        new_t[1:] = np.where(last_done[:-1] >= 0, rows[1:] - last_done[:-1] - 1,
+            new_t[1:])
+        episode_t[idxs] = new_t
+        self.samples_episode_T[idxs] = 0
+        end_t, end_b = np.nonzero(done)
+        if len(end_t) == 0:
+            return
+        lengths = new_t[end_t, end_b] + 1
+        n_fill = np.minimum(lengths, self.T - (T - 1 - end_t))  # (Stored.)
+        starts = np.cumsum(n_fill) - n_fill
+        back = np.arange(n_fill.sum()) - np.repeat(starts, n_fill)
+        fill_rows = (t + np.repeat(end_t, n_fill) - back) % self.T
+        self.samples_episode_T[fill_rows, np.repeat(end_b, n_fill)] = np.repeat(
+            lengths, n_fill)
+        self._episode_backfill_T = max(self._episode_backfill_T,
+            int(np.max(n_fill - 1 - end_t)))
+
+    def episode_bounds(self, T_idxs, B_idxs):
+        """Time idxs of the first and last entries of the episodes containing
+        entries [T_idxs, B_idxs] (requires track_episodes).  Not wrapped:
+        first may be negative, last may exceed T (take % T).  First is
+        limited to the oldest entry still stored; last is the newest entry
+        written (cursor - 1) for an episode still ongoing."""
+        T_idxs = np.asarray(T_idxs)
+        episode_t = self.samples_episode_t[T_idxs, B_idxs]
+        episode_T = self.samples_episode_T[T_idxs, B_idxs]
+        n_back = (T_idxs - self.t) % self.T if self._buffer_full else T_idxs
+        first = T_idxs - np.minimum(episode_t, n_back)
+        last = np.where(episode_T > 0, T_idxs - episode_t + episode_T - 1,
+            T_idxs + (self.t - 1 - T_idxs) % self.T)
+        return first, last
+
     def compute_returns(self, T):
-        """e.g. if 2-step return, t-1 is first return written here, using reward
-        at t-1 and new reward at t (up through t-1+T from t+T)."""
-        if self.n_step_return == 1:
-            return  # return = reward, done_n = done
+        """Incremental: each of the new rewards at [t, t+T) is added into the
+        (up to) n_step_return entries whose windows contain it, so entries
+        [t-n+1, t) hold partial sums (and done_n) from previous appends and
+        are completed here, and new entries are started.  Ring ranges are
+        handled as (at most three) slices each, with no temporary arrays
+        after the first call."""
+        if self.n_step_return == 1 or self.lazy_returns:
+            return  # return = reward, done_n = done; or computed at sample.
         t, s = self.t, self.samples
-        nm1 = self.n_step_return - 1
-        if t - nm1 >= 0 and t + T <= self.T:  # No wrap (operate in-place).
-            reward = s.reward[t - nm1:t + T]
-            done = s.done[t - nm1:t + T]
-            return_dest = self.samples_return_[t - nm1: t - nm1 + T]
-            done_n_dest = self.samples_done_n[t - nm1: t - nm1 + T]
-            discount_return_n_step(reward, done, n_step=self.n_step_return,
-                discount=self.discount, return_dest=return_dest,
-                done_n_dest=done_n_dest)
-        else:  # Wrap (copies); Let it (wrongly) wrap at first call.
-            idxs = np.arange(t - nm1, t + T) % T
-            reward = s.reward[idxs]
-            done = s.done[idxs]
-            dest_idxs = idxs[:-nm1]
-            return_, done_n = discount_return_n_step(reward, done,
-                n_step=self.n_step_return, discount=self.discount)
-            self.samples_return_[dest_idxs] = return_
-            self.samples_done_n[dest_idxs] = done_n
+        return_, done_n = self.samples_return_, self.samples_done_n
+        if self._return_scratch is None or len(self._return_scratch) < T:
+            self._return_scratch = np.empty((T,) + return_.shape[1:],
+                dtype=return_.dtype)
+        scratch = self._return_scratch
+        for dest, src in ring_slices(t, t, T, self.T):
+            return_[dest] = s.reward[src]
+            done_n[dest] = s.done[src]
+        for k in range(1, self.n_step_return):
+            # Entries [t-k, t+T-k) get their k-th term from rewards [t, t+T),
+            # less any old entries just overwritten (if T + k > self.T).
+            x = max(0, T + k - self.T)
+            for dest, src in ring_slices(t - k + x, t + x, T - x, self.T):
+                term = scratch[:dest.stop - dest.start]
+                np.multiply(s.reward[src], self.discount ** k, out=term)
+                term[done_n[dest]] = 0
+                return_[dest] += term
+                done_n[dest] |= s.done[src]
+
+    def extract_returns(self, T_idxs, B_idxs, return_out=None,
+            done_n_out=None):
+        """Returns (return_, done_n) at [T_idxs, B_idxs] (broadcastable idx
+        arrays), gathered, or computed if lazy_returns; written into outs if
+        given."""
+        if not self.lazy_returns:
+            return (buffer_take(self.samples_return_, T_idxs, B_idxs,
+                return_out), buffer_take(self.samples_done_n, T_idxs,
+                B_idxs, done_n_out))
+        T_idxs = np.asarray(T_idxs)[..., None] + self._return_offsets
+        B_idxs = np.asarray(B_idxs)[..., None]
+        reward = buffer_take(self.samples.reward, T_idxs, B_idxs)  # [..,n]
+        done = buffer_take(self.samples.done, T_idxs, B_idxs)
+        done_through = np.logical_or.accumulate(done, axis=-1)
+        reward[..., 1:][done_through[..., :-1]] = 0  # Not after done.
+        return_ = np.matmul(reward, self._return_discounts)
+        done_n = done_through[..., -1].astype(done.dtype, copy=False)
+        if return_out is not None:
+            return_out[:] = return_
+            done_n_out[:] = done_n
+            return return_out, done_n_out
+        return return_, done_n
+
+
+def valid_from_done(done):
+    """Valid [T,B] for one sampler batch: False after the first done in each
+    column (numpy version of rlpyt.algos.utils.valid_from_done)."""
+    valid = np.ones(done.shape, dtype=bool)
+    valid[1:] = ~np.logical_or.accumulate(done[:-1], axis=0)
+    return valid
+
+
+def ring_slices(start_a, start_b, length, T):
+    """Split two ranges of given length, starting at start_a and start_b on a
+    ring of size T, into pairs of corresponding contiguous slices."""
+    a, b = start_a % T, start_b % T
+    if a + length <= T and b + length <= T:  # (Usual case.)
+        return [(slice(a, a + length), slice(b, b + length))]
+    cuts = sorted({0, length} | {c for c in (T - a, T - b) if 0 < c < length})
+    return [(slice((a + lo) % T, (a + lo) % T + hi - lo),
+        slice((b + lo) % T, (b + lo) % T + hi - lo))
+        for lo, hi in zip(cuts[:-1], cuts[1:])]
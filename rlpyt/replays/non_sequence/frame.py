@@ -1,6 +1,4 @@
 
-import numpy as np
-
 from rlpyt.replays.non_sequence.n_step import NStepReturnBuffer
 from rlpyt.replays.frame import FrameBufferMixin
 from rlpyt.replays.non_sequence.uniform import UniformReplay
@@ -10,18 +8,15 @@ from rlpyt.replays.async_ import AsyncReplayBufferMixin
 
 class NStepFrameBuffer(FrameBufferMixin, NStepReturnBuffer):
 
-    def extract_observation(self, T_idxs, B_idxs):
+    def extract_observation(self, T_idxs, B_idxs, out=None):
         """Frames are returned OLDEST to NEWEST."""
         # Begin/end frames duplicated in samples_frames so no wrapping here.
-        # return np.stack([self.samples_frames[t:t + self.n_frames, b]
-        #     for t, b in zip(T_idxs, B_idxs)], axis=0)  # [B,C,H,W]
-        observation = np.stack([self.samples_frames[t:t + self.n_frames, b]
-            for t, b in zip(T_idxs, B_idxs)], axis=0)  # [B,C,H,W]
+        # One gather: frame f of sample i is samples_frames[T_idxs[i] + f].
+        observation = self.gather_frames(T_idxs[:, None] + self._frame_offsets,
+            B_idxs[:, None], out)  # [B,C,H,W]
         # Populate empty (zero) frames after environment done.
-        for f in range(1, self.n_frames):
-            # e.g. if done 1 step prior, all but newest frame go blank.
-            b_blanks = np.where(self.samples.done[T_idxs - f, B_idxs])[0]
-            observation[b_blanks, :self.n_frames - f] = 0
+        # e.g. if done 1 step prior, all but newest frame go blank.
+        observation[:, :-1][self.blank_frames(T_idxs % self.T, B_idxs)] = 0
         return observation
 
 
@@ -0,0 +1,85 @@
+
+import numpy as np
+
+from rlpyt.replays.non_sequence.n_step import NStepReturnBuffer
+from rlpyt.replays.non_sequence.uniform import UniformReplay
+from rlpyt.replays.non_sequence.prioritized import PrioritizedReplay
+from rlpyt.utils.buffer import numpify_buffer
+from rlpyt.utils.quick_args import save__init__args
+
+STRATEGIES = ("future", "episode", "random")
+
+
+class HindsightReplay(object):
+    """
+    Hindsight experience replay for goal-conditioned envs (e.g. gym robotics
+    GoalEnvs wrapped by GymWrapper): observations end with the desired goal
+    (its last goal_dim elements), and samples include the achieved_goal
+    after each step (from env_info).  At sampling, each entry is relabeled
+    with probability relabel_prob: the desired goal in its observation and
+    target observation is replaced by a goal achieved at another entry,
+    chosen by strategy:
+
+    - "future": a later step of the same episode (or the same step),
+    - "episode": any step of the same episode,
+    - "random": any entry in the buffer,
+
+    and its reward (also the target inputs' prev_reward) and the agent
+    inputs' prev_reward (still 0 at episode starts) are recomputed for the
+    new goal, for all relabeled entries in one call,
+    compute_reward(achieved_goal, desired_goal, info) (vectorized, as
+    gym GoalEnv.compute_reward; info is None).  Episodes are found through
+    the buffer's episode index (track_episodes).  One-step returns only.
+    """
+
+    def __init__(self, compute_reward, strategy="future", relabel_prob=0.8,
+            **kwargs):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown hindsight strategy: {strategy}; "
+                f"choose from {STRATEGIES}.")
+        if kwargs.get("n_step_return", 1) != 1:
+            raise ValueError("Hindsight relabeling requires n_step_return=1.")
+        kwargs["track_episodes"] = True
+        super().__init__(**kwargs)
+        save__init__args(locals())
+        self.goal_dim = self.samples.achieved_goal.shape[-1]
+
+    def extract_batch(self, T_idxs, B_idxs):
+        batch = super().extract_batch(T_idxs, B_idxs)
+        i = np.nonzero(np.random.rand(len(T_idxs)) < self.relabel_prob)[0]
+        if len(i) == 0:
+            return batch
+        goals = self.sample_goals(T_idxs[i], B_idxs[i])
+        b = numpify_buffer(batch)  # (Views: written in place.)
+        b.agent_inputs.observation[i, -self.goal_dim:] = goals
+        b.target_inputs.observation[i, -self.goal_dim:] = goals
+        T_i, B_i = T_idxs[i], B_idxs[i]
+        achieved = self.samples.achieved_goal
+        rewards = self.compute_reward(np.concatenate([achieved[T_i, B_i],
+            achieved[T_i - 1, B_i]]), np.concatenate([goals, goals]), None)
+        b.return_[i] = b.target_inputs.prev_reward[i] = rewards[:len(i)]
+        b.agent_inputs.prev_reward[i] = np.where(
+            self.samples.done[T_i - 1, B_i], 0, rewards[len(i):])
+        return batch
+
+    def sample_goals(self, T_idxs, B_idxs):
+        """Achieved goals to substitute at entries [T_idxs, B_idxs]."""
+        if self.strategy == "random":  # (Uniform over valid entries.)
+            goal_T_idxs, B_idxs = self.sample_idxs(len(T_idxs))
+        else:
+            first, last = self.episode_bounds(T_idxs, B_idxs)
+            if self.strategy == "future":
+                first = T_idxs
+            goal_T_idxs = first + (np.random.rand(len(T_idxs)) *
+                (last - first + 1)).astype(np.int64)
+        return self.samples.achieved_goal[goal_T_idxs % self.T, B_idxs]
+
+
+class UniformHindsightReplayBuffer(HindsightReplay, UniformReplay,
+        NStepReturnBuffer):
+    pass
+
+
+class PrioritizedHindsightReplayBuffer(HindsightReplay, PrioritizedReplay,
+        UniformReplay, NStepReturnBuffer):
+    pass  # (UniformReplay.sample_idxs() for "random" goals.)
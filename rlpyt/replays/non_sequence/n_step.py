@@ -4,38 +4,84 @@ import numpy as np
 from rlpyt.replays.n_step import BaseNStepReturnBuffer
 from rlpyt.agents.base import AgentInputs
 from rlpyt.utils.collections import namedarraytuple
-from rlpyt.utils.buffer import torchify_buffer
+from rlpyt.utils.buffer import torchify_buffer, buffer_take, buffer_from_example
 
 SamplesFromReplay = namedarraytuple("SamplesFromReplay",
     ["agent_inputs", "action", "return_", "done", "done_n", "target_inputs"])
 
 
 class NStepReturnBuffer(BaseNStepReturnBuffer):
+    """Optionally gathers batches in place into a ring of n_staging
+    preallocated batch buffers (pinned, if pin_memory and CUDA available,
+    for non_blocking copies to device), so sampling allocates nothing.  A
+    returned batch is overwritten n_staging batches later; keep n_staging
+    larger than the number of batches held at once (e.g. prefetched)."""
+
+    def __init__(self, *args, n_staging=0, pin_memory=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.n_staging = n_staging
+        self.pin_memory = pin_memory
+        self._staging = None
 
     def extract_batch(self, T_idxs, B_idxs):
         s = self.samples
         target_T_idxs = (T_idxs + self.n_step_return) % self.T
+        out = self.next_staging_buffer(len(B_idxs))
+        return_, done_n = self.extract_returns(T_idxs, B_idxs, out.return_,
+            out.done_n)
         batch = SamplesFromReplay(
             agent_inputs=AgentInputs(
-                observation=self.extract_observation(T_idxs, B_idxs),
-                prev_action=s.action[T_idxs - 1, B_idxs],
-                prev_reward=s.reward[T_idxs - 1, B_idxs],
+                observation=self.extract_observation(T_idxs, B_idxs,
+                    out.agent_inputs.observation),
+                prev_action=buffer_take(s.action, T_idxs - 1, B_idxs,
+                    out.agent_inputs.prev_action),
+                prev_reward=buffer_take(s.reward, T_idxs - 1, B_idxs,
+                    out.agent_inputs.prev_reward),
             ),
-            action=s.action[T_idxs, B_idxs],
-            return_=self.samples_return_[T_idxs, B_idxs],
-            done=self.samples.done[T_idxs, B_idxs],
-            done_n=self.samples_done_n[T_idxs, B_idxs],
+            action=buffer_take(s.action, T_idxs, B_idxs, out.action),
+            return_=return_,
+            done=buffer_take(s.done, T_idxs, B_idxs, out.done),
+            done_n=done_n,
             target_inputs=AgentInputs(
-                observation=self.extract_observation(target_T_idxs, B_idxs),
-                prev_action=s.action[target_T_idxs - 1, B_idxs],
-                prev_reward=s.reward[target_T_idxs - 1, B_idxs],
+                observation=self.extract_observation(target_T_idxs, B_idxs,
+                    out.target_inputs.observation),
+                prev_action=buffer_take(s.action, target_T_idxs - 1, B_idxs,
+                    out.target_inputs.prev_action),
+                prev_reward=buffer_take(s.reward, target_T_idxs - 1, B_idxs,
+                    out.target_inputs.prev_reward),
             ),
         )
         t_news = np.where(s.done[T_idxs - 1, B_idxs])[0]
         batch.agent_inputs.prev_action[t_news] = 0
         batch.agent_inputs.prev_reward[t_news] = 0
+        if self.n_staging > 0 and out is NO_STAGING:
+            self.build_staging_buffers(batch)
         return torchify_buffer(batch)
 
-    def extract_observation(self, T_idxs, B_idxs):
+    def extract_observation(self, T_idxs, B_idxs, out=None):
         """Generalization anticipating frame-based buffer."""
-        return self.samples.observation[T_idxs, B_idxs]
+        return buffer_take(self.samples.observation, T_idxs, B_idxs, out)
+
+    def next_staging_buffer(self, batch_B):
+        """Next batch buffer in the ring, or NO_STAGING (all fields None, so
+        gathers allocate) if not staging or none yet built for batch_B."""
+        if self._staging is None or len(self._staging[0].action) != batch_B:
+            return NO_STAGING
+        self._staging_idx = (self._staging_idx + 1) % self.n_staging
+        return self._staging[self._staging_idx]
+
+    def build_staging_buffers(self, batch):
+        """Allocate ring of n_staging buffers shaped like batch."""
+        self._staging = [buffer_from_example(batch[0], (len(batch.action),),
+            pin_memory=self.pin_memory) for _ in range(self.n_staging)]
+        self._staging_idx = 0
+
+
+NO_STAGING = SamplesFromReplay(
+    agent_inputs=AgentInputs(None, None, None),
+    action=None,
+    return_=None,
+    done=None,
+    done_n=None,
+    target_inputs=AgentInputs(None, None, None),
+)
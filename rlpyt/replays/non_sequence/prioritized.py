@@ -1,7 +1,9 @@
 
+import numpy as np
+
 from rlpyt.replays.non_sequence.n_step import NStepReturnBuffer, SamplesFromReplay
 from rlpyt.replays.async_ import AsyncReplayBufferMixin
-from rlpyt.replays.sum_tree import SumTree
+from rlpyt.replays.sum_tree import SumTree, VectorizedSumTree
 from rlpyt.utils.collections import namedarraytuple
 from rlpyt.utils.quick_args import save__init__args
 from rlpyt.utils.buffer import torchify_buffer, numpify_buffer
@@ -15,35 +17,58 @@ SamplesFromReplayPri = namedarraytuple("SamplesFromReplayPri",
 class PrioritizedReplay(object):
 
     def __init__(self, alpha=0.6, beta=0.4, default_priority=1, unique=False,
-            **kwargs):
+            stratified=False, global_is_norm=False, update_interval=1,
+            vectorized_tree=True, **kwargs):
         super().__init__(**kwargs)
         save__init__args(locals())
         self.init_priority_tree()
 
     def init_priority_tree(self):
         """Organized here for clean inheritance."""
-        self.priority_tree = SumTree(
+        TreeCls = VectorizedSumTree if self.vectorized_tree else SumTree
+        self.priority_tree = TreeCls(
             T=self.T,
             B=self.B,
             off_backward=self.off_backward,
             off_forward=self.off_forward,
             default_value=self.default_priority ** self.alpha,
+            track_min=self.global_is_norm,
+            track_valid=self.samples_valid is not None,
+            update_interval=self.update_interval,
         )
 
     def set_beta(self, beta):
         self.beta = beta
 
+    def snapshot_state(self):
+        return dict(super().snapshot_state(),
+            priority_tree=self.priority_tree.state_dict())
+
+    def load_snapshot_state(self, state):
+        super().load_snapshot_state(state)
+        self.priority_tree.load_state_dict(state["priority_tree"])
+
     def append_samples(self, samples):
         T, idxs = super().append_samples(samples)
-        self.priority_tree.advance(T)  # Progress priority_tree cursor.
+        self.advance_priority_tree(T)
         return T, idxs
 
+    def advance_priority_tree(self, T):
+        """Progress priority_tree cursor over T steps appended at it."""
+        valid = None if self.samples_valid is None else self.samples_valid[
+            np.arange(self.priority_tree.t, self.priority_tree.t + T) % self.T]
+        self.priority_tree.advance(T, valid=valid)
+
     def sample_batch(self, batch_B):
         (T_idxs, B_idxs), priorities = self.priority_tree.sample(batch_B,
-            unique=self.unique)
+            unique=self.unique, stratified=self.stratified)
         batch = self.extract_batch(T_idxs, B_idxs)
         is_weights = (1. / (priorities + EPS)) ** self.beta  # Unnormalized.
-        is_weights /= max(is_weights)  # Normalize.
+        if self.global_is_norm:  # Normalize by largest weight in buffer.
+            is_weights /= (1. / (self.priority_tree.min_priority() + EPS)
+                ) ** self.beta
+        else:
+            is_weights /= max(is_weights)  # Normalize within batch.
         is_weights = torchify_buffer(is_weights).float()
         return SamplesFromReplayPri(*batch, is_weights=is_weights)
 
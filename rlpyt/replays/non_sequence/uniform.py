@@ -7,11 +7,29 @@ from rlpyt.replays.async_ import AsyncReplayBufferMixin
 
 class UniformReplay(object):
 
+    max_invalid_redraws = 100  # Of entries drawn invalid (if tracked).
+
     def sample_batch(self, batch_B):
         T_idxs, B_idxs = self.sample_idxs(batch_B)
         return self.extract_batch(T_idxs, B_idxs)
 
     def sample_idxs(self, batch_B):
+        T_idxs, B_idxs = self.draw_idxs(batch_B)
+        if self.samples_valid is not None:  # Redraw any invalid.
+            invalid = np.where(~self.samples_valid[T_idxs, B_idxs])[0]
+            for _ in range(self.max_invalid_redraws):
+                if len(invalid) == 0:
+                    break
+                T_idxs[invalid], B_idxs[invalid] = self.draw_idxs(len(invalid))
+                invalid = invalid[~self.samples_valid[T_idxs[invalid],
+                    B_idxs[invalid]]]
+            if len(invalid) > 0:
+                raise RuntimeError(f"{len(invalid)} samples still invalid "
+                    f"after {self.max_invalid_redraws} redraws; buffer may "
+                    "hold no valid samples.")
+        return T_idxs, B_idxs
+
+    def draw_idxs(self, batch_B):
         t, b, f = self.t, self.off_backward, self.off_forward
         high = self.T - b - f if self._buffer_full else t - b
         low = 0 if self._buffer_full else f
@@ -0,0 +1,128 @@
+
+import queue
+import threading
+
+from rlpyt.replays.base import BaseReplayBuffer
+from rlpyt.utils.buffer import buffer_method, numpify_buffer
+
+
+class PrefetchReplayBuffer(BaseReplayBuffer):
+    """
+    Wraps a (serial) replay buffer so that batches are sampled by a
+    background thread into a bounded queue, overlapping the CPU gather work
+    with the learner's forward/backward (numpy and torch release the GIL for
+    the heavy parts).  The wrapped buffer is only ever accessed under a lock,
+    so appends from the learner and samples from the worker never interleave.
+
+    Queued batches may have been sampled before the most recent append (at
+    most n_prefetch batches stale).  For prioritized buffers, each batch
+    carries the tree indexes it was drawn from, and update_batch_priorities()
+    applies to the batch most recently returned by sample_batch(); entries
+    turned off in the tree since that batch was sampled (near the cursor)
+    are not updated, so they cannot be turned back on.
+
+    Optionally pins the memory of each batch (in the worker), for
+    asynchronous host-to-device copies.  All other attributes (e.g.
+    set_beta) pass through to the wrapped buffer.
+    """
+
+    def __init__(self, replay_buffer, n_prefetch=2, pin_memory=False):
+        self.replay_buffer = replay_buffer
+        self.n_prefetch = n_prefetch
+        self.pin_memory = pin_memory
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=n_prefetch)
+        self._worker = None
+        self._sample_args = None
+        self._prev_tree_idxs = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper.
+        if name == "replay_buffer":  # (Not yet set, e.g. while unpickling.)
+            raise AttributeError(name)
+        return getattr(self.replay_buffer, name)
+
+    def append_samples(self, samples):
+        with self._lock:
+            return self.replay_buffer.append_samples(samples)
+
+    def sample_batch(self, *args):
+        if args != self._sample_args:  # e.g. first call, or new batch_T.
+            self.close()
+            self._start(args)
+        item = self._queue.get()
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        batch, self._prev_tree_idxs = item
+        return batch
+
+    def update_batch_priorities(self, priorities):
+        tree = getattr(self.replay_buffer, "priority_tree", None)
+        if tree is None:  # e.g. ReplayClient: server updates its latest.
+            raise TypeError("Prefetched priority updates need the wrapped "
+                "buffer's priority_tree (not available through "
+                f"{type(self.replay_buffer).__name__}).")
+        priorities = numpify_buffer(priorities)
+        with self._lock:
+            tree_idxs, unique = self._prev_tree_idxs
+            on = tree.tree[tree_idxs] > 0  # Not turned off since sampled.
+            tree.prev_tree_idxs, tree._sampled_unique = tree_idxs[on], unique
+            self.replay_buffer.update_batch_priorities(priorities[on])
+
+    def save_snapshot(self, *args, **kwargs):
+        with self._lock:
+            return self.replay_buffer.save_snapshot(*args, **kwargs)
+
+    def load_snapshot(self, *args, **kwargs):
+        self.close()  # Discard batches sampled from previous contents.
+        with self._lock:
+            self.replay_buffer.load_snapshot(*args, **kwargs)
+
+    def close(self):
+        """Stop the worker thread and discard prefetched batches."""
+        if self._worker is not None:
+            self._stop_event.set()
+            while self._worker.is_alive():
+                self._drain()
+                self._worker.join(timeout=0.01)
+            self._drain()
+            self._worker = None
+        self._sample_args = None
+
+    def _start(self, sample_args):
+        self._sample_args = sample_args
+        self._stop_event = threading.Event()
+        self._worker = threading.Thread(target=self._prefetch,
+            args=(sample_args, self._stop_event), daemon=True)
+        self._worker.start()
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _prefetch(self, sample_args, stop_event):
+        tree = getattr(self.replay_buffer, "priority_tree", None)
+        tree_idxs = None
+        while not stop_event.is_set():
+            try:
+                with self._lock:
+                    batch = self.replay_buffer.sample_batch(*sample_args)
+                    if tree is not None:
+                        tree_idxs = (tree.prev_tree_idxs, tree._sampled_unique)
+                if self.pin_memory:
+                    batch = buffer_method(batch, "pin_memory")
+                item = (batch, tree_idxs)
+            except Exception as e:
+                item = e
+            while not stop_event.is_set():
+                try:
+                    self._queue.put(item, timeout=0.05)
+                    break
+                except queue.Full:
+                    pass
+            if isinstance(item, Exception):
+                return
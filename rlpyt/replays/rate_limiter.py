@@ -0,0 +1,83 @@
+
+import time
+import multiprocessing as mp
+
+
+class RateLimiter(object):
+    """
+    Holds the ratio of samples (entries drawn by sample_batch()) to inserts
+    (steps appended, T * B) near samples_per_insert, for asynchronous runs
+    with a shared replay buffer (attach with rate_limiter=).  Appending
+    blocks while inserts are too far ahead of sampling, and sampling blocks
+    while ahead of inserts, or until min_size_to_sample steps are inserted.
+    The allowed error, in samples, is samples_per_insert * inserts -
+    samples - samples_per_insert * min_size_to_sample within
+    [-error_buffer, error_buffer]; the window must fit one append plus one
+    batch (checked), else both sides could wait on each other.
+
+    Waiting is on a shared condition variable (no polling); cumulative time
+    blocked on each side is kept, for tuning sampler / optimizer counts.
+    close() releases all waiting and stops limiting (e.g. at shutdown).
+    """
+
+    def __init__(self, samples_per_insert, min_size_to_sample, error_buffer):
+        self.samples_per_insert = samples_per_insert
+        self.min_size_to_sample = min_size_to_sample
+        offset = samples_per_insert * min_size_to_sample
+        self.min_diff = offset - error_buffer
+        self.max_diff = offset + error_buffer
+        self._cond = mp.Condition()
+        self._inserts = mp.RawValue("q")
+        self._samples = mp.RawValue("q")
+        self._insert_wait = mp.RawValue("d")
+        self._sample_wait = mp.RawValue("d")
+        self._closed = mp.RawValue("b")
+
+    def insert(self, n):
+        """Block until n steps can be inserted, then count them."""
+        if n * self.samples_per_insert > self.max_diff - self.min_diff:
+            raise ValueError(f"Rate limiter error_buffer too small to insert "
+                f"{n} steps at once.")
+        with self._cond:
+            self._wait(lambda: self._diff() + n * self.samples_per_insert <=
+                self.max_diff, self._insert_wait)
+            self._inserts.value += n
+            self._cond.notify_all()
+
+    def sample(self, n):
+        """Block until n entries can be sampled, then count them."""
+        if n > self.max_diff - self.min_diff:
+            raise ValueError(f"Rate limiter error_buffer too small to sample "
+                f"{n} at once.")
+        with self._cond:
+            self._wait(lambda: (self._inserts.value >= self.min_size_to_sample
+                and self._diff() - n >= self.min_diff), self._sample_wait)
+            self._samples.value += n
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed.value = True
+            self._cond.notify_all()
+
+    def info(self):
+        """Cumulative counts and seconds blocked, for logging."""
+        inserts, samples = self._inserts.value, self._samples.value
+        return dict(
+            RateLimitInserts=inserts,
+            RateLimitSamplesPerInsert=samples / max(1, inserts),
+            RateLimitInsertWait=self._insert_wait.value,
+            RateLimitSampleWait=self._sample_wait.value,
+        )
+
+    def _diff(self):
+        return (self.samples_per_insert * self._inserts.value -
+            self._samples.value)
+
+    def _wait(self, can_proceed, wait_time):
+        """(Holding the condition's lock.)"""
+        if self._closed.value or can_proceed():
+            return
+        t = time.time()
+        self._cond.wait_for(lambda: self._closed.value or can_proceed())
+        wait_time.value += time.time() - t
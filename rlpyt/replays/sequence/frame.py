@@ -1,43 +1,25 @@
-import numpy as np
-
 from rlpyt.replays.sequence.n_step import SequenceNStepReturnBuffer
 from rlpyt.replays.frame import FrameBufferMixin
 from rlpyt.replays.sequence.uniform import UniformSequenceReplay
 from rlpyt.replays.sequence.prioritized import PrioritizedSequenceReplay
 from rlpyt.replays.async_ import AsyncReplayBufferMixin
+from rlpyt.utils.misc import sequence_idxs
 
 
 class SequenceNStepFrameBuffer(FrameBufferMixin, SequenceNStepReturnBuffer):
 
     def extract_observation(self, T_idxs, B_idxs, T):
         """Frames are returned OLDEST to NEWEST."""
-        observation = np.empty(shape=(T, len(B_idxs), self.n_frames) +  # [T,B,C,H,W]
-            self.samples_frames.shape[2:], dtype=self.samples_frames.dtype)
-        fm1 = self.n_frames - 1
-        for i, (t, b) in enumerate(zip(T_idxs, B_idxs)):
-            if t + T > self.T:  # wrap (n_frames duplicated)
-                m = self.T - t
-                w = T - m
-                for f in range(self.n_frames):
-                    observation[:m, i, f] = self.samples_frames[t + f:t + f + m, b]
-                    observation[m:, i, f] = self.samples_frames[f:w + f, b]
-            else:
-                for f in range(self.n_frames):
-                    observation[:, i, f] = self.samples_frames[t + f:t + f + T, b]
-
-            # Populate empty (zero) frames after environment done.
-            if t - fm1 < 0 or t + T > self.T:  # Wrap.
-                done_idxs = np.arange(t - fm1, t + T) % self.T
-            else:
-                done_idxs = slice(t - fm1, t + T)
-            done_fm1 = self.samples.done[done_idxs, b]
-            if np.any(done_fm1):
-                where_done_t = np.where(done_fm1)[0] - fm1  # Might be negative...
-                for f in range(1, self.n_frames):
-                    t_blanks = where_done_t + f  # ...might be > T...
-                    t_blanks = t_blanks[(t_blanks >= 0) & (t_blanks < T)]  # ..don't let it wrap.
-                    observation[t_blanks, i, :self.n_frames - f] = 0
-
+        # Wrap in time, then begin/end frames duplicated in samples_frames so
+        # no further wrapping: frame f at time t is samples_frames[t + f].
+        t_idxs = sequence_idxs(T_idxs, T, self.T)[:, :, None]  # [T,B,1]
+        b_idxs = B_idxs[None, :, None]
+        observation = self.gather_frames(t_idxs + self._frame_offsets,
+            b_idxs)  # [T,B,C,H,W]
+        # Populate empty (zero) frames after environment done.
+        # e.g. if done 1 step prior, all but newest frame go blank.
+        observation[:, :, :-1][self.blank_frames(t_idxs[:, :, 0],
+            b_idxs[:, :, 0])] = 0
         return observation
 
 
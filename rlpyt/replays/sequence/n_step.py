@@ -1,10 +1,12 @@
 
 import math
 import numpy as np
+import os.path as osp
 
 from rlpyt.replays.n_step import BaseNStepReturnBuffer
+from rlpyt.replays.snapshot import named_arrays
 from rlpyt.utils.buffer import torchify_buffer, buffer_from_example, buffer_func
-from rlpyt.utils.misc import extract_sequences
+from rlpyt.utils.misc import extract_sequences, sequence_idxs, index_sequences
 from rlpyt.utils.collections import namedarraytuple
 
 SamplesFromReplay = namedarraytuple("SamplesFromReplay",
@@ -31,9 +33,12 @@ class SequenceNStepReturnBuffer(BaseNStepReturnBuffer):
                 if k != "prev_rnn_state"))
             size = B * rnn_state_interval * math.ceil(  # T as multiple of interval.
                 math.ceil(size / B) / rnn_state_interval)
+            memmap_dir = kwargs.get("memmap_dir", None)
             self.samples_prev_rnn_state = buffer_from_example(example.prev_rnn_state,
                 (size // (B * rnn_state_interval), B),
-                shared_memory=shared_memory)
+                shared_memory=shared_memory,
+                memmap_path=None if memmap_dir is None else osp.join(memmap_dir,
+                    "samples_prev_rnn_state"))
         super().__init__(example=buffer_example, size=size, B=B,
             shared_memory=shared_memory, **kwargs)
         if rnn_state_interval > 1:
@@ -43,7 +48,7 @@ class SequenceNStepReturnBuffer(BaseNStepReturnBuffer):
     def append_samples(self, samples):
         t, rsi = self.t, self.rnn_state_interval
         if rsi <= 1:  # All or no rnn states stored.
-            return super().append_smaples(samples)
+            return super().append_samples(samples)
         buffer_samples = SamplesToBuffer(*(v for k, v in samples.items()
             if k != "prev_rnn_state"))
         T, idxs = super().append_samples(buffer_samples)
@@ -56,6 +61,13 @@ class SequenceNStepReturnBuffer(BaseNStepReturnBuffer):
         self.samples_prev_rnn_state[rnn_idxs] = samples.prev_rnn_state[offset::rsi]
         return T, idxs
 
+    def snapshot_arrays(self):
+        arrays = super().snapshot_arrays()
+        if self.rnn_state_interval > 1:
+            arrays += list(named_arrays("samples_prev_rnn_state",
+                self.samples_prev_rnn_state))
+        return arrays
+
     def extract_batch(self, T_idxs, B_idxs, T):
         """Return full sequence of each field which encompasses all subsequences
         to be used, so algorithm can make sub-sequences by slicing on device,
@@ -68,16 +80,22 @@ class SequenceNStepReturnBuffer(BaseNStepReturnBuffer):
             init_rnn_state = self.samples.prev_rnn_state[T_idxs, B_idxs]
         else:  # rsi == 0
             init_rnn_state = None
+        # Wrapped time idxs computed once: [0] is prev_action/prev_reward
+        # for first agent step, [1:T+1] are agent steps.
+        all_t_idxs = sequence_idxs(T_idxs - 1, T + self.n_step_return + 1,
+            self.T)
+        prev_t_idxs, t_idxs = all_t_idxs[:-1], all_t_idxs[1:T + 1]
+        return_, done_n = self.extract_returns(t_idxs, B_idxs)
         batch = SamplesFromReplay(
             all_observation=self.extract_observation(T_idxs, B_idxs,
                 T + self.n_step_return),
-            all_action=buffer_func(s.action, extract_sequences, T_idxs - 1, B_idxs,
-                T + self.n_step_return),  # Starts at prev_action.
-            all_reward=extract_sequences(s.reward, T_idxs - 1, B_idxs,
-                T + self.n_step_return),  # Only prev_reward (agent + target).
-            return_=extract_sequences(self.samples_return_, T_idxs, B_idxs, T),
-            done=extract_sequences(s.done, T_idxs, B_idxs, T),
-            done_n=extract_sequences(self.samples_done_n, T_idxs, B_idxs, T),
+            all_action=buffer_func(s.action, index_sequences, prev_t_idxs,
+                B_idxs),  # Starts at prev_action.
+            all_reward=index_sequences(s.reward, prev_t_idxs,
+                B_idxs),  # Only prev_reward (agent + target).
+            return_=return_,
+            done=index_sequences(s.done, t_idxs, B_idxs),
+            done_n=done_n,
             init_rnn_state=init_rnn_state,  # (Same state for agent and target.)
         )
         # NOTE: Algo might need to make zero prev_action/prev_reward depending on done.
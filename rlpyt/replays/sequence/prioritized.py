@@ -1,10 +1,11 @@
 
 import math
+import numpy as np
 
 from rlpyt.replays.sequence.n_step import (SequenceNStepReturnBuffer,
     SamplesFromReplay)
 from rlpyt.replays.async_ import AsyncReplayBufferMixin
-from rlpyt.replays.sum_tree import SumTree
+from rlpyt.replays.sum_tree import SumTree, VectorizedSumTree
 from rlpyt.utils.collections import namedarraytuple
 from rlpyt.utils.quick_args import save__init__args
 from rlpyt.utils.buffer import torchify_buffer, numpify_buffer
@@ -16,7 +17,8 @@ SamplesFromReplayPri = namedarraytuple("SamplesFromReplayPri",
 class PrioritizedSequenceReplay(object):
 
     def __init__(self, alpha=0.6, beta=0.4, default_priority=1, unique=False,
-            **kwargs):
+            stratified=False, global_is_norm=False, update_interval=1,
+            vectorized_tree=True, **kwargs):
         """Fix the SampleFromReplay length here, so priority tree can
         track where not to sample (else would have to temporarily subtract
         from tree every time sampling)."""
@@ -28,37 +30,61 @@ class PrioritizedSequenceReplay(object):
     def init_priority_tree(self):
         off_backward = math.ceil((1 + self.off_backward + self.batch_T) /
             self.rnn_state_interval)  # +1 in case interval aligned? TODO: check
-        self.priority_tree = SumTree(
+        TreeCls = VectorizedSumTree if self.vectorized_tree else SumTree
+        self.priority_tree = TreeCls(
             T=self.T // self.rnn_state_interval,
             B=self.B,
             off_backward=off_backward,
             off_forward=math.ceil(self.off_forward / self.rnn_state_interval),
             default_value=self.default_priority ** self.alpha,
+            track_min=self.global_is_norm,
+            track_valid=self.samples_valid is not None,
+            update_interval=self.update_interval,
         )
 
     def set_beta(self, beta):
         self.beta = beta
 
+    def snapshot_state(self):
+        return dict(super().snapshot_state(),
+            priority_tree=self.priority_tree.state_dict())
+
+    def load_snapshot_state(self, state):
+        super().load_snapshot_state(state)
+        self.priority_tree.load_state_dict(state["priority_tree"])
+
     def append_samples(self, samples):
         t, rsi = self.t, self.rnn_state_interval
         T, idxs = super().append_samples(samples)
         if rsi <= 1:  # All or no rnn states stored.
-            self.priority_tree.advance(T)
+            self.advance_priority_tree(T)
         else:  # Some rnn states stored.
             n = self.t // rsi - t // rsi
             if self.t < t:  # Wrapped.
                 n += self.T // rsi
-            self.priority_tree.advance(n)
+            self.advance_priority_tree(n)
         return T, idxs
 
+    def advance_priority_tree(self, n):
+        """Progress priority_tree cursor over n of its rows (each the start
+        of a sequence, every rnn_state_interval steps)."""
+        tree = self.priority_tree
+        valid = None if self.samples_valid is None else self.samples_valid[
+            (np.arange(tree.t, tree.t + n) % tree.T) *
+            max(1, self.rnn_state_interval)]
+        tree.advance(n, valid=valid)
+
     def sample_batch(self, batch_B):
         (tree_T_idxs, B_idxs), priorities = self.priority_tree.sample(
-            batch_B, unique=self.unique)
+            batch_B, unique=self.unique, stratified=self.stratified)
         if self.rnn_state_interval > 1:
             T_idxs = tree_T_idxs * self.rnn_state_interval
         batch = self.extract_batch(T_idxs, B_idxs, self.batch_T)
         is_weights = (1. / priorities) ** self.beta
-        is_weights /= max(is_weights)  # Normalize.
+        if self.global_is_norm:  # Normalize by largest weight in buffer.
+            is_weights /= (1. / self.priority_tree.min_priority()) ** self.beta
+        else:
+            is_weights /= max(is_weights)  # Normalize within batch.
         is_weights = torchify_buffer(is_weights).float()
         return SamplesFromReplayPri(*batch, is_weights=is_weights)
 
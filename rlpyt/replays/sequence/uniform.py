@@ -7,6 +7,8 @@ from rlpyt.replays.async_ import AsyncReplayBufferMixin
 
 class UniformSequenceReplay(object):
 
+    max_invalid_redraws = 100  # Of entries drawn invalid (if tracked).
+
     def set_batch_T(self, batch_T):
         self.batch_T = batch_T  # Can set dynamically.
 
@@ -15,7 +17,26 @@ class UniformSequenceReplay(object):
         return self.extract_batch(T_idxs, B_idxs, batch_T)
 
     def sample_idxs(self, batch_B, batch_T=None):
+        """Sequences start at valid entries only (if tracked); steps after a
+        done within a sequence are left to the algorithm to mask."""
         batch_T = self.batch_T if batch_T is None else batch_T
+        T_idxs, B_idxs = self.draw_idxs(batch_B, batch_T)
+        if self.samples_valid is not None:  # Redraw any invalid.
+            invalid = np.where(~self.samples_valid[T_idxs, B_idxs])[0]
+            for _ in range(self.max_invalid_redraws):
+                if len(invalid) == 0:
+                    break
+                T_idxs[invalid], B_idxs[invalid] = self.draw_idxs(
+                    len(invalid), batch_T)
+                invalid = invalid[~self.samples_valid[T_idxs[invalid],
+                    B_idxs[invalid]]]
+            if len(invalid) > 0:
+                raise RuntimeError(f"{len(invalid)} samples still invalid "
+                    f"after {self.max_invalid_redraws} redraws; buffer may "
+                    "hold no valid samples.")
+        return T_idxs, B_idxs
+
+    def draw_idxs(self, batch_B, batch_T):
         t, b, f = self.t, self.off_backward + batch_T, self.off_forward
         high = self.T - b - f if self._buffer_full else t - b - f
         T_idxs = np.random.randint(low=0, high=high, size=(batch_B,))
@@ -0,0 +1,324 @@
+
+import os
+import os.path as osp
+import tempfile
+import threading
+import queue
+import multiprocessing as mp
+from multiprocessing.connection import Listener, Client, wait
+import numpy as np
+
+from rlpyt.replays.base import BaseReplayBuffer
+from rlpyt.utils.buffer import numpify_buffer, torchify_buffer
+from rlpyt.utils.collections import namedarraytuple
+from rlpyt.utils.logging import logger
+
+ALIGN = 64  # Bytes, for each array in a slot.
+NO_REPLY = ("update_batch_priorities",)  # (Pipelined.)
+CALLS = ("set_beta", "save_snapshot", "load_snapshot")  # Allowed by "call".
+SLOTS_PREFIX = "rlpyt_replay_"
+
+
+class ReplayServer(object):
+    """
+    Process which owns one replay buffer (e.g. UniformReplayFrameBuffer or
+    PrioritizedReplayFrameBuffer) and serves any number of ReplayClients on
+    the same machine, over a Unix domain socket at address.  Small messages
+    go through the socket; bulk data (appended samples, sampled batches)
+    goes through shared memory slots owned by each client.  Requests are
+    handled one at a time, in order per client, so the buffer needs no
+    locking.  The buffer is built on the first client's initialize(), unless
+    ReplayCls is given here; it outlives clients (e.g. learner restarts).
+
+    Clients must present authkey (default: this process's authkey, which
+    processes started from it inherit).  With address=None, the socket goes
+    in a new private (0700) temporary directory; an explicit address's
+    directory is created 0700 if missing.  Clients may only call the buffer
+    methods in CALLS.
+    """
+
+    def __init__(self, address=None, ReplayCls=None, authkey=None,
+            **replay_kwargs):
+        self._temp_dir = None
+        if address is None:
+            self._temp_dir = tempfile.mkdtemp(prefix=SLOTS_PREFIX)
+            address = osp.join(self._temp_dir, "server.sock")
+        else:
+            os.makedirs(osp.dirname(osp.abspath(address)), mode=0o700,
+                exist_ok=True)
+        self.address = address
+        self.ReplayCls = ReplayCls
+        self.authkey = (mp.current_process().authkey if authkey is None
+            else authkey)
+        self.replay_kwargs = replay_kwargs
+
+    def start(self):
+        """Serve in a new process, which is returned."""
+        proc = mp.Process(target=self.serve)
+        proc.start()
+        return proc
+
+    def serve(self):
+        self.replay_buffer = (None if self.ReplayCls is None else
+            self.ReplayCls(**self.replay_kwargs))
+        self._clients = dict()  # conn -> client state.
+        new_conns = queue.Queue()
+        listener = Listener(self.address, family="AF_UNIX",
+            authkey=self.authkey)
+        threading.Thread(target=self._accept, args=(listener, new_conns),
+            daemon=True).start()
+        logger.log(f"Replay server listening at {self.address}.")
+        self._quit = False
+        while not self._quit:
+            while not new_conns.empty():
+                self._clients[new_conns.get()] = dict(slots=None,
+                    tree_idxs=None)
+            for conn in wait(list(self._clients), timeout=0.05):
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    self._disconnect(conn)
+                    continue
+                try:
+                    reply = self._handle(conn, *request)
+                except Exception as e:
+                    if request[0] in NO_REPLY:
+                        logger.log(f"Replay server error in {request[0]}: "
+                            f"{e!r}")
+                        continue
+                    reply = ("error", e)
+                if reply is not None:
+                    conn.send(reply)
+        for conn in list(self._clients):
+            self._disconnect(conn)
+        listener.close()  # (Removes the socket file.)
+        if self._temp_dir is not None:
+            os.rmdir(self._temp_dir)
+
+    def _accept(self, listener, new_conns):
+        while True:
+            try:
+                new_conns.put(listener.accept())
+            except mp.AuthenticationError:
+                logger.log("Replay server refused a client: bad authkey.")
+            except OSError:  # Listener closed.
+                return
+
+    def _disconnect(self, conn):
+        self._clients.pop(conn)
+        conn.close()
+
+    def _handle(self, conn, command, *args):
+        client = self._clients[conn]
+        replay = self.replay_buffer
+        if command == "attach":
+            filename, n_slots, slot_bytes = args
+            if (osp.dirname(osp.abspath(filename)) != slots_dir() or
+                    not osp.basename(filename).startswith(SLOTS_PREFIX)):
+                raise ValueError(f"Not a replay client slots file: {filename}.")
+            client["slots"] = np.memmap(filename, dtype=np.uint8, mode="r+",
+                shape=(n_slots, slot_bytes))
+            return ("ok", None)
+        if command == "initialize":
+            ReplayCls, replay_kwargs = args
+            if not (isinstance(ReplayCls, type) and
+                    issubclass(ReplayCls, BaseReplayBuffer)):
+                raise TypeError(f"Not a replay buffer class: {ReplayCls!r}.")
+            if replay is None:
+                self.replay_buffer = replay = ReplayCls(**replay_kwargs)
+            elif type(replay) is not ReplayCls:
+                raise TypeError(f"Replay server holds {type(replay).__name__}"
+                    f", not {ReplayCls.__name__}.")
+            return ("ok", dict(T=replay.T, B=replay.B, size=replay.size))
+        if command == "append":
+            slot, layout = args
+            replay.append_samples(unpack(layout, client["slots"][slot]))
+            return ("ok", slot)
+        if command == "sample":
+            slot, sample_args = args
+            batch = numpify_buffer(replay.sample_batch(*sample_args))
+            tree = getattr(replay, "priority_tree", None)
+            if tree is not None:  # Clients interleave; keep each one's idxs.
+                client["tree_idxs"] = (tree.prev_tree_idxs,
+                    tree._sampled_unique)
+            return ("ok", pack(batch, client["slots"][slot]))
+        if command == "update_batch_priorities":
+            priorities, = args
+            tree = replay.priority_tree
+            tree_idxs, unique = client["tree_idxs"]
+            on = tree.tree[tree_idxs] > 0  # Not turned off since sampled.
+            tree.prev_tree_idxs, tree._sampled_unique = tree_idxs[on], unique
+            replay.update_batch_priorities(priorities[on])
+            return None
+        if command == "call":
+            name, call_args, call_kwargs = args
+            if name not in CALLS:
+                raise ValueError(f"Replay server does not allow call: {name}.")
+            return ("ok", getattr(replay, name)(*call_args, **call_kwargs))
+        if command == "shutdown":
+            self._quit = True
+            return ("ok", None)
+        raise ValueError(f"Unknown replay server command: {command}.")
+
+
+class ReplayClient(BaseReplayBuffer):
+    """
+    Replay buffer interface to a ReplayServer at address.  Data moves through
+    a ring of n_slots shared memory slots of slot_bytes each (a file in
+    /dev/shm, unlinked once the server has mapped it).  Appends are
+    pipelined: append_samples() returns once samples are copied into a slot,
+    waiting only if all slots are still in use; sample_batch() waits for its
+    batch (returned as torch tensors, like the local buffers).
+
+    Each process using the client (e.g. async memory copiers and optimizer,
+    forked after construction) gets its own connection and slots, opened on
+    its first request.
+    """
+
+    def __init__(self, address, n_slots=4, slot_bytes=2 ** 26, authkey=None):
+        self.address = address
+        self.n_slots = n_slots
+        self.slot_bytes = slot_bytes
+        self.authkey = (mp.current_process().authkey if authkey is None
+            else authkey)
+        self._pid = None  # Process which owns conn and slots.
+
+    def initialize(self, ReplayCls, **replay_kwargs):
+        """Build the server's buffer, if it has none yet; returns its T, B,
+        size."""
+        info = self._request("initialize", ReplayCls, replay_kwargs)
+        self.T, self.B, self.size = info["T"], info["B"], info["size"]
+        return info
+
+    def append_samples(self, samples):
+        slot = self._take_slot()  # (Connects.)
+        layout = pack(numpify_buffer(samples), self.slots[slot])
+        self.conn.send(("append", slot, layout))
+        self._pending += 1
+
+    def sample_batch(self, *args):
+        slot = self._take_slot()
+        layout = self._request("sample", slot, args)
+        return torchify_buffer(unpack(layout, self.slots[slot], copy=True))
+
+    def update_batch_priorities(self, priorities):
+        """Applies to this client's most recent sample_batch()."""
+        self._connect()
+        self.conn.send(("update_batch_priorities",
+            np.asarray(numpify_buffer(priorities))))
+
+    def set_beta(self, beta):
+        self.call("set_beta", beta)
+
+    def save_snapshot(self, *args, **kwargs):
+        return self.call("save_snapshot", *args, **kwargs)
+
+    def load_snapshot(self, *args, **kwargs):
+        return self.call("load_snapshot", *args, **kwargs)
+
+    def call(self, name, *args, **kwargs):
+        """Call a method of the server's buffer (one of CALLS); returns its
+        result."""
+        return self._request("call", name, args, kwargs)
+
+    def shutdown_server(self):
+        self._request("shutdown")
+
+    def close(self):
+        if self._pid == os.getpid():
+            self.conn.close()
+            del self.slots
+        self._pid = None
+
+    def _connect(self):
+        if self._pid == os.getpid():
+            return
+        # Any conn and slots here were inherited from the parent: leave them.
+        fd, filename = tempfile.mkstemp(prefix=SLOTS_PREFIX, dir=slots_dir())
+        os.close(fd)
+        try:
+            self.slots = np.memmap(filename, dtype=np.uint8, mode="w+",
+                shape=(self.n_slots, self.slot_bytes))
+            self.conn = Client(self.address, family="AF_UNIX",
+                authkey=self.authkey)
+            self._pid = os.getpid()
+            self._next_slot = 0
+            self._pending = 0  # Appends sent, not yet acknowledged.
+            self._request("attach", filename, self.n_slots, self.slot_bytes)
+        finally:
+            os.remove(filename)  # Both sides keep their mappings.
+
+    def _take_slot(self):
+        self._connect()
+        if self._pending >= self.n_slots:  # Ring full: wait for oldest.
+            self._receive()
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.n_slots
+        return slot
+
+    def _request(self, *request):
+        self._connect()
+        self.conn.send(request)
+        return self._receive(until_reply=True)
+
+    def _receive(self, until_reply=False):
+        """Replies arrive in order: first any append acknowledgements."""
+        while True:
+            status, value = self.conn.recv()
+            is_ack = self._pending > 0
+            if is_ack:
+                self._pending -= 1
+            if status == "error":
+                raise value
+            if not (is_ack and until_reply):
+                return value
+
+
+def slots_dir():
+    return osp.realpath("/dev/shm" if osp.isdir("/dev/shm") else
+        tempfile.gettempdir())
+
+
+_nat_types = dict()
+
+
+def pack(buffer_, slot, offset=0):
+    """Copy arrays of (nested namedarraytuple) buffer_ into uint8 slot;
+    returns layout to unpack them (picklable, without the arrays)."""
+    layout, _ = _pack(buffer_, slot, offset)
+    return layout
+
+
+def _pack(buffer_, slot, offset):
+    if buffer_ is None:
+        return None, offset
+    if isinstance(buffer_, tuple):  # (namedarraytuple)
+        fields = list()
+        for v in buffer_:
+            field_layout, offset = _pack(v, slot, offset)
+            fields.append(field_layout)
+        return (type(buffer_).__name__, buffer_._fields, fields), offset
+    a = np.ascontiguousarray(buffer_)
+    offset = -(-offset // ALIGN) * ALIGN
+    if offset + a.nbytes > len(slot):
+        raise ValueError(f"Replay client slot_bytes ({len(slot)}) too small "
+            "for data; increase slot_bytes.")
+    slot[offset:offset + a.nbytes] = a.reshape(-1).view(np.uint8)
+    return (offset, a.shape, a.dtype.str), offset + a.nbytes
+
+
+def unpack(layout, slot, copy=False):
+    """Arrays are views into slot unless copy."""
+    if layout is None:
+        return None
+    if isinstance(layout[0], str):
+        typename, fields, values = layout
+        NatCls = _nat_types.get((typename, fields))
+        if NatCls is None:
+            NatCls = _nat_types[(typename, fields)] = namedarraytuple(
+                typename, fields)
+        return NatCls(*(unpack(v, slot, copy) for v in values))
+    offset, shape, dtype = layout
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    a = slot[offset:offset + nbytes].view(dtype).reshape(shape)
+    return np.array(a) if copy else a
@@ -0,0 +1,90 @@
+
+import numpy as np
+
+from rlpyt.replays.base import BaseReplayBuffer
+from rlpyt.utils.buffer import np_mp_array
+
+
+class ShardedReplayBuffer(BaseReplayBuffer):
+    """
+    For asynchronous runs with several optimizer processes: the B dimension
+    (environments) is split into n_shards contiguous slices, each stored in
+    its own async replay buffer (ReplayCls, with its own lock and, if
+    prioritized, its own priority tree).  Appends (memory copier) go to all
+    shards; after set_rank(), each optimizer samples and updates priorities
+    only in its own shard, so ranks never contend with each other.
+
+    Each rank publishes its shard's total and max priority (if tracked) into
+    shared memory after priority updates, to be merged for logging.
+    """
+
+    def __init__(self, ReplayCls, example, size, B, n_shards, **kwargs):
+        if B % n_shards != 0:
+            raise ValueError(f"Replay B ({B}) must divide evenly into "
+                f"n_shards ({n_shards}).")
+        self.n_shards = n_shards
+        self.shard_B = shard_B = B // n_shards
+        self.shards = [ReplayCls(example=example, size=size // n_shards,
+            B=shard_B, **kwargs) for _ in range(n_shards)]
+        self.B = B
+        self.T = self.shards[0].T
+        self.size = self.T * B
+        self.shard_priority_totals = np_mp_array(n_shards, np.float64)
+        self.shard_priority_maxes = np_mp_array(n_shards, np.float64)
+        self.rank = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper (e.g. set_beta).
+        if name in ("shards", "rank"):  # (Not yet set, e.g. while unpickling.)
+            raise AttributeError(name)
+        return getattr(self.local_shard, name)
+
+    def set_rank(self, rank):
+        """Call in each optimizer process, before sampling."""
+        self.rank = rank
+
+    @property
+    def local_shard(self):
+        if self.rank is None:
+            raise RuntimeError("Call set_rank() before using the local shard.")
+        return self.shards[self.rank]
+
+    def append_samples(self, samples):
+        for i, shard in enumerate(self.shards):
+            b = i * self.shard_B
+            ret = shard.append_samples(samples[:, b:b + self.shard_B])
+        return ret
+
+    def sample_batch(self, *args, **kwargs):
+        return self.local_shard.sample_batch(*args, **kwargs)
+
+    def update_batch_priorities(self, priorities):
+        shard = self.local_shard
+        shard.update_batch_priorities(priorities)
+        tree = shard.priority_tree
+        self.shard_priority_totals[self.rank] = tree.tree[0]
+        if tree.max_tree is not None:
+            self.shard_priority_maxes[self.rank] = tree.max_priority()
+
+    def priority_info(self):
+        """Priorities merged over shards, for logging (any process)."""
+        if not hasattr(self.shards[0], "priority_tree"):
+            return dict()
+        totals = self.shard_priority_totals
+        info = dict(
+            ReplayPriorityTotal=float(np.sum(totals)),
+            ReplayShardPriorityTotalMin=float(np.min(totals)),
+            ReplayShardPriorityTotalMax=float(np.max(totals)),
+        )
+        if self.shards[0].priority_tree.max_tree is not None:
+            info["ReplayPriorityMax"] = float(np.max(self.shard_priority_maxes))
+        return info
+
+    def save_snapshot(self, path, *args, **kwargs):
+        # (Priority trees as held by the saving process; others' are local.)
+        return sum(shard.save_snapshot(f"{path}.shard{i}", *args, **kwargs)
+            for i, shard in enumerate(self.shards))
+
+    def load_snapshot(self, path):
+        for i, shard in enumerate(self.shards):
+            shard.load_snapshot(f"{path}.shard{i}")
@@ -0,0 +1,100 @@
+
+import os
+import os.path as osp
+import pickle
+import re
+import numpy as np
+
+STATE_FILE = "replay_state.pkl"
+CHUNK_RE = re.compile(r".+\.\d{5}\.(\d+)\.npy(\.tmp)?$")  # (name.chunk.gen)
+
+
+def named_arrays(name, buffer_):
+    """Yields (name[.field[.subfield]], array) for each leaf array of a
+    (possibly nested) namedarraytuple; same naming as memmap files."""
+    if isinstance(buffer_, np.ndarray):
+        yield name, buffer_
+        return
+    for k, v in zip(buffer_._fields, buffer_):
+        if v is not None:
+            yield from named_arrays(f"{name}.{k}", v)
+
+
+def array_rows(t_rows, T, length):
+    """Map rows of the [T,..] cursor dimension to rows of an array with
+    leading dim length: T (samples), T + n_frames - 1 (frames, leading rows
+    duplicated at the end), or T // interval (e.g. stored rnn states)."""
+    t_rows = np.unique(t_rows % T)
+    if length < T:
+        return np.unique(t_rows // (T // length))
+    return np.concatenate([t_rows, t_rows[t_rows < length - T] + T])
+
+
+def chunk_filename(path, name, chunk, gen):
+    return osp.join(path, f"{name}.{chunk:05d}.{gen}.npy")
+
+
+def next_generation(path):
+    """One past any generation in path's chunk files (including those of an
+    unfinished save), so a save never writes a file the current state
+    uses."""
+    gens = [int(m.group(1)) for m in map(CHUNK_RE.match, os.listdir(path))
+        if m is not None]
+    return max(gens, default=-1) + 1
+
+
+def save_chunks(path, name, array, chunk_T, gens, gen, rows=None):
+    """Write each chunk of chunk_T leading rows of array which contains any
+    of rows (all chunks if rows is None), one .npy file per chunk, as
+    generation gen; records it in gens (per chunk).  Files of earlier
+    generations are left for the current state; see remove_stale()."""
+    chunks = range(len(gens)) if rows is None else np.unique(rows // chunk_T)
+    for c in chunks:
+        atomic_write(chunk_filename(path, name, c, gen), lambda f: np.save(f,
+            array[c * chunk_T:(c + 1) * chunk_T],
+            allow_pickle=array.dtype == object))
+        gens[c] = gen
+    return len(chunks)
+
+
+def load_chunks(path, name, array, chunk_T, gens):
+    for c, gen in enumerate(gens):
+        array[c * chunk_T:(c + 1) * chunk_T] = np.load(
+            chunk_filename(path, name, c, gen),
+            allow_pickle=array.dtype == object)
+
+
+def n_chunks(array, chunk_T):
+    return -(-len(array) // chunk_T)
+
+
+def save_state(path, state):
+    """Written last, atomically: the snapshot in path is whichever state was
+    last written completely, with the chunk generations it lists."""
+    atomic_write(osp.join(path, STATE_FILE), lambda f: pickle.dump(state, f,
+        protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_state(path):
+    with open(osp.join(path, STATE_FILE), "rb") as f:
+        return pickle.load(f)
+
+
+def remove_stale(path, chunk_gens):
+    """After save_state(): remove chunk files not listed in chunk_gens
+    (superseded, or left by an unfinished save)."""
+    keep = {osp.basename(chunk_filename(path, name, c, gen))
+        for name, gens in chunk_gens.items() for c, gen in enumerate(gens)}
+    for filename in os.listdir(path):
+        if CHUNK_RE.match(filename) is not None and filename not in keep:
+            os.remove(osp.join(path, filename))
+
+
+def atomic_write(filename, write):
+    """Call write(f) on a temporary file, then move it to filename."""
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
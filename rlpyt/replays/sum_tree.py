@@ -1,4 +1,3 @@
-
 import numpy as np
 
 
@@ -11,13 +10,28 @@ class SumTree(object):
     prev_action or max(1, frames-1) for frame-wise buffer).
     Provides efficient sampling from non-uniform probability masses.
 
+    Optionally maintains a MinTree and/or MaxTree over the same leaves, for
+    O(1) access to the global min / max priority among entries currently
+    turned on (e.g. to normalize importance sampling weights).
+
+    With update_interval > 1, update_batch_priorities() defers its writes:
+    (tree_idx, priority) pairs are accumulated over update_interval calls,
+    then the newest value for each leaf is written with one propagation.
+    Sampled priorities are then at most update_interval - 1 updates stale;
+    pending updates are also written before advance() (so entries turned
+    off are not turned back on) and state_dict().
+
+    With track_valid, advance() also takes the validity of the new entries,
+    and invalid entries are turned on at priority zero (so never sampled).
+
     NOTE: Tried single precision (float32) tree, and it sometimes returned
     samples with priority 0.0, because subtraction during tree cascade left
     random value larger than the remaining sum; suggest keeping float64.
     """
 
     def __init__(self, T, B, off_backward, off_forward,
-            default_value=1):
+            default_value=1, track_min=False, track_max=False,
+            track_valid=False, update_interval=1):
         self.T = T
         self.B = B
         self.size = T * B
@@ -29,64 +43,151 @@ class SumTree(object):
         self.low_idx = 2 ** (self.tree_levels - 1) - 1  # pri_idx + low_idx -> tree_idx
         self.high_idx = self.size + self.low_idx
         self.priorities = self.tree[self.low_idx:self.high_idx].reshape(T, B)
+        self.min_tree = MinTree(self.size) if track_min else None
+        self.max_tree = MaxTree(self.size) if track_max else None
+        self.valid = np.ones((T, B), dtype=bool) if track_valid else None
+        self.update_interval = update_interval
         self.reset()
 
     def reset(self):
         self.tree[:] = 0
+        for extremum_tree in (self.min_tree, self.max_tree):
+            if extremum_tree is not None:
+                extremum_tree.reset()
         self.t = 0
         self._initial_wrap_guard = True
+        self._pending_updates = list()
 
-    def advance(self, T, priorities=None):
+    def advance(self, T, priorities=None, valid=None):
         """Cursor advances by T; set priorities to zero in vicinity of new
         cursor position and turn priorities on for new samples since previous
         cursor position.  Optional priorities can be None for default,
-        scalar, or with dimensions [T] or [T, B]."""
+        scalar, or with dimensions [T] or [T, B].  With track_valid, valid
+        [T, B] is for the entries at the T steps from the previous cursor
+        (entries turned on lag these by off_backward)."""
+        self.flush_updates()
         t, b, f = self.t, self.off_backward, self.off_forward
+        if self.valid is not None and valid is not None:
+            self.valid[np.arange(t, t + T) % self.T] = valid
         low_on_t = (t - b) % self.T  # inclusive range: [0, self.T-1]
         high_on_t = ((t + T - b - 1) % self.T) + 1  # inclusive: [1, self.T]
         low_off_t = (t + T - b) % self.T
         high_off_t = ((t + T + f - 1) % self.T) + 1
+        n_on = T
         if self._initial_wrap_guard:
             low_on_t = max(f, t - b)  # Don't wrap back to end, and off_forward.
             high_on_t = low_off_t = max(low_on_t, t + T - b)
+            n_on = high_on_t - low_on_t
             if priorities is not None:
                 if hasattr(priorities, "shape") and priorities.shape[0] == T:
                     priorities = priorities[-(high_on_t - low_on_t):]
             if t + T - b >= f:  # Next low_on_t >= f.
                 self._initial_wrap_guard = False
         on_value = self.default_value if priorities is None else priorities
+        if self.valid is not None:
+            if np.ndim(on_value) == 1:  # [T] -> [T, 1]
+                on_value = np.reshape(on_value, (-1, 1))
+            on_value = on_value * self.valid[
+                np.arange(low_on_t, low_on_t + n_on) % self.T]
         self.reconstruct_advance(low_on_t, high_on_t, low_off_t, high_off_t,
             on_value)
         self.t = (t + T) % self.T
 
-    def sample(self, n, unique=False):
-        """Get n samples, with (default) or without replacement."""
+    def sample(self, n, unique=False, stratified=False):
+        """Get n samples, with (default) or without replacement.  If
+        stratified, total priority is split into n equal segments and one
+        value drawn uniformly within each, so a leaf can only be drawn more
+        than once if its priority spans more than one segment.  Unique
+        samples are drawn stratified and deduplicated, then topped up by
+        stratified draws over the leaves not yet drawn (taken out of the
+        tree meanwhile), so each round adds at least one new leaf."""
         self._sampled_unique = unique
-        if unique:
-            tree_idxs = np.unique(self.find(np.random.rand(int(n * 1.05))))
-            i = 0
-            while len(tree_idxs) < n:
-                if i >= 100:
-                    raise RuntimeError("After 100 tries, unable to get unique indexes.")
-                new_idxs = self.find(np.random.rand(2 * (n - len(tree_idxs))))
-                tree_idxs = np.unique(np.concatenate([tree_idxs, new_idxs]))
-                i += 1
-            tree_idxs = tree_idxs[:n]
+        if stratified or unique:
+            random_values = (np.arange(n) + np.random.rand(n)) / n
         else:
             random_values = np.random.rand(n)
-            tree_idxs, scaled_random_values = self.find(random_values)
+        tree_idxs, scaled_random_values = self.find(random_values)
+        if unique:
+            tree_idxs = self.top_up_unique(np.unique(tree_idxs), n)
         priorities = self.tree[tree_idxs]
         self.prev_tree_idxs = tree_idxs
         T_idxs, B_idxs = np.divmod(tree_idxs - self.low_idx, self.B)
         return (T_idxs, B_idxs), priorities
 
+    def top_up_unique(self, tree_idxs, n):
+        """Add stratified draws among leaves not in (unique) tree_idxs until
+        there are n."""
+        if len(tree_idxs) >= n:
+            return tree_idxs
+        priorities = self.tree[tree_idxs]
+        self.propagate_leaves(tree_idxs, 0)  # Out of the sums, temporarily.
+        drawn = [tree_idxs]
+        try:
+            while len(tree_idxs) < n:
+                k = n - len(tree_idxs)
+                new_idxs, _ = self.find((np.arange(k) + np.random.rand(k)) / k)
+                new_idxs = np.unique(new_idxs)
+                new_idxs = new_idxs[self.tree[new_idxs] > 0]  # (Rounding.)
+                if len(new_idxs) == 0:
+                    raise ValueError(f"Fewer than {n} entries with non-zero "
+                        "priority; cannot sample unique.")
+                drawn.append(new_idxs)
+                priorities = np.concatenate([priorities, self.tree[new_idxs]])
+                self.propagate_leaves(new_idxs, 0)
+                tree_idxs = np.concatenate(drawn)
+        finally:
+            self.propagate_leaves(np.concatenate(drawn), priorities)
+        return tree_idxs
+
     def update_batch_priorities(self, priorities):
+        if self.update_interval > 1:  # Deferred.
+            self._pending_updates.append((self.prev_tree_idxs, priorities))
+            if len(self._pending_updates) >= self.update_interval:
+                self.flush_updates()
+            return
         if not self._sampled_unique:  # Must remove duplicates
             self.prev_tree_idxs, unique_idxs = np.unique(self.prev_tree_idxs,
                 return_index=True)
             priorities = priorities[unique_idxs]
         self.reconstruct(self.prev_tree_idxs, priorities)
 
+    def flush_updates(self):
+        """Write deferred updates: the newest priority for each leaf."""
+        if not self._pending_updates:
+            return
+        tree_idxs = np.concatenate([i for i, _ in self._pending_updates])
+        priorities = np.concatenate([np.reshape(p, -1)
+            for _, p in self._pending_updates])
+        self._pending_updates = list()
+        _, last = np.unique(tree_idxs[::-1], return_index=True)
+        last = len(tree_idxs) - 1 - last  # (Latest occurrence.)
+        self.reconstruct(tree_idxs[last], priorities[last])
+
+    def min_priority(self):
+        """Smallest non-zero priority in the tree (requires track_min)."""
+        return self.min_tree.tree[0]
+
+    def max_priority(self):
+        """Largest non-zero priority in the tree (requires track_max)."""
+        return self.max_tree.tree[0]
+
+    def state_dict(self):
+        self.flush_updates()
+        state_dict = dict(tree=self.tree, t=self.t,
+            initial_wrap_guard=self._initial_wrap_guard)
+        if self.valid is not None:  # (Entries not yet turned on need it.)
+            state_dict["valid"] = self.valid
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        self.tree[:] = state_dict["tree"]  # In place (priorities is a view).
+        self.t = state_dict["t"]
+        self._initial_wrap_guard = state_dict["initial_wrap_guard"]
+        if self.valid is not None:
+            self.valid[:] = state_dict["valid"]
+        self._pending_updates = list()
+        self.update_extrema_range(self.low_idx, self.high_idx)
+
     def print_tree(self, level=None):
         levels = range(self.tree_levels) if level is None else [level]
         for k in levels:
@@ -97,6 +198,11 @@ class SumTree(object):
     # Helpers.
 
     def reconstruct(self, tree_idxs, values):
+        self.propagate_leaves(tree_idxs, values)
+        self.update_extrema(tree_idxs)
+
+    def propagate_leaves(self, tree_idxs, values):
+        """Write leaves and their sums (not min/max trees)."""
         diffs = values - self.tree[tree_idxs]  # Numpy upcasts to float64.
         self.tree[tree_idxs] = values
         self.propagate_diffs(tree_idxs, diffs, min_level=1)
@@ -136,6 +242,21 @@ class SumTree(object):
             diffs = np.concatenate(diffs).reshape(-1)
             idxs = np.concatenate(idxs)
             self.propagate_diffs(idxs, diffs, min_level=1)
+            self.update_extrema(idxs)
+
+    def update_extrema(self, tree_idxs):
+        """Copy (already written) leaves at tree_idxs into min/max trees."""
+        for extremum_tree in (self.min_tree, self.max_tree):
+            if extremum_tree is not None:
+                extremum_tree.update(tree_idxs, self.tree[tree_idxs])
+
+    def update_extrema_range(self, low_idx, high_idx):
+        """Copy (already written) leaves at tree idxs [low, high) into min/max
+        trees."""
+        for extremum_tree in (self.min_tree, self.max_tree):
+            if extremum_tree is not None:
+                extremum_tree.update_range(low_idx, high_idx,
+                    self.tree[low_idx:high_idx])
 
     def propagate_diffs(self, tree_idxs, diffs, min_level=1):
         for _ in range(min_level, self.tree_levels):
@@ -154,3 +275,136 @@ class SumTree(object):
             tree_idxs[where_right] += 1
             random_values[where_right] -= left_values[where_right]
         return tree_idxs, scaled_random_values
+
+
+class VectorizedSumTree(SumTree):
+    """
+    Same interface as SumTree, with cheaper tree maintenance for large trees
+    and large batches.  Diffs for a batch of leaves are added into all their
+    ancestors with a single ``np.add.at`` (ancestor indexes for every level
+    computed at once by bit-shifts), rather than one call per level.
+    Contiguous leaf ranges written by ``advance()`` are instead rebuilt from
+    their children level by level as strided slices, which also clears any
+    rounding error accumulated in those nodes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (tree_idx + 1) >> k - 1 is the ancestor k levels up.
+        self._rise_shifts = np.arange(1, self.tree_levels)[:, None]
+
+    def reconstruct_advance(self, low_on_t, high_on_t, low_off_t, high_off_t,
+            on_value):
+        """Write new values / zeros into leaves, then rebuild ancestors of
+        each written range."""
+        ranges = list()
+        if high_on_t > low_on_t:
+            self.priorities[low_on_t:high_on_t] = on_value
+            ranges.append((low_on_t, high_on_t))
+        elif high_on_t < low_on_t:  # Wrap.
+            m = self.T - low_on_t
+            if np.ndim(on_value) > 0:  # on_value maybe array.
+                self.priorities[low_on_t:] = on_value[:m]
+                self.priorities[:high_on_t] = on_value[m:]
+            else:
+                self.priorities[low_on_t:] = on_value
+                self.priorities[:high_on_t] = on_value
+            ranges.extend([(low_on_t, self.T), (0, high_on_t)])
+        if high_off_t > low_off_t:
+            self.priorities[low_off_t:high_off_t] = 0
+            ranges.append((low_off_t, high_off_t))
+        else:  # Wrap.
+            self.priorities[low_off_t:] = 0
+            self.priorities[:high_off_t] = 0
+            ranges.extend([(low_off_t, self.T), (0, high_off_t)])
+        for low_t, high_t in ranges:
+            if high_t > low_t:
+                low_idx = low_t * self.B + self.low_idx
+                high_idx = high_t * self.B + self.low_idx
+                self.rebuild_range(low_idx, high_idx)
+                self.update_extrema_range(low_idx, high_idx)
+
+    def propagate_diffs(self, tree_idxs, diffs, min_level=1):
+        """All levels in one np.add.at call."""
+        shifts = self._rise_shifts[min_level - 1:]
+        ancestor_idxs = ((np.asarray(tree_idxs) + 1) >> shifts) - 1
+        np.add.at(self.tree, ancestor_idxs.reshape(-1),
+            np.broadcast_to(diffs, ancestor_idxs.shape).reshape(-1))
+
+    def rebuild_range(self, low_idx, high_idx):
+        """Recompute all ancestors of contiguous tree idxs [low, high)."""
+        for _ in range(self.tree_levels - 1):
+            low_idx = (low_idx - 1) // 2
+            high_idx = (high_idx - 2) // 2 + 1
+            self.tree[low_idx:high_idx] = (
+                self.tree[2 * low_idx + 1:2 * high_idx + 1:2] +
+                self.tree[2 * low_idx + 2:2 * high_idx + 2:2])
+
+    def find(self, random_values):
+        """Param random_values: numpy array of floats in range [0, 1].
+        Descends with boolean arithmetic instead of fancy-index writes."""
+        random_values = self.tree[0] * random_values  # Double precision.
+        scaled_random_values = random_values.copy()
+        tree_idxs = np.zeros(len(random_values), dtype=np.int64)
+        for _ in range(self.tree_levels - 1):
+            tree_idxs = 2 * tree_idxs + 1
+            left_values = self.tree[tree_idxs]
+            go_right = random_values > left_values
+            random_values -= left_values * go_right
+            tree_idxs += go_right
+        return tree_idxs, scaled_random_values
+
+
+class MinTree(object):
+    """
+    Companion to SumTree, laid out identically (same tree_idxs), in which
+    each parent holds the min of its children.  Leaves with value 0 (turned
+    off, never sampled) are stored as the neutral element, so the root is the
+    min over sampleable entries, or the neutral element if there are none.
+    Parents are recomputed from children (min cannot be updated by diffs).
+    """
+
+    reduce_op = np.minimum
+    null_value = np.inf
+
+    def __init__(self, size):
+        self.size = size
+        self.tree_levels = int(np.ceil(np.log2(size + 1)) + 1)
+        self.tree = np.full(2 ** self.tree_levels - 1, self.null_value)
+
+    def reset(self):
+        self.tree[:] = self.null_value
+
+    def update(self, tree_idxs, values):
+        """Write leaves at tree_idxs, then recompute all their ancestors."""
+        self.tree[tree_idxs] = np.where(values > 0, values, self.null_value)
+        tree_idxs = np.unique(tree_idxs)  # Sorted; stays sorted rising.
+        for _ in range(self.tree_levels - 1):
+            tree_idxs = (tree_idxs - 1) // 2  # Rise a level.
+            if len(tree_idxs) > 1:
+                keep = np.empty(len(tree_idxs), dtype=bool)
+                keep[0] = True
+                np.not_equal(tree_idxs[1:], tree_idxs[:-1], out=keep[1:])
+                tree_idxs = tree_idxs[keep]
+            self.tree[tree_idxs] = self.reduce_op(self.tree[2 * tree_idxs + 1],
+                self.tree[2 * tree_idxs + 2])
+
+    def update_range(self, low_idx, high_idx, values):
+        """Write leaves at contiguous tree idxs [low, high), then recompute
+        ancestors as slices."""
+        self.tree[low_idx:high_idx] = np.where(values > 0, values,
+            self.null_value)
+        for _ in range(self.tree_levels - 1):
+            low_idx = (low_idx - 1) // 2
+            high_idx = (high_idx - 2) // 2 + 1
+            self.tree[low_idx:high_idx] = self.reduce_op(
+                self.tree[2 * low_idx + 1:2 * high_idx + 1:2],
+                self.tree[2 * low_idx + 2:2 * high_idx + 2:2])
+
+
+class MaxTree(MinTree):
+    """Companion to SumTree in which each parent holds the max of its
+    children (see MinTree)."""
+
+    reduce_op = np.maximum
+    null_value = -np.inf
@@ -1,6 +1,7 @@
 
 import time
 import multiprocessing as mp
+import os.path as osp
 import psutil
 import torch
 from collections import deque
@@ -26,6 +27,8 @@ class AsyncRl(BaseRunner):
             seed=None,
             log_interval_steps=1e5,
             evaluate_agent=False,
+            snapshot_replay=False,
+            shard_replay=False,
             ):
         n_steps = int(n_steps)
         log_interval_steps = int(log_interval_steps)
@@ -42,6 +45,7 @@ class AsyncRl(BaseRunner):
             examples=examples,
             mid_batch_reset=self.sampler.mid_batch_reset,
             async_=True,
+            n_shards=len(self.affinity.optimizer) if self.shard_replay else 1,
         )
         n_itr = self.get_n_itr()
         self.ctrl = self.build_ctrl(len(self.affinity.optimizer))
@@ -82,6 +86,8 @@ class AsyncRl(BaseRunner):
             log_interval_itr=self.log_interval_itr,
             ddp=len(affinities) > 1,
             ctrl=self.ctrl,
+            snapshot_replay=self.snapshot_replay,
+            shard_replay=self.shard_replay,
         )]
         runners += [AsyncOptWorker(
             algo=self.algo,
@@ -90,6 +96,8 @@ class AsyncRl(BaseRunner):
             affinity=affinities[i],
             seed=self.seed + 100,
             ctrl=self.ctrl,
+            rank=i,
+            shard_replay=self.shard_replay,
             ) for i in range(1, len(affinities))]
         procs = [mp.Process(target=r.optimize, args=()) for r in runners]
         for p in procs:
@@ -103,6 +111,7 @@ class AsyncRl(BaseRunner):
                 quit=self.ctrl.quit,
                 sample_ready=self.ctrl.sample_ready[i],
                 sample_copied=self.ctrl.sample_copied[i],
+                rate_limiter=getattr(self.algo, "rate_limiter", None),
             )
             args_list.append((sample_buffers[i], replay_buffer, ctrl))
         procs = [mp.Process(target=memory_copier, args=a) for a in args_list]
@@ -146,6 +155,8 @@ class AsyncOptMaster(object):
             log_interval_itr,
             n_runner,
             ctrl,
+            snapshot_replay=False,
+            shard_replay=False,
             ):
         save__init__args(locals())
 
@@ -165,7 +176,8 @@ class AsyncOptMaster(object):
             if self.ctrl.quit.value:
                 break
             with logger.prefix(f"opt_itr #{itr} "):
-                while self.ctrl.sample_itr.value < throttle_itr:
+                while (self.rate_limiter is None and  # (Else in replay.)
+                        self.ctrl.sample_itr.value < throttle_itr):
                     time.sleep(THROTTLE_WAIT)
                     throttle_time += THROTTLE_WAIT
                 if self.ctrl.opt_throttle is not None:
@@ -198,6 +210,9 @@ class AsyncOptMaster(object):
         )
         self.algo.initialize_async(agent=self.agent,
             updates_per_sync=self.updates_per_sync)
+        if self.shard_replay:
+            self.algo.replay_buffer.set_rank(0)
+        self.rate_limiter = getattr(self.algo, "rate_limiter", None)
         throttle_itr = 1 + self.algo.min_steps_learn // self.itr_batch_size
         delta_throttle_itr = (self.algo.batch_size * self.n_runner *
             self.algo.updates_per_optimize /  # (is updates_per_sync)
@@ -213,6 +228,8 @@ class AsyncOptMaster(object):
     def shutdown(self):
         logger.log("Training complete.")
         self.pbar.stop()
+        if self.rate_limiter is not None:
+            self.rate_limiter.close()  # Release any memory copier waiting.
 
     def get_itr_snapshot(self, itr, sample_itr):
         return dict(
@@ -223,10 +240,16 @@ class AsyncOptMaster(object):
             optimizer_state_dict=self.algo.optim_state_dict(),
         )
 
-    def save_itr_snapshot(self, itr):
+    def save_itr_snapshot(self, itr, sample_itr):
         logger.log("saving snapshot...")
-        params = self.get_itr_snapshot(itr)
+        params = self.get_itr_snapshot(itr, sample_itr)
         logger.save_itr_params(itr, params)
+        if self.snapshot_replay:  # Under replay read lock (memcpy waits).
+            t0 = time.time()
+            n_chunks = self.algo.replay_buffer.save_snapshot(
+                osp.join(logger.get_snapshot_dir(), "replay_snapshot"))
+            logger.log(f"Saved replay snapshot ({n_chunks} chunks written) "
+                f"in {time.time() - t0:.1f} s.")
         logger.log("saved")
 
     def store_diagnostics(self, itr, sample_itr, traj_infos, opt_info):
@@ -254,6 +277,12 @@ class AsyncOptMaster(object):
         logger.record_tabular('UpdatesPerSecond', updates_per_second)
         logger.record_tabular('OptThrottle', (time_elapsed - throttle_time) /
             time_elapsed)
+        if self.shard_replay:  # Each rank's priorities, merged.
+            for k, v in self.algo.replay_buffer.priority_info().items():
+                logger.record_tabular(k, v)
+        if self.rate_limiter is not None:  # (Cumulative.)
+            for k, v in self.rate_limiter.info().items():
+                logger.record_tabular(k, v)
 
         self._log_infos()
         self._last_time = new_time
@@ -333,6 +362,7 @@ class AsyncOptWorker(object):
             seed,
             ctrl,
             rank,
+            shard_replay=False,
             ):
         save__init__args(locals())
 
@@ -358,6 +388,8 @@ class AsyncOptWorker(object):
         )
         self.algo.initialize_async(agent=self.agent,
             updates_per_sync=self.updates_per_sync)
+        if self.shard_replay:
+            self.algo.replay_buffer.set_rank(self.rank)
 
     def shutdown(self):
         pass
@@ -382,7 +414,7 @@ def run_async_sampler(sampler, affinity, ctrl, seed, traj_infos_queue,
                 eval_time = -time.time()
                 traj_infos = sampler.evaluate_agent(itr)
                 eval_time += time.time()
-                ctrl.eval.time.value += eval_time  # Not atomic but only writer.
+                ctrl.eval_time.value += eval_time  # Not atomic but only writer.
         for traj_info in traj_infos:
             traj_infos_queue.put(traj_info)  # Into queue before increment itr.
         ctrl.sample_itr.value = itr
@@ -397,6 +429,8 @@ def memory_copier(sample_buffer, replay_buffer, ctrl):
     while True:
         ctrl.sample_ready.acquire()
         if ctrl.quit.value:
+            if ctrl.rate_limiter is not None:
+                ctrl.rate_limiter.close()  # Release any optimizer waiting.
             break
         replay_buffer.append_samples(sample_buffer)
         ctrl.sample_copied.release()
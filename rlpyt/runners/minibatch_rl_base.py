@@ -3,6 +3,7 @@ import psutil
 import time
 import torch
 import math
+import os.path as osp
 
 from rlpyt.utils.quick_args import save__init__args
 from rlpyt.utils.seed import set_seed, make_seed
@@ -21,6 +22,8 @@ class MinibatchRlBase(BaseRunner):
             seed=None,
             affinity=None,
             log_interval_steps=1e5,
+            snapshot_replay=False,
+            initial_replay_snapshot=None,
             ):
         n_steps = int(n_steps)
         log_interval_steps = int(log_interval_steps)
@@ -65,6 +68,8 @@ class MinibatchRlBase(BaseRunner):
             mid_batch_reset=self.sampler.mid_batch_reset,
             examples=examples
         )
+        if self.initial_replay_snapshot is not None:
+            self.load_replay_snapshot(self.initial_replay_snapshot)
         self.initialize_logging()
         return n_itr
 
@@ -101,8 +106,24 @@ class MinibatchRlBase(BaseRunner):
         logger.log("saving snapshot...")
         params = self.get_itr_snapshot(itr)
         logger.save_itr_params(itr, params)
+        if self.snapshot_replay:
+            self.save_replay_snapshot()
         logger.log("saved")
 
+    def save_replay_snapshot(self):
+        """Incremental: only replay chunks written since the last save."""
+        path = osp.join(logger.get_snapshot_dir(), "replay_snapshot")
+        t0 = time.time()
+        n_chunks = self.algo.replay_buffer.save_snapshot(path)
+        logger.log(f"Saved replay snapshot ({n_chunks} chunks written) in "
+            f"{time.time() - t0:.1f} s.")
+
+    def load_replay_snapshot(self, path):
+        """Restore replay contents, and learn from the first iteration."""
+        self.algo.replay_buffer.load_snapshot(path)
+        self.algo.min_itr_learn = 0
+        logger.log(f"Loaded replay snapshot from {path}.")
+
     def _log_infos(self, traj_infos=None):
         if traj_infos is None:
             traj_infos = self._traj_infos
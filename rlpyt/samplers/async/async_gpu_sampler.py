@@ -5,18 +5,30 @@ import multiprocessing as mp
 import ctypes
 
 from rlpyt.samplers.base import BaseSampler
-from rlpyt.samplers.utils import build_samples_buffer, build_step_buffer
-from rlpyt.samplers.parallel_worker import sampling_process
+from rlpyt.samplers.utils import (build_samples_buffer, build_step_buffer,
+    make_envs)
+from rlpyt.samplers.parallel_worker import sampling_process, initialize_worker
 from rlpyt.samplers.gpu.collectors import EvalCollector
 from rlpyt.utils.logging import logger
 from rlpyt.agents.base import AgentInputs
 from rlpyt.utils.collections import AttrDict
+from rlpyt.utils.synchronize import SpinBarrier, SpinSemaphore
 
 
 EVAL_TRAJ_CHECK = 0.2  # Seconds.
 
 
 class AsyncGpuSampler(BaseSampler):
+    """
+    Sampler for asynchronous runners (AsyncRl), run in its own process.  The
+    sampler affinity is a list, one entry per action server: each server
+    process owns a copy of the agent on its device (cuda_idx, or CPU if
+    None) and forks its own worker processes, serving their actions as in
+    GpuParallelSampler.  Servers write their envs' slice of the double
+    buffer, alternating buffers each batch in step with the collectors
+    (use DbResetCollector or DbWaitResetCollector), for the runner's memory
+    copiers.
+    """
 
     ###########################################################################
     # Master runner methods.
@@ -25,7 +37,7 @@ class AsyncGpuSampler(BaseSampler):
     def master_runner_initialize(self, agent, bootstrap_value=False,
             traj_info_kwargs=None):
         # Construct an example of each kind of data that needs to be stored.
-        env = self.EnvCls(**self.env_kwargs)
+        env = make_envs(self.EnvCls, self.env_kwargs, 1)[0]
         agent.initialize(env.spaces, share_memory=True)  # Actual agent initialization, keep.
         samples_pyt, samples_np, examples = build_samples_buffer(agent, env,
             self.batch_spec, bootstrap_value, agent_shared=True, env_shared=True,
@@ -39,13 +51,14 @@ class AsyncGpuSampler(BaseSampler):
                 setattr(self.TrajInfoCls, "_" + k, v)
         self.double_buffer = double_buffer = (samples_np, samples_np2)
         self.examples = examples
+        self.agent = agent
         return double_buffer, examples
 
     ###########################################################################
     # Sampler runner methods (forked).
     ###########################################################################
 
-    def sample_runner_initialize(self, affinity):
+    def sample_runner_initialize(self, affinity, seed):
         n_server = len(affinity)
         n_worker = sum(len(aff["workers_cpus"]) for aff in affinity)
         n_envs_list = [self.batch_spec.B // n_worker] * n_worker
@@ -66,11 +79,13 @@ class AsyncGpuSampler(BaseSampler):
             self.eval_n_envs_per = 0
             self.eval_max_T = 0
 
+        Barrier = SpinBarrier if self.spin_wait else mp.Barrier
         ctrl = AttrDict(
             quit=mp.RawValue(ctypes.c_bool, False),
-            barrier_in=mp.Barrier(n_server + n_worker + 1),
-            barrier_out=mp.Barrier(n_server + n_worker + 1),
+            barrier_in=Barrier(n_server + n_worker + 1),
+            barrier_out=Barrier(n_server + n_worker + 1),
             do_eval=mp.RawValue(ctypes.c_bool, False),
+            stop_eval=mp.RawValue(ctypes.c_bool, False),  # All servers.
             itr=mp.RawValue(ctypes.c_long, 0),
         )
         traj_infos_queue = mp.Queue()
@@ -79,18 +94,20 @@ class AsyncGpuSampler(BaseSampler):
             ctrl=ctrl,
             traj_infos_queue=traj_infos_queue,
             )
-        servers_kwargs = assemble_servers_kwargs(affinity, n_envs_list,
-            self.seed, self.double_buffer)
+        servers_kwargs = assemble_servers_kwargs(self.double_buffer, affinity,
+            n_envs_list, seed)
         servers = [mp.Process(target=self.action_server_process,
-            kwargs=s_kwargs.update(**common_kwargs))
+            kwargs=dict(s_kwargs, **common_kwargs))
             for s_kwargs in servers_kwargs]
         for s in servers:
             s.start()
         self.servers = servers
         self.ctrl = ctrl
         self.traj_infos_queue = traj_infos_queue
+        self.ctrl.barrier_out.wait()  # Servers and workers initialized.
 
     def obtain_samples(self, itr):
+        self.ctrl.itr.value = itr
         self.ctrl.barrier_in.wait()
         # Sampling in sub-processes here.
         self.ctrl.barrier_out.wait()
@@ -100,8 +117,9 @@ class AsyncGpuSampler(BaseSampler):
         return traj_infos
 
     def evaluate_agent(self, itr):
-        self.ctrl.do_eval = True
-        self.sync.stop_eval.value = False
+        self.ctrl.itr.value = itr
+        self.ctrl.do_eval.value = True
+        self.ctrl.stop_eval.value = False
         self.ctrl.barrier_in.wait()
         traj_infos = list()
         if self.eval_max_trajectories is not None:
@@ -110,7 +128,7 @@ class AsyncGpuSampler(BaseSampler):
                 while self.traj_infos_queue.qsize():
                     traj_infos.append(self.traj_infos_queue.get())
                 if len(traj_infos) >= self.eval_max_trajectories:
-                    self.sync.stop_eval.value = True
+                    self.ctrl.stop_eval.value = True
                     logger.log("Evaluation reached max num trajectories "
                         f"({self.eval_max_trajectories}).")
                     break  # Stop possibly before workers reach max_T.
@@ -134,14 +152,17 @@ class AsyncGpuSampler(BaseSampler):
     # Methods in forked action server process.
     ###########################################################################
 
-    def action_server_process(self, double_buffer_slice, ctrl, traj_infos_queue,
-            affinity, seed, n_envs_list):
+    def action_server_process(self, rank, double_buffer_slice, ctrl,
+            traj_infos_queue, affinity, seed, n_envs_list):
         """Runs in forked process, inherits from original process, so can easily
         pass args to env worker processes, forked from here."""
         self.ctrl = ctrl
         self.launch_workers(double_buffer_slice, traj_infos_queue, affinity,
-            seed, n_envs_list)
-        self.agent.initialize_cuda(cuda_idx=affinity["cuda_idx"], ddp=False)
+            seed, n_envs_list)  # Before any CUDA initialization.
+        initialize_worker(rank, seed, affinity["master_cpus"],
+            affinity["master_torch_threads"])
+        self.agent.initialize_cuda(cuda_idx=affinity.get("cuda_idx", None))
+        self.ctrl.barrier_out.wait()
         while True:
             self.ctrl.barrier_in.wait()
             if self.ctrl.quit.value:
@@ -149,16 +170,17 @@ class AsyncGpuSampler(BaseSampler):
             self.agent.recv_shared_memory()
             if self.ctrl.do_eval.value:
                 self.agent.eval_mode(self.ctrl.itr.value)
-                self.serve_actions_evaluation()
+                self.serve_actions_evaluation(self.ctrl.itr.value)
             else:
                 self.agent.sample_mode(self.ctrl.itr.value)
-                self.serve_actions()
+                self.serve_actions(self.ctrl.itr.value)
             self.ctrl.barrier_out.wait()
         self.shutdown_workers()
 
-    def serve_actions(self):
+    def serve_actions(self, itr):
         step_blockers, act_waiters = self.sync.step_blockers, self.sync.act_waiters
         step_np, step_pyt = self.step_buffer_np, self.step_buffer_pyt
+        samples_np = self.double_buffer[self.j]  # Same as collectors this batch.
 
         agent_inputs = AgentInputs(step_pyt.observation, step_pyt.action,
             step_pyt.reward)  # Fixed buffer objects.
@@ -179,8 +201,8 @@ class AsyncGpuSampler(BaseSampler):
 
         for b in step_blockers:
             b.acquire()
-        if "bootstrap_value" in self.samples_np.agent:
-            self.samples_np.agent.bootstrap_value[:] = self.agent.value(
+        if "bootstrap_value" in samples_np.agent:
+            samples_np.agent.bootstrap_value[:] = self.agent.value(
                 *agent_inputs)
         if np.any(step_np.done):  # Reset at end of batch; ready for next.
             for b_reset in np.where(step_np.done)[0]:
@@ -188,6 +210,7 @@ class AsyncGpuSampler(BaseSampler):
                 step_np.reward[b_reset] = 0  # Null prev_reward into agent.
                 self.agent.reset_one(idx=b_reset)
             # step_np.done[:] = False  # Worker resets at start of next.
+        self.j ^= 1  # Double buffer.
 
     def serve_actions_evaluation(self, itr):
         step_blockers, act_waiters = self.sync.step_blockers, self.sync.act_waiters
@@ -206,20 +229,24 @@ class AsyncGpuSampler(BaseSampler):
             action, agent_info = self.agent.step(*agent_inputs)
             step_np.action[:] = action
             step_np.agent_info[:] = agent_info
+            # Workers read stop_eval after their act_waiter, so set it first:
+            # server and workers then leave the loop at the same step.
+            self.sync.stop_eval.value = self.ctrl.stop_eval.value
             for w in act_waiters:
                 w.release()
             if self.sync.stop_eval.value:
-                break  # TODO: Double-check where this goes relative to semas.
+                break
         for b in step_blockers:
             b.acquire()  # Workers always do extra release; drain it.
 
     def launch_workers(self, double_buffer, traj_infos_queue, affinity,
-            seed, n_envs_list, eval_n_envs_per):
+            seed, n_envs_list):
         n_worker = len(affinity["workers_cpus"])
+        Semaphore = SpinSemaphore if self.spin_wait else mp.Semaphore
         sync = AttrDict(
-            step_blockers=[mp.Semaphore(0) for _ in range(n_worker)],
-            act_waiters=[mp.Semaphore(0) for _ in range(n_worker)],
-            stop_eval=mp.RawValue(ctypes.c_bool, False),
+            step_blockers=[Semaphore(0) for _ in range(n_worker)],
+            act_waiters=[Semaphore(0) for _ in range(n_worker)],
+            stop_eval=mp.RawValue(ctypes.c_bool, False),  # This server's.
         )
         step_buffer_pyt, step_buffer_np = build_step_buffer(self.examples,
             sum(n_envs_list))
@@ -243,6 +270,7 @@ class AsyncGpuSampler(BaseSampler):
             traj_infos_queue=traj_infos_queue,
             ctrl=self.ctrl,
             max_decorrelation_steps=self.max_decorrelation_steps,
+            torch_threads=affinity.get("worker_torch_threads", None),
             eval_n_envs=self.eval_n_envs_per,
             eval_CollectorCls=self.eval_CollectorCls or EvalCollector,
             eval_env_kwargs=self.eval_env_kwargs,
@@ -259,6 +287,8 @@ class AsyncGpuSampler(BaseSampler):
             w.start()
 
         self.workers = workers
+        self.double_buffer = double_buffer  # This server's slice.
+        self.j = 0
         self.step_buffer_pyt = step_buffer_pyt
         self.step_buffer_np = step_buffer_np
         self.sync = sync
@@ -274,10 +304,11 @@ def assemble_servers_kwargs(double_buffer, affinity, n_envs_list, seed):
     i_env = 0
     i_worker = 0
     for rank in range(len(affinity)):
-        n_worker = len(affinity["workers_cpus"])
+        n_worker = len(affinity[rank]["workers_cpus"])
         n_env = sum(n_envs_list[i_worker:i_worker + n_worker])
         slice_B = slice(i_env, i_env + n_env)
         server_kwargs = dict(
+            rank=rank,
             double_buffer_slice=tuple(buf[:, slice_B] for buf in double_buffer),
             affinity=affinity[rank],
             n_envs_list=n_envs_list[i_worker:i_worker + n_worker],
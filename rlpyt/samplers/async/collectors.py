@@ -12,8 +12,9 @@ class DoubleBufferCollectorMixin(object):
 
     def collect_batch(self, *args, **kwargs):
         self.samples_np = self.double_buffer[self.j]
-        super().collect_batch(*args, **kwargs)
+        ret = super().collect_batch(*args, **kwargs)
         self.j ^= 1
+        return ret
 
 
 class DbResetCollector(DoubleBufferCollectorMixin, ResetCollector):
@@ -22,6 +22,7 @@ class BaseSampler(object):
             eval_max_steps=None,  # int if using evaluation.
             eval_max_trajectories=None,  # Optional earlier cutoff.
             eval_min_envs_reset=1,
+            spin_wait=False,  # Parallel: sync by polling shared memory.
             ):
         eval_max_steps = None if eval_max_steps is None else int(eval_max_steps)
         eval_max_trajectories = (None if eval_max_trajectories is None else
@@ -3,7 +3,9 @@ import numpy as np
 
 from rlpyt.samplers.base import BaseCollector
 from rlpyt.agents.base import AgentInputs
-from rlpyt.utils.buffer import buffer_from_example, torchify_buffer, numpify_buffer
+from rlpyt.envs.vec_env import as_vec_env
+from rlpyt.utils.buffer import (buffer_from_example, torchify_buffer,
+    numpify_buffer, buffer_method)
 from rlpyt.utils.logging import logger
 from rlpyt.utils.quick_args import save__init__args
 
@@ -44,6 +46,64 @@ class DecorrelatingStartCollector(BaseCollector):
         return AgentInputs(observation, prev_action, prev_reward), traj_infos
 
 
+class VecDecorrelatingStartCollector(DecorrelatingStartCollector):
+    """Steps all envs at once, as one VecEnv (envs given as one VecEnv, else
+    wrapped in a SerialVecEnv); per-env Python work remains only for
+    trajectory infos and for envs which are done."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vec_env = as_vec_env(self.envs)
+        self.n_envs = self.vec_env.n_envs
+
+    def start_envs(self, max_decorrelation_steps=0):
+        """Calls reset() on the vec env and returns agent_inputs buffer."""
+        env = self.vec_env
+        traj_infos = [self.TrajInfoCls() for _ in range(self.n_envs)]
+        observation = buffer_method(env.reset(), "copy")
+        prev_action = env.action_space.sample(self.n_envs, null=True)
+        prev_reward = np.zeros(self.n_envs, dtype="float32")
+        if self.rank == 0:
+            logger.log("Sampler decorrelating envs, max steps: "
+                f"{max_decorrelation_steps}")
+        # Envs step together, each restarting at a random step, to end as
+        # if stepped 1 + rand * max_decorrelation_steps times from reset.
+        reset_t = (np.random.rand(self.n_envs) *
+            max_decorrelation_steps).astype(np.int64)
+        null_action = env.action_space.sample(null=True)
+        for t in range(max_decorrelation_steps):
+            b = np.where(reset_t == t)[0]
+            if t > 0 and len(b) > 0:
+                observation[b] = env.reset_envs(b)
+                for i in b:
+                    traj_infos[i] = self.TrajInfoCls()
+            a = env.action_space.sample(self.n_envs)
+            o, r, d, info = env.step(a)
+            traj_done = step_traj_infos(traj_infos, o, a, r, d, None, info)
+            observation[:] = o
+            prev_action[:] = a
+            prev_reward[:] = r
+            b = np.where(traj_done)[0]
+            if len(b) > 0:
+                observation[b] = env.reset_envs(b)
+                for i in b:
+                    traj_infos[i] = self.TrajInfoCls()
+            prev_action[d] = null_action
+            prev_reward[d] = 0
+        return AgentInputs(observation, prev_action, prev_reward), traj_infos
+
+
+def step_traj_infos(traj_infos, observation, action, reward, done,
+        agent_info, env_info):
+    """Step each env's trajectory info from batched arrays; returns which
+    trajectories ended (traj_done if in env_info, else done)."""
+    for b, traj_info in enumerate(traj_infos):
+        traj_info.step(observation[b], action[b], reward[b], done[b],
+            agent_info[b] if agent_info else agent_info,
+            env_info[b] if env_info else env_info)
+    return getattr(env_info, "traj_done", done)
+
+
 class SerialEvalCollector(object):
     """Does not record intermediate data."""
 
@@ -90,3 +150,43 @@ class SerialEvalCollector(object):
                     len(completed_traj_infos) >= self.max_trajectories):
                 break
         return completed_traj_infos
+
+
+class SerialVecEvalCollector(SerialEvalCollector):
+    """Steps all eval envs at once, as one VecEnv."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vec_env = as_vec_env(self.envs)
+
+    def collect_evaluation(self, itr):
+        env, n_envs = self.vec_env, self.vec_env.n_envs
+        traj_infos = [self.TrajInfoCls() for _ in range(n_envs)]
+        completed_traj_infos = list()
+        observation = buffer_method(env.reset(), "copy")
+        action = env.action_space.sample(n_envs, null=True)
+        reward = np.zeros(n_envs, dtype="float32")
+        obs_pyt, act_pyt, rew_pyt = torchify_buffer((observation, action, reward))
+        self.agent.reset()
+        for t in range(self.max_T):
+            act_pyt, agent_info = self.agent.step(obs_pyt, act_pyt, rew_pyt)
+            action = numpify_buffer(act_pyt)
+            o, r, d, env_info = env.step(action)
+            traj_done = step_traj_infos(traj_infos, observation, action, r, d,
+                agent_info, env_info)
+            observation[:] = o
+            reward[:] = r
+            b = np.where(traj_done)[0]
+            for i in b:
+                completed_traj_infos.append(traj_infos[i].terminate(o[i]))
+                traj_infos[i] = self.TrajInfoCls()
+            if len(b) > 0:
+                observation[b] = env.reset_envs(b)
+            action[d] = 0  # Prev_action for next step.
+            reward[d] = 0
+            for b in np.where(d)[0]:
+                self.agent.reset_one(idx=b)
+            if (self.max_trajectories is not None and
+                    len(completed_traj_infos) >= self.max_trajectories):
+                break
+        return completed_traj_infos
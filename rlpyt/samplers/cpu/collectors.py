@@ -1,8 +1,10 @@
 
 import numpy as np
 
-from rlpyt.samplers.collectors import DecorrelatingStartCollector
+from rlpyt.samplers.collectors import (DecorrelatingStartCollector,
+    VecDecorrelatingStartCollector, step_traj_infos)
 from rlpyt.samplers.base import BaseEvalCollector
+from rlpyt.envs.vec_env import as_vec_env
 from rlpyt.agents.base import AgentInputs
 from rlpyt.utils.buffer import (torchify_buffer, numpify_buffer, buffer_from_example,
     buffer_method)
@@ -55,6 +57,53 @@ class ResetCollector(DecorrelatingStartCollector):
         return AgentInputs(observation, action, reward), traj_infos, completed_infos
 
 
+class VecResetCollector(VecDecorrelatingStartCollector):
+    """As ResetCollector, but steps all envs in one call to the VecEnv and
+    writes whole arrays of outputs.  (No batched WaitResetCollector: it
+    would need to step only some of the envs.)"""
+
+    mid_batch_reset = True
+
+    def collect_batch(self, agent_inputs, traj_infos, itr):
+        agent_buf, env_buf = self.samples_np.agent, self.samples_np.env
+        completed_infos = list()
+        observation, action, reward = agent_inputs
+        obs_pyt, act_pyt, rew_pyt = torchify_buffer(agent_inputs)
+        agent_buf.prev_action[0] = action  # Leading prev_action.
+        env_buf.prev_reward[0] = reward
+        self.agent.sample_mode(itr)
+        for t in range(self.batch_T):
+            env_buf.observation[t] = observation
+            act_pyt, agent_info = self.agent.step(obs_pyt, act_pyt, rew_pyt)
+            action = numpify_buffer(act_pyt)
+            o, r, d, env_info = self.vec_env.step(action)
+            traj_done = step_traj_infos(traj_infos, observation, action, r, d,
+                agent_info, env_info)
+            observation[:] = o
+            reward[:] = r
+            b = np.where(traj_done)[0]
+            for i in b:
+                completed_infos.append(traj_infos[i].terminate(o[i]))
+                traj_infos[i] = self.TrajInfoCls()
+            if len(b) > 0:
+                observation[b] = self.vec_env.reset_envs(b)
+            for b in np.where(d)[0]:
+                self.agent.reset_one(idx=b)
+            env_buf.done[t] = d
+            if env_info:
+                env_buf.env_info[t] = env_info
+            agent_buf.action[t] = action
+            env_buf.reward[t] = reward
+            if agent_info:
+                agent_buf.agent_info[t] = agent_info
+
+        if "bootstrap_value" in agent_buf:
+            # agent.value() should not advance rnn state.
+            agent_buf.bootstrap_value[:] = self.agent.value(obs_pyt, act_pyt, rew_pyt)
+
+        return AgentInputs(observation, action, reward), traj_infos, completed_infos
+
+
 class WaitResetCollector(DecorrelatingStartCollector):
 
     mid_batch_reset = False
@@ -161,3 +210,41 @@ class EvalCollector(BaseEvalCollector):
                 reward[b] = r
             if self.sync.stop_eval.value:
                 break
+
+
+class VecEvalCollector(EvalCollector):
+    """Steps all eval envs at once, as one VecEnv."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vec_env = as_vec_env(self.envs)
+
+    def collect_evaluation(self, itr):
+        env, n_envs = self.vec_env, self.vec_env.n_envs
+        traj_infos = [self.TrajInfoCls() for _ in range(n_envs)]
+        observation = buffer_method(env.reset(), "copy")
+        action = env.action_space.sample(n_envs, null=True)
+        reward = np.zeros(n_envs, dtype="float32")
+        obs_pyt, act_pyt, rew_pyt = torchify_buffer((observation, action, reward))
+        self.agent.reset()
+        self.agent.eval_mode(itr)
+        for t in range(self.max_T):
+            act_pyt, agent_info = self.agent.step(obs_pyt, act_pyt, rew_pyt)
+            action = numpify_buffer(act_pyt)
+            o, r, d, env_info = env.step(action)
+            traj_done = step_traj_infos(traj_infos, observation, action, r, d,
+                agent_info, env_info)
+            observation[:] = o
+            reward[:] = r
+            b = np.where(traj_done)[0]
+            for i in b:
+                self.traj_infos_queue.put(traj_infos[i].terminate(o[i]))
+                traj_infos[i] = self.TrajInfoCls()
+            if len(b) > 0:
+                observation[b] = env.reset_envs(b)
+            action[d] = 0  # Next prev_action.
+            reward[d] = 0
+            for b in np.where(d)[0]:
+                self.agent.reset_one(idx=b)
+            if self.sync.stop_eval.value:
+                break
@@ -4,7 +4,8 @@ import time
 
 
 from rlpyt.samplers.base import BaseSampler
-from rlpyt.samplers.utils import build_samples_buffer, build_par_objs
+from rlpyt.samplers.utils import (build_samples_buffer, build_par_objs,
+    make_envs)
 from rlpyt.samplers.parallel_worker import sampling_process
 from rlpyt.samplers.cpu.collectors import EvalCollector
 from rlpyt.utils.logging import logger
@@ -27,7 +28,7 @@ class CpuParallelSampler(BaseSampler):
                 n_envs_list[b] += 1
 
         # Construct an example of each kind of data that needs to be stored.
-        env = self.EnvCls(**self.env_kwargs)
+        env = make_envs(self.EnvCls, self.env_kwargs, 1)[0]
         agent.initialize(env.spaces, share_memory=True)  # Actual agent initialization.
         samples_pyt, samples_np, examples = build_samples_buffer(agent, env,
             self.batch_spec, bootstrap_value, agent_shared=True, env_shared=True,
@@ -35,7 +36,8 @@ class CpuParallelSampler(BaseSampler):
         env.close()
         del env
 
-        ctrl, traj_infos_queue, sync = build_par_objs(n_parallel)
+        ctrl, traj_infos_queue, sync = build_par_objs(n_parallel,
+            spin_wait=self.spin_wait)
         if traj_info_kwargs:
             for k, v in traj_info_kwargs.items():
                 setattr(self.TrajInfoCls, "_" + k, v)  # Avoid passing at init.
@@ -0,0 +1,132 @@
+
+import numpy as np
+
+from rlpyt.samplers.gpu.parallel_sampler import (GpuParallelSampler,
+    EVAL_TRAJ_CHECK)
+from rlpyt.agents.base import AgentInputs
+from rlpyt.utils.logging import logger
+
+
+class GpuAlternatingSampler(GpuParallelSampler):
+    """
+    Splits the workers into two groups, each with its own step buffer (its
+    envs' contiguous part of the one built), and serves the groups' actions
+    in turn: the agent steps (e.g. on GPU) for one group while the other
+    group's workers step their environments, so neither waits on the other
+    when env and agent step times are similar.  Needs an even number of
+    workers.  Recurrent agents must be alternating (e.g. with
+    AlternatingRecurrentAgentMixin), holding a recurrent state per group.
+    """
+
+    def initialize(self, agent, affinity, seed, bootstrap_value=False,
+            traj_info_kwargs=None):
+        n_parallel = len(affinity["workers_cpus"])
+        if n_parallel % 2 != 0:
+            raise ValueError("Alternating sampler requires an even number of "
+                f"workers, not {n_parallel}.")
+        if agent.recurrent and not getattr(agent, "alternating", False):
+            raise TypeError("Alternating sampler requires an alternating "
+                "recurrent agent (AlternatingRecurrentAgentMixin).")
+        if self.min_ready_fraction < 1:
+            raise ValueError("Alternating sampler serves all "
+                "workers of a group (min_ready_fraction=1).")
+        examples = super().initialize(agent, affinity, seed, bootstrap_value,
+            traj_info_kwargs)
+        half = n_parallel // 2
+        B_0 = sum(self.n_envs_list[:half])
+        self.group_workers = (slice(0, half), slice(half, n_parallel))
+        self.group_slices = (slice(0, B_0), slice(B_0, self.batch_spec.B))
+        eval_B_0 = self.eval_n_envs_per * half
+        self.eval_group_slices = (slice(0, eval_B_0), slice(eval_B_0, None))
+        return examples
+
+    def serve_actions(self, itr):
+        groups = self.build_groups(self.step_buffer_np, self.step_buffer_pyt,
+            self.group_slices)
+
+        for t in range(self.batch_spec.T):
+            for step_blockers, act_waiters, step_np, agent_inputs, _ in groups:
+                for b in step_blockers:
+                    b.acquire()  # Workers written obs and rew, first prev_act.
+                if self.mid_batch_reset and np.any(step_np.done):
+                    for b_reset in np.where(step_np.done)[0]:
+                        step_np.action[b_reset] = 0  # Null prev_action into agent.
+                        step_np.reward[b_reset] = 0  # Null prev_reward into agent.
+                        self.agent.reset_one(idx=b_reset)  # (Within group.)
+                action, agent_info = self.agent.step(*agent_inputs)
+                step_np.action[:] = action  # Worker applies to env.
+                step_np.agent_info[:] = agent_info  # Worker sends to traj_info.
+                for w in act_waiters:
+                    w.release()  # Signal to worker; other group's turn.
+
+        for step_blockers, _, step_np, agent_inputs, slice_B in groups:
+            for b in step_blockers:
+                b.acquire()
+            if "bootstrap_value" in self.samples_np.agent:
+                self.samples_np.agent.bootstrap_value[:, slice_B] = \
+                    self.agent.value(*agent_inputs)
+            if np.any(step_np.done):  # Reset at end of batch; ready for next.
+                for b_reset in np.where(step_np.done)[0]:
+                    step_np.action[b_reset] = 0  # Null prev_action into agent.
+                    step_np.reward[b_reset] = 0  # Null prev_reward into agent.
+                    self.agent.reset_one(idx=b_reset)
+            self.toggle_agent_alt()
+
+    def serve_actions_evaluation(self, itr):
+        groups = self.build_groups(self.eval_step_buffer_np,
+            self.eval_step_buffer_pyt, self.eval_group_slices)
+        traj_infos = list()
+        self.agent.reset()
+
+        for t in range(self.eval_max_T):
+            if t % EVAL_TRAJ_CHECK == 0:  # (While workers stepping.)
+                while self.traj_infos_queue.qsize():
+                    traj_infos.append(self.traj_infos_queue.get())
+            for g, (step_blockers, act_waiters, step_np, agent_inputs,
+                    _) in enumerate(groups):
+                for b in step_blockers:
+                    b.acquire()
+                for b_reset in np.where(step_np.done)[0]:
+                    step_np.action[b_reset] = 0  # Null prev_action.
+                    step_np.reward[b_reset] = 0  # Null prev_reward.
+                    self.agent.reset_one(idx=b_reset)
+                action, agent_info = self.agent.step(*agent_inputs)
+                step_np.action[:] = action
+                step_np.agent_info[:] = agent_info
+                if (g == 0 and self.eval_max_trajectories is not None and
+                        t % EVAL_TRAJ_CHECK == 0):  # (Both groups stop at t.)
+                    self.sync.stop_eval.value = (len(traj_infos) >=
+                        self.eval_max_trajectories)
+                for w in act_waiters:
+                    w.release()
+            if self.sync.stop_eval.value:
+                logger.log("Evaluation reach max num trajectories "
+                    f"({self.eval_max_trajectories}).")
+                break
+        if t == self.eval_max_T - 1 and self.eval_max_trajectories is not None:
+            logger.log("Evaluation reached max num time steps "
+                f"({self.eval_max_T}).")
+        for b in self.sync.step_blockers:
+            b.acquire()  # Workers always do extra release; drain it.
+
+        return traj_infos
+
+    def build_groups(self, step_buffer_np, step_buffer_pyt, group_slices):
+        """Per group: step_blockers, act_waiters, step buffer (numpy),
+        agent inputs (torch), env slice; buffers are views."""
+        groups = list()
+        for workers, slice_B in zip(self.group_workers, group_slices):
+            step_pyt = step_buffer_pyt[slice_B]
+            groups.append((
+                self.sync.step_blockers[workers],
+                self.sync.act_waiters[workers],
+                step_buffer_np[slice_B],
+                AgentInputs(step_pyt.observation, step_pyt.action,
+                    step_pyt.reward),
+                slice_B,
+            ))
+        return groups
+
+    def toggle_agent_alt(self):
+        if getattr(self.agent, "alternating", False):
+            self.agent.toggle_alt()
@@ -2,11 +2,26 @@
 import numpy as np
 
 from rlpyt.samplers.base import BaseEvalCollector
-from rlpyt.samplers.collectors import DecorrelatingStartCollector
+from rlpyt.samplers.collectors import (DecorrelatingStartCollector,
+    VecDecorrelatingStartCollector, step_traj_infos)
+from rlpyt.envs.vec_env import as_vec_env
 from rlpyt.utils.buffer import buffer_method
 
 
-class ResetCollector(DecorrelatingStartCollector):
+class StepBufferStartMixin(object):
+    """Writes the starting agent inputs (after any decorrelation steps) into
+    the step buffer, where the action server reads them."""
+
+    def start_envs(self, max_decorrelation_steps=0):
+        agent_inputs, traj_infos = super().start_envs(max_decorrelation_steps)
+        step = self.step_buffer_np
+        step.observation[:] = agent_inputs.observation
+        step.action[:] = agent_inputs.prev_action
+        step.reward[:] = agent_inputs.prev_reward
+        return agent_inputs, traj_infos
+
+
+class ResetCollector(StepBufferStartMixin, DecorrelatingStartCollector):
     """Valid to run episodic lives."""
 
     mid_batch_reset = True
@@ -46,14 +61,56 @@ class ResetCollector(DecorrelatingStartCollector):
         return None, traj_infos, completed_infos
 
 
-class WaitResetCollector(DecorrelatingStartCollector):
+class VecResetCollector(StepBufferStartMixin, VecDecorrelatingStartCollector):
+    """As ResetCollector, but steps all envs in one call to the VecEnv and
+    writes whole arrays into the step buffer and samples."""
+
+    mid_batch_reset = True
+
+    def collect_batch(self, agent_inputs, traj_infos, itr):
+        """Params agent_inputs and itr unused."""
+        act_waiter, step_blocker = self.sync.act_waiter, self.sync.step_blocker
+        step = self.step_buffer_np
+        agent_buf, env_buf = self.samples_np.agent, self.samples_np.env
+        agent_buf.prev_action[0] = step.action
+        env_buf.prev_reward[0] = step.reward
+        step_blocker.release()  # Previous obs already written, ready for new.
+        completed_infos = list()
+        for t in range(self.batch_T):
+            env_buf.observation[t] = step.observation
+            act_waiter.acquire()  # Need sampled actions from server.
+            o, r, d, env_info = self.vec_env.step(step.action)
+            traj_done = step_traj_infos(traj_infos, step.observation,
+                step.action, r, d, step.agent_info, env_info)
+            step.observation[:] = o
+            b = np.where(traj_done)[0]
+            for i in b:
+                completed_infos.append(traj_infos[i].terminate(o[i]))
+                traj_infos[i] = self.TrajInfoCls()
+            if len(b) > 0:
+                step.observation[b] = self.vec_env.reset_envs(b)
+            step.reward[:] = r
+            step.done[:] = d
+            if env_info:
+                env_buf.env_info[t] = env_info
+            agent_buf.action[t] = step.action  # OPTIONAL BY SERVER
+            env_buf.reward[t] = step.reward
+            env_buf.done[t] = step.done
+            if step.agent_info:
+                agent_buf.agent_info[t] = step.agent_info  # OPTIONAL BY SERVER
+            step_blocker.release()  # Ready for server to use/write step buffer.
+
+        return None, traj_infos, completed_infos
+
+
+class WaitResetCollector(StepBufferStartMixin, DecorrelatingStartCollector):
     """Valid to run episodic lives."""
 
     mid_batch_reset = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.need_reset = np.zeros(len(self.envs), dtype=np.bool)
+        self.need_reset = np.zeros(len(self.envs), dtype=bool)
         # e.g. For episodic lives, hold the observation output when done, record
         # blanks for the rest of the batch, but reinstate the observation to start
         # next batch.
@@ -147,3 +204,40 @@ class EvalCollector(BaseEvalCollector):
                 step.reward[b] = r
                 step.done[b] = d
             step_blocker.release()
+
+
+class VecEvalCollector(EvalCollector):
+    """Steps all eval envs at once, as one VecEnv."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vec_env = as_vec_env(self.envs)
+
+    def collect_evaluation(self, itr):
+        """Param itr unused."""
+        env = self.vec_env
+        traj_infos = [self.TrajInfoCls() for _ in range(env.n_envs)]
+        act_waiter, step_blocker = self.sync.act_waiter, self.sync.step_blocker
+        step = self.step_buffer_np
+        step.observation[:] = env.reset()
+        step.done[:] = False
+        step_blocker.release()
+
+        for t in range(self.max_T):
+            act_waiter.acquire()
+            if self.sync.stop_eval.value:
+                step_blocker.release()  # Always release at end of loop.
+                break
+            o, r, d, env_info = env.step(step.action)
+            traj_done = step_traj_infos(traj_infos, step.observation,
+                step.action, r, d, step.agent_info, env_info)
+            step.observation[:] = o
+            b = np.where(traj_done)[0]
+            for i in b:
+                self.traj_infos_queue.put(traj_infos[i].terminate(o[i]))
+                traj_infos[i] = self.TrajInfoCls()
+            if len(b) > 0:
+                step.observation[b] = env.reset_envs(b)
+            step.reward[:] = r
+            step.done[:] = d
+            step_blocker.release()
@@ -1,11 +1,13 @@
 
 import multiprocessing as mp
+import time
 import numpy as np
+import torch
 
 
 from rlpyt.samplers.base import BaseSampler
 from rlpyt.samplers.utils import (build_samples_buffer, build_par_objs,
-    build_step_buffer)
+    build_step_buffer, make_envs)
 from rlpyt.samplers.parallel_worker import sampling_process
 from rlpyt.samplers.gpu.collectors import EvalCollector
 from rlpyt.utils.collections import AttrDict
@@ -14,9 +16,26 @@ from rlpyt.utils.logging import logger
 
 
 EVAL_TRAJ_CHECK = 20  # Time steps.
+READY_POLL = 1e-3  # Seconds blocking on one worker, while gathering ready.
 
 
 class GpuParallelSampler(BaseSampler):
+    """
+    Workers step environments; the master steps the agent for all of them
+    at once (e.g. on GPU), every time step.  With min_ready_fraction < 1
+    (feedforward agents only), the master instead serves actions like an
+    env pool: it steps the agent on whichever workers have written their
+    observations, once they hold at least that fraction of the envs still
+    collecting (or any, after ready_timeout seconds), and releases only
+    those workers.  Slow workers (e.g. envs resetting) then only hold up
+    the end of the batch, not every time step.  Evaluation is lock-step.
+    """
+
+    def __init__(self, *args, min_ready_fraction=1., ready_timeout=None,
+            **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_ready_fraction = min_ready_fraction
+        self.ready_timeout = ready_timeout
 
     def initialize(self, agent, affinity, seed,
             bootstrap_value=False, traj_info_kwargs=None):
@@ -30,7 +49,7 @@ class GpuParallelSampler(BaseSampler):
                 n_envs_list[b] += 1
 
         # Construct an example of each kind of data that needs to be stored.
-        env = self.EnvCls(**self.env_kwargs)
+        env = make_envs(self.EnvCls, self.env_kwargs, 1)[0]
         agent.initialize(env.spaces, share_memory=False)  # Actual agent initialization, keep.
         samples_pyt, samples_np, examples = build_samples_buffer(agent, env,
             self.batch_spec, bootstrap_value, agent_shared=True, env_shared=True,
@@ -55,7 +74,8 @@ class GpuParallelSampler(BaseSampler):
             eval_step_buffer_np = None
             eval_max_T = None
 
-        ctrl, traj_infos_queue, sync = build_par_objs(n_parallel)
+        ctrl, traj_infos_queue, sync = build_par_objs(n_parallel,
+            spin_wait=self.spin_wait)
         if traj_info_kwargs:
             for k, v in traj_info_kwargs.items():
                 setattr(self.TrajInfoCls, "_" + k, v)  # Avoid passing at init.
@@ -96,7 +116,16 @@ class GpuParallelSampler(BaseSampler):
         self.step_buffer_pyt = step_buffer_pyt
         self.step_buffer_np = step_buffer_np
         self.sync = sync
+        self.n_envs_list = n_envs_list
+        self.eval_n_envs_per = eval_n_envs_per
         self.mid_batch_reset = self.CollectorCls.mid_batch_reset
+        if self.min_ready_fraction < 1:
+            if agent.recurrent:
+                raise ValueError("Serving ready workers only "
+                    "(min_ready_fraction < 1) requires a feedforward agent.")
+            self.worker_n_envs = np.array(n_envs_list)
+            self.worker_env_idxs = np.split(np.arange(self.batch_spec.B),
+                np.cumsum(n_envs_list)[:-1])
 
         self.ctrl.barrier_out.wait()  # Wait for workers to decorrelate envs.
         return examples  # e.g. In case useful to build replay buffer
@@ -105,7 +134,10 @@ class GpuParallelSampler(BaseSampler):
         # self.samples_np[:] = 0  # Reset all batch sample values (optional?).
         self.agent.sample_mode(itr)
         self.ctrl.barrier_in.wait()
-        self.serve_actions(itr)  # Worker step environments here.
+        if self.min_ready_fraction < 1:
+            self.serve_actions_ready(itr)  # Worker step environments here.
+        else:
+            self.serve_actions(itr)  # Worker step environments here.
         self.ctrl.barrier_out.wait()
         traj_infos = list()
         while self.traj_infos_queue.qsize():
@@ -163,6 +195,70 @@ class GpuParallelSampler(BaseSampler):
                 self.agent.reset_one(idx=b_reset)
             # step_np.done[:] = False  # Worker resets at start of next.
 
+    def serve_actions_ready(self, itr):
+        """Each worker is served batch_T actions, but not in lock-step."""
+        step_blockers, act_waiters = self.sync.step_blockers, self.sync.act_waiters
+        step_np, step_pyt = self.step_buffer_np, self.step_buffer_pyt
+        n_served = np.zeros(len(step_blockers), dtype=np.int64)
+        collecting = np.ones(len(step_blockers), dtype=bool)
+        ready = np.zeros(len(step_blockers), dtype=bool)
+
+        while np.any(collecting):
+            self.gather_ready(ready, collecting)
+            finished = ready & (n_served == self.batch_spec.T)
+            collecting[finished] = False  # Final observation written.
+            ready[finished] = False
+            workers = np.where(ready)[0]
+            if len(workers) == 0:
+                continue
+            idxs = np.concatenate([self.worker_env_idxs[w] for w in workers])
+            if self.mid_batch_reset:
+                for b_reset in idxs[step_np.done[idxs]]:
+                    step_np.action[b_reset] = 0  # Null prev_action into agent.
+                    step_np.reward[b_reset] = 0  # Null prev_reward into agent.
+                    self.agent.reset_one(idx=b_reset)
+            idxs_pyt = torch.from_numpy(idxs)
+            action, agent_info = self.agent.step(step_pyt.observation[idxs_pyt],
+                step_pyt.action[idxs_pyt], step_pyt.reward[idxs_pyt])
+            step_np.action[idxs] = action  # Worker applies to env.
+            step_np.agent_info[idxs] = agent_info  # Worker sends to traj_info.
+            for w in workers:
+                act_waiters[w].release()  # Signal to worker.
+            n_served[workers] += 1
+            ready[workers] = False
+
+        if "bootstrap_value" in self.samples_np.agent:
+            agent_inputs = AgentInputs(step_pyt.observation, step_pyt.action,
+                step_pyt.reward)
+            self.samples_np.agent.bootstrap_value[:] = self.agent.value(
+                *agent_inputs)
+        if np.any(step_np.done):  # Reset at end of batch; ready for next.
+            for b_reset in np.where(step_np.done)[0]:
+                step_np.action[b_reset] = 0  # Null prev_action into agent.
+                step_np.reward[b_reset] = 0  # Null prev_reward into agent.
+                self.agent.reset_one(idx=b_reset)
+
+    def gather_ready(self, ready, collecting):
+        """Mark workers which have released their step_blocker, until they
+        hold min_ready_fraction of the collecting envs (or any are ready,
+        after ready_timeout)."""
+        step_blockers = self.sync.step_blockers
+        n_envs = self.worker_n_envs
+        min_ready = max(1, self.min_ready_fraction * np.sum(n_envs[collecting]))
+        t0 = time.time()
+        while True:
+            waiting = np.where(collecting & ~ready)[0]
+            for w in waiting:
+                ready[w] = step_blockers[w].acquire(block=False)
+            n_ready = np.sum(n_envs[ready])
+            if n_ready >= min_ready or not np.any(collecting & ~ready):
+                return
+            if (n_ready > 0 and self.ready_timeout is not None and
+                    time.time() - t0 > self.ready_timeout):
+                return
+            w = np.where(collecting & ~ready)[0][0]
+            ready[w] = step_blockers[w].acquire(timeout=READY_POLL)
+
     def serve_actions_evaluation(self, itr):
         step_blockers, act_waiters = self.sync.step_blockers, self.sync.act_waiters
         step_np, step_pyt = self.eval_step_buffer_np, self.eval_step_buffer_pyt
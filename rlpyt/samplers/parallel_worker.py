@@ -6,6 +6,7 @@ import torch
 from rlpyt.utils.collections import AttrDict
 from rlpyt.utils.logging import logger
 from rlpyt.utils.seed import set_seed
+from rlpyt.samplers.utils import make_envs
 
 
 def initialize_worker(rank, seed=None, cpu=None, torch_threads=None, group=None):
@@ -36,7 +37,7 @@ def sampling_process(common_kwargs, worker_kwargs):
     c, w = AttrDict(**common_kwargs), AttrDict(**worker_kwargs)
     initialize_worker(w.rank, w.seed, w.cpus, c.torch_threads,
         w.get("group", None))
-    envs = [c.EnvCls(**c.env_kwargs) for _ in range(w.n_envs)]
+    envs = make_envs(c.EnvCls, c.env_kwargs, w.n_envs)
     collector = c.CollectorCls(
         rank=w.rank,
         envs=envs,
@@ -51,7 +52,7 @@ def sampling_process(common_kwargs, worker_kwargs):
     agent_inputs, traj_infos = collector.start_envs(c.max_decorrelation_steps)
     collector.start_agent()
 
-    eval_envs = [c.EnvCls(**c.eval_env_kwargs) for _ in range(c.eval_n_envs)]
+    eval_envs = make_envs(c.EnvCls, c.eval_env_kwargs, c.eval_n_envs)
     if eval_envs:  # May do evaluation.
         eval_collector = c.eval_CollectorCls(
             rank=w.rank,
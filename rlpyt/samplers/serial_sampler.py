@@ -1,6 +1,6 @@
 
 from rlpyt.samplers.base import BaseSampler
-from rlpyt.samplers.utils import build_samples_buffer
+from rlpyt.samplers.utils import build_samples_buffer, make_envs
 from rlpyt.utils.logging import logger
 from rlpyt.samplers.collectors import SerialEvalCollector
 
@@ -13,7 +13,7 @@ class SerialSampler(BaseSampler):
 
     def initialize(self, agent, affinity=None, seed=None,
             bootstrap_value=False, traj_info_kwargs=None):
-        envs = [self.EnvCls(**self.env_kwargs) for _ in range(self.batch_spec.B)]
+        envs = make_envs(self.EnvCls, self.env_kwargs, self.batch_spec.B)
         agent.initialize(envs[0].spaces, share_memory=False)
         samples_pyt, samples_np, examples = build_samples_buffer(agent, envs[0],
             self.batch_spec, bootstrap_value, agent_shared=False,
@@ -30,8 +30,8 @@ class SerialSampler(BaseSampler):
             agent=agent,
         )
         if self.eval_n_envs > 0:  # May do evaluation.
-            eval_envs = [self.EnvCls(**self.eval_env_kwargs)
-                for _ in range(self.eval_n_envs)]
+            eval_envs = make_envs(self.EnvCls, self.eval_env_kwargs,
+                self.eval_n_envs)
             eval_CollectorCls = self.eval_CollectorCls or SerialEvalCollector
             self.eval_collector = eval_CollectorCls(
                 envs=eval_envs,
@@ -5,6 +5,7 @@ import numpy as np
 
 from rlpyt.utils.buffer import buffer_from_example, torchify_buffer
 from rlpyt.utils.collections import AttrDict
+from rlpyt.utils.synchronize import SpinBarrier, SpinSemaphore
 from rlpyt.agents.base import AgentInputs
 from rlpyt.samplers.collections import (Samples, AgentSamples, AgentSamplesBsv,
     EnvSamples, StepBuffer)
@@ -66,18 +67,23 @@ def build_step_buffer(examples, B):
     return step_buffer_pyt, step_buffer_np
 
 
-def build_par_objs(n, groups=1):
+def build_par_objs(n, groups=1, spin_wait=False):
+    """With spin_wait, barriers and semaphores poll shared memory (spinning
+    briefly, then sleeping with backoff) instead of making system calls;
+    lower latency when processes have their own cores."""
+    Barrier = SpinBarrier if spin_wait else mp.Barrier
+    Semaphore = SpinSemaphore if spin_wait else mp.Semaphore
     ctrl = AttrDict(
         quit=mp.RawValue(ctypes.c_bool, False),
-        barrier_in=mp.Barrier(n * groups + 1),
-        barrier_out=mp.Barrier(n * groups + 1),
+        barrier_in=Barrier(n * groups + 1),
+        barrier_out=Barrier(n * groups + 1),
         do_eval=mp.RawValue(ctypes.c_bool, False),
         itr=mp.RawValue(ctypes.c_long, 0),
     )
     traj_infos_queue = mp.Queue()
 
-    step_blockers = [[mp.Semaphore(0) for _ in range(n)] for _ in range(groups)]
-    act_waiters = [[mp.Semaphore(0) for _ in range(n)] for _ in range(groups)]
+    step_blockers = [[Semaphore(0) for _ in range(n)] for _ in range(groups)]
+    act_waiters = [[Semaphore(0) for _ in range(n)] for _ in range(groups)]
     if groups == 1:
         step_blockers = step_blockers[0]
         act_waiters = act_waiters[0]
@@ -89,12 +95,25 @@ def build_par_objs(n, groups=1):
     return ctrl, traj_infos_queue, sync
 
 
+def make_envs(EnvCls, env_kwargs, n_envs):
+    """List of n_envs environments, or, if EnvCls is vectorized (e.g. a
+    VecEnv subclass), a list of one, built with n_envs keyword."""
+    if getattr(EnvCls, "vectorized", False):
+        return [EnvCls(n_envs=n_envs, **env_kwargs)] if n_envs > 0 else []
+    return [EnvCls(**env_kwargs) for _ in range(n_envs)]
+
+
 def get_example_outputs(agent, env, examples):
     """Do this in a sub-process to avoid setup conflict in master/workers (e.g.
     MKL)."""
     o = env.reset()
-    a = env.action_space.sample()
-    o, r, d, env_info = env.step(a)
+    if getattr(env, "vectorized", False):  # Example from first env.
+        o, r, d, env_info = env.step(env.action_space.sample(env.n_envs))
+        o, r, d, a = o[0], r[0], d[0], env.action_space.sample()
+        env_info = None if env_info is None else env_info[0]
+    else:
+        a = env.action_space.sample()
+        o, r, d, env_info = env.step(a)
     r = np.asarray(r, dtype="float32")  # Must match torch float dtype here.
     agent.reset()
     agent_inputs = torchify_buffer(AgentInputs(o, a, r))
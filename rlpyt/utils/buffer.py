@@ -1,6 +1,8 @@
 
 import numpy as np
 import multiprocessing as mp
+import os
+import os.path as osp
 import ctypes
 import torch
 
@@ -8,22 +10,38 @@ from rlpyt.utils.collections import namedarraytuple_like
 # from rlpyt.utils.misc import put
 
 
-def buffer_from_example(example, leading_dims, shared_memory=False):
+def buffer_from_example(example, leading_dims, shared_memory=False,
+        pin_memory=False, memmap_path=None):
+    """If memmap_path is given, each field is a disk-backed np.memmap in
+    .npy format at memmap_path + "[.field[.subfield]].npy" (shared between
+    processes by the OS; can be re-opened by path with np.load(...,
+    mmap_mode="r+"))."""
     try:
         buffer_type = namedarraytuple_like(example)
     except TypeError:  # example was not a namedtuple or namedarraytuple
-        return build_array(example, leading_dims, shared_memory)
-    return buffer_type(*(buffer_from_example(v, leading_dims, shared_memory)
-        for v in example))
+        return build_array(example, leading_dims, shared_memory, pin_memory,
+            memmap_path)
+    return buffer_type(*(buffer_from_example(v, leading_dims, shared_memory,
+        pin_memory, None if memmap_path is None else f"{memmap_path}.{k}")
+        for k, v in zip(example._fields, example)))
 
 
-def build_array(example, leading_dims, shared_memory=False):
+def build_array(example, leading_dims, shared_memory=False, pin_memory=False,
+        memmap_path=None):
     a = np.asarray(example)
     if a.dtype == "object":
         raise TypeError("Buffer example value cannot cast as np.dtype==object.")
-    constructor = np_mp_array if shared_memory else np.zeros
     if not isinstance(leading_dims, (list, tuple)):
         leading_dims = (leading_dims,)
+    if memmap_path is not None:
+        return np_memmap_array(shape=leading_dims + a.shape, dtype=a.dtype,
+            filename=memmap_path + ".npy")
+    if shared_memory:
+        constructor = np_mp_array
+    elif pin_memory:
+        constructor = np_pinned_array
+    else:
+        constructor = np.zeros
     return constructor(shape=leading_dims + a.shape, dtype=a.dtype)
 
 
@@ -34,6 +52,23 @@ def np_mp_array(shape, dtype):
     return np.frombuffer(mp_array, dtype=dtype, count=size).reshape(shape)
 
 
+def np_memmap_array(shape, dtype, filename):
+    """Zero-initialized, disk-backed array in .npy format (file is sparse
+    until written)."""
+    os.makedirs(osp.dirname(osp.abspath(filename)), exist_ok=True)
+    return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype,
+        shape=shape)
+
+
+def np_pinned_array(shape, dtype):
+    """Numpy view of page-locked memory (for non_blocking copies to GPU);
+    ordinary zeros if CUDA is unavailable."""
+    a = np.zeros(shape, dtype=dtype)
+    if not torch.cuda.is_available():
+        return a
+    return torch.from_numpy(a).pin_memory().numpy()
+
+
 def torchify_buffer(buffer_):
     if buffer_ is None:
         return
@@ -60,14 +95,15 @@ def numpify_buffer(buffer_):
     return type(buffer_)(*contents)
 
 
-def buffer_to(buffer_, device=None):
+def buffer_to(buffer_, device=None, non_blocking=False):
     if buffer_ is None:
         return
     if isinstance(buffer_, torch.Tensor):
-        return buffer_.to(device)
+        return buffer_.to(device, non_blocking=non_blocking)
     elif isinstance(buffer_, np.ndarray):
         raise TypeError("Cannot move numpy array to device.")
-    contents = tuple(buffer_to(b, device=device) for b in buffer_)
+    contents = tuple(buffer_to(b, device=device, non_blocking=non_blocking)
+        for b in buffer_)
     if type(buffer_) is tuple:
         return contents
     return type(buffer_)(*contents)
@@ -95,6 +131,25 @@ def buffer_func(buffer_, func, *args, **kwargs):
     return type(buffer_)(*contents)
 
 
+def buffer_take(buffer_, T_idxs, B_idxs, out=None):
+    """Gather buffer_[T_idxs, B_idxs] from every field with [T,B] leading
+    dims (numpy).  If out is given (same structure, fields may be None),
+    writes into it without allocating.  T_idxs may be -1 (wraps to end)."""
+    if buffer_ is None:
+        return
+    if isinstance(buffer_, np.ndarray):
+        flat = buffer_.reshape((-1,) + buffer_.shape[2:])  # View.
+        return np.take(flat, T_idxs * buffer_.shape[1] + B_idxs, axis=0,
+            out=out, mode="wrap")  # ("wrap": unbuffered out, -1 wraps.)
+    if out is None:
+        out = (None,) * len(buffer_)
+    contents = tuple(buffer_take(b, T_idxs, B_idxs, o)
+        for b, o in zip(buffer_, out))
+    if type(buffer_) is tuple:
+        return contents
+    return type(buffer_)(*contents)
+
+
 def get_leading_dims(buffer_, n_dim=1):
     if buffer_ is None:
         return
@@ -244,7 +244,6 @@ def build_async_affinity(run_slot, gpu, cpu, gpr=1, sgr=1, oss=0, cpw=1,
     wrkr_per_smp = smp_cpr // cpw
     smp_cpr = wrkr_per_smp * cpw
     smp_cpg = smp_cpr // sgr
-    breakpoint()
     for i, smp_gpu in enumerate(my_smp_gpus):
         gpu_skt = smp_gpu // gpu_per_skt
         gpu_in_skt = smp_gpu % gpu_per_skt
@@ -29,20 +29,25 @@ def empty(shape, dtype):
 
 
 def extract_sequences(array_or_tensor, T_idxs, B_idxs, T):
-    """Assumes array_or_tensor has [T,B] leading dims."""
-    shape = (T, len(B_idxs)) + array_or_tensor.shape[2:]
-    sequences = empty(shape, dtype=array_or_tensor.dtype)
-    for i, (t, b) in enumerate(zip(T_idxs, B_idxs)):
-        if t + T > len(array_or_tensor):  # Wrap end.
-            m = len(array_or_tensor) - t
-            sequences[:m, i] = array_or_tensor[t:, b]  # [m,..]
-            sequences[m:, i] = array_or_tensor[:T - m, b]  # [w,..]
-        elif t < 0:  # Wrap beginning.
-            sequences[t:, i] = array_or_tensor[t:, b]
-            sequences[:t, i] = array_or_tensor[:t + T, b]
-        else:
-            sequences[:, i] = array_or_tensor[t:t + T, b]  # [T,..]
-    return sequences
+    """Assumes array_or_tensor has [T,B] leading dims.  Returns [T,B,..]
+    sequences starting at each (T_idx, B_idx), wrapping at either end."""
+    t_idxs = sequence_idxs(T_idxs, T, len(array_or_tensor))
+    return index_sequences(array_or_tensor, t_idxs, B_idxs)
+
+
+def sequence_idxs(T_idxs, T, wrap_T):
+    """Returns [T,B] time indexes of sequences of length T starting at each
+    of T_idxs, wrapped into range [0, wrap_T)."""
+    return (np.asarray(T_idxs)[None, :] + np.arange(T)[:, None]) % wrap_T
+
+
+def index_sequences(array_or_tensor, t_idxs, B_idxs):
+    """Assumes array_or_tensor has [T,B] leading dims; gathers [T,B,..] using
+    [T,B] time indexes (e.g. from sequence_idxs()), in one fancy-index."""
+    b_idxs = np.asarray(B_idxs)[None, :]
+    if isinstance(array_or_tensor, torch.Tensor):
+        t_idxs, b_idxs = torch.from_numpy(t_idxs), torch.from_numpy(b_idxs)
+    return array_or_tensor[t_idxs, b_idxs]
 
 
 # def put(x, loc, y, axis=0, wrap=False):
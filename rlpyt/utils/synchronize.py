@@ -1,5 +1,10 @@
 
+import os
+import time
 import multiprocessing as mp
+import numpy as np
+
+from rlpyt.utils.buffer import np_mp_array
 
 
 class RWLock(object):
@@ -33,3 +38,112 @@ class RWLock(object):
             self._read_count.value -= 1
             if self._read_count.value == 0:
                 self.write_lock.release()
+
+
+SPIN_TIME = 1e-4  # Seconds polling before sleeping.
+MIN_SLEEP = 1e-5
+MAX_SLEEP = 1e-3
+sched_yield = getattr(os, "sched_yield", None) or (lambda: time.sleep(0))
+
+
+def spin_wait(condition, timeout=None, spin_time=SPIN_TIME,
+        max_sleep=MAX_SLEEP):
+    """Return True once condition() is true: poll for spin_time seconds,
+    yielding the CPU between polls, then sleep between polls, doubling the
+    sleep up to max_sleep (or return False after timeout seconds)."""
+    if condition():
+        return True
+    now = time.perf_counter()
+    end_spin = now + spin_time
+    deadline = None if timeout is None else now + timeout
+    while now < end_spin:
+        sched_yield()  # (Cheap; lets others run if cores are shared.)
+        if condition():
+            return True
+        now = time.perf_counter()
+    sleep = MIN_SLEEP
+    while not condition():
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        time.sleep(sleep)
+        sleep = min(2 * sleep, max_sleep)
+    return True
+
+
+class SpinBarrier(object):
+    """
+    Replaces mp.Barrier (wait(), parties, n_waiting) with polling of shared
+    memory (spin_wait()), avoiding system calls when parties arrive close
+    together.  Each party (a process, identified at its first wait()) only
+    writes its own count of waits, so no atomic read-modify-write is needed:
+    a wait returns once all parties' counts reach its own.
+
+    Unlike mp.Barrier, parties are processes, not calls: exactly ``parties``
+    distinct processes must wait, each always as the same party, every
+    round.  Party slots are claimed by pid at each process's first wait()
+    and never released, so a further process (e.g. one restarted in place
+    of a worker) raises RuntimeError, and threads of one process would share
+    a slot (not supported).
+    """
+
+    def __init__(self, parties, spin_time=SPIN_TIME, max_sleep=MAX_SLEEP):
+        self.parties = parties
+        self.spin_time = spin_time
+        self.max_sleep = max_sleep
+        self._counts = np_mp_array(parties, np.int64)
+        self._n_claimed = mp.RawValue("i")
+        self._claim_lock = mp.Lock()
+        self._pid = None
+
+    def wait(self):
+        if self._pid != os.getpid():
+            self._claim()
+        self._count += 1
+        self._counts[self._idx] = count = self._count
+        counts = self._counts
+        spin_wait(lambda: counts.min() >= count, spin_time=self.spin_time,
+            max_sleep=self.max_sleep)
+
+    @property
+    def n_waiting(self):
+        counts = self._counts.copy()
+        top = counts.max()
+        return 0 if counts.min() == top else int(np.sum(counts == top))
+
+    def _claim(self):
+        with self._claim_lock:
+            idx = self._n_claimed.value
+            if idx >= self.parties:
+                raise RuntimeError(f"More than {self.parties} processes "
+                    "waited on SpinBarrier.")
+            self._n_claimed.value = idx + 1
+        self._pid, self._idx, self._count = os.getpid(), idx, 0
+
+
+class SpinSemaphore(object):
+    """
+    Replaces mp.Semaphore (release(), acquire()) with polling of shared
+    memory (spin_wait()), for one releasing and one acquiring process (e.g.
+    the GPU sampler's per-worker step_blocker and act_waiter).  Releases
+    and acquires are counted separately, each written by one side only.
+    """
+
+    def __init__(self, value=0, spin_time=SPIN_TIME, max_sleep=MAX_SLEEP):
+        self.spin_time = spin_time
+        self.max_sleep = max_sleep
+        self._released = mp.RawValue("q", value)
+        self._acquired = mp.RawValue("q", 0)
+
+    def release(self):
+        self._released.value += 1
+
+    def acquire(self, block=True, timeout=None):
+        released, acquired = self._released, self._acquired
+        if block:
+            if not spin_wait(lambda: released.value > acquired.value, timeout,
+                    spin_time=self.spin_time, max_sleep=self.max_sleep):
+                return False
+        elif released.value <= acquired.value:
+            return False
+        acquired.value += 1
+        return True